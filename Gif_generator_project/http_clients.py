@@ -0,0 +1,163 @@
+# Gif_generator_project/http_clients.py
+"""
+Clientes HTTP compartilhados para os provedores externos (ClipDrop, Runway, Asaas).
+
+Cada provedor tem uma única `requests.Session` por processo, com pool de conexões
+keep-alive, timeouts de conexão/leitura e retentativas com backoff exponencial
+apenas para métodos idempotentes (GET, PUT, DELETE...). POSTs nunca são repetidos
+automaticamente, para não gerar cobranças ou tarefas duplicadas.
+
+As opções padrão vêm de HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HTTP_MAX_RETRIES,
+HTTP_BACKOFF_FACTOR e HTTP_POOL_MAXSIZE; HTTP_CLIENT_OPTIONS permite sobrescrevê-las
+por provedor, ex.: {'clipdrop': {'read_timeout': 120}}.
+
+O caminho assíncrono de geração (gif_creator/async_providers.py) usa `get_async_client`,
+um `httpx.AsyncClient` com as mesmas opções, um por provedor e por event loop.
+"""
+import asyncio
+import threading
+import weakref
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .metrics import UPSTREAM_ERRORS, CallbackMetric
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class ProviderClient:
+    """Sessão HTTP com pool de conexões, timeouts padrão e retentativas para um provedor."""
+
+    def __init__(self, name, connect_timeout, read_timeout, max_retries, backoff_factor, pool_maxsize):
+        self.name = name
+        self.timeout = (connect_timeout, read_timeout)
+
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+            respect_retry_after_header=True,
+            # Após a última tentativa devolve a resposta de erro, para o chamador tratar o status.
+            raise_on_status=False,
+        )
+        self._adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', self._adapter)
+        self.session.mount('http://', self._adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.RequestException:
+            UPSTREAM_ERRORS.inc(provider=self.name)
+            raise
+        if response.status_code >= 500:
+            UPSTREAM_ERRORS.inc(provider=self.name)
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
+
+    def stats(self):
+        """
+        Estatísticas de reaproveitamento de conexões dos pools deste cliente.
+        `requests` conta também as retentativas.
+        """
+        pools = self._adapter.poolmanager.pools
+        connections = 0
+        sent = 0
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                connections += pool.num_connections
+                sent += pool.num_requests
+        return {
+            'requests': sent,
+            'connections_opened': connections,
+            'connections_reused': max(sent - connections, 0),
+        }
+
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def _options_for(name):
+    options = {
+        'connect_timeout': settings.HTTP_CONNECT_TIMEOUT,
+        'read_timeout': settings.HTTP_READ_TIMEOUT,
+        'max_retries': settings.HTTP_MAX_RETRIES,
+        'backoff_factor': settings.HTTP_BACKOFF_FACTOR,
+        'pool_maxsize': settings.HTTP_POOL_MAXSIZE,
+    }
+    options.update(settings.HTTP_CLIENT_OPTIONS.get(name, {}))
+    return options
+
+
+def get_client(name):
+    """Retorna o cliente do provedor `name`, criado na primeira chamada e reutilizado depois."""
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = ProviderClient(name, **_options_for(name))
+    return client
+
+
+_async_clients = weakref.WeakKeyDictionary()  # event loop -> {provedor: httpx.AsyncClient}
+
+
+def get_async_client(name):
+    """
+    `httpx.AsyncClient` do provedor `name` para o event loop atual.
+
+    Mesmos timeouts e limite de conexões de `get_client`. O httpx só repete falhas de
+    conexão (nunca uma requisição que chegou ao servidor), então nenhum POST é duplicado.
+    Fora do pool não há limite de espera: com centenas de gerações em andamento as
+    consultas ao Runway aguardam uma conexão livre em vez de falhar.
+    """
+    clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+    client = clients.get(name)
+    if client is None:
+        options = _options_for(name)
+        limits = httpx.Limits(max_connections=options['pool_maxsize'],
+                              max_keepalive_connections=options['pool_maxsize'])
+
+        async def count_server_errors(response):
+            if response.status_code >= 500:
+                UPSTREAM_ERRORS.inc(provider=name)
+
+        client = clients[name] = httpx.AsyncClient(
+            timeout=httpx.Timeout(options['read_timeout'], connect=options['connect_timeout'], pool=None),
+            transport=httpx.AsyncHTTPTransport(retries=options['max_retries'], limits=limits),
+            event_hooks={'response': [count_server_errors]},
+        )
+    return client
+
+
+def get_all_stats():
+    """Estatísticas de conexão de todos os clientes já criados, por provedor."""
+    return {name: client.stats() for name, client in list(_clients.items())}
+
+
+def _stat_by_provider(field):
+    return lambda: {(name,): stats[field] for name, stats in get_all_stats().items()}
+
+
+CallbackMetric('http_client_requests_total', "Requisições HTTP enviadas a cada provedor (inclui retentativas).",
+               _stat_by_provider('requests'), ['provider'], kind='counter')
+CallbackMetric('http_client_connections_opened_total', "Conexões TCP/TLS abertas para cada provedor.",
+               _stat_by_provider('connections_opened'), ['provider'], kind='counter')
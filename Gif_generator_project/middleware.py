@@ -0,0 +1,64 @@
+# Gif_generator_project/middleware.py
+"""
+Contagem de consultas ao banco por requisição, para achar N+1 cedo.
+
+Ligado por QUERY_COUNT_MIDDLEWARE=True. Para cada requisição, conta as consultas e
+soma o tempo gasto no banco (em todas as conexões), devolve os valores nos cabeçalhos
+X-DB-Query-Count e X-DB-Query-Time-Ms e registra histogramas por view em /metrics.
+Funciona sem DEBUG: usa `connection.execute_wrapper`, não `connection.queries`.
+"""
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .metrics import Histogram
+
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+DB_QUERIES_PER_REQUEST = Histogram(
+    'http_db_queries_per_request', "Consultas ao banco por requisição, por view.", ['view'],
+    buckets=QUERY_COUNT_BUCKETS,
+)
+DB_SECONDS_PER_REQUEST = Histogram(
+    'http_db_seconds_per_request', "Tempo gasto no banco por requisição, por view.", ['view'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+
+
+class QueryCountMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_COUNT_MIDDLEWARE', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = _QueryCounter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        DB_QUERIES_PER_REQUEST.observe(counter.count, view=view)
+        DB_SECONDS_PER_REQUEST.observe(counter.seconds, view=view)
+        response['X-DB-Query-Count'] = str(counter.count)
+        response['X-DB-Query-Time-Ms'] = f"{counter.seconds * 1000:.2f}"
+        return response
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 import os
+import tempfile
 from pathlib import Path
 from dotenv import load_dotenv
 load_dotenv()
@@ -52,6 +53,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Só fica ativo com QUERY_COUNT_MIDDLEWARE=True (ver Gif_generator_project/middleware.py)
+    'Gif_generator_project.middleware.QueryCountMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -62,6 +65,9 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Conta consultas e tempo de banco por requisição (cabeçalhos X-DB-Query-* e métricas em /metrics)
+QUERY_COUNT_MIDDLEWARE = os.getenv('QUERY_COUNT_MIDDLEWARE', 'False') == 'True'
+
 ROOT_URLCONF = 'Gif_generator_project.urls'
 
 TEMPLATES = [
@@ -90,9 +96,38 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Banco de testes em arquivo (e não em memória compartilhada), para que os testes
+        # de concorrência com threads usem o lock normal do SQLite em vez de falhar na hora.
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+        # Transações de escrita pegam o lock já no BEGIN: com vários workers (threads do pool de
+        # jobs), um SELECT seguido de escrita na mesma transação (update_or_create, get_or_create)
+        # espera o lock em vez de falhar com "database is locked".
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
     }
 }
 
+# Cache do Django. Com REDIS_URL o cache é compartilhado entre processos/servidores
+# (necessário para que as invalidações valham para todos os workers); sem ele, cache local.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+# Cache em memória do token -> usuário (users/authentication.py). O TTL limita por quanto tempo
+# outros processos podem ver um token/usuário já invalidado neste.
+TOKEN_AUTH_CACHE_SIZE = int(os.getenv('TOKEN_AUTH_CACHE_SIZE', '10000'))
+TOKEN_AUTH_CACHE_TTL = int(os.getenv('TOKEN_AUTH_CACHE_TTL', '60'))
+# Tempo (segundos) que a assinatura ativa de cada usuário fica em cache (subscriptions/context.py)
+SUBSCRIPTION_CONTEXT_TTL = int(os.getenv('SUBSCRIPTION_CONTEXT_TTL', '300'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -127,8 +162,9 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.SessionAuthentication',
 
         # 2. TokenAuthentication: Permite que seu frontend React se autentique
-        #    enviando o token no cabeçalho.
-        'rest_framework.authentication.TokenAuthentication',
+        #    enviando o token no cabeçalho. A versão com cache evita ir ao banco
+        #    em toda requisição (users/authentication.py).
+        'users.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -149,11 +185,149 @@ USE_TZ = True
 ASAAS_API_KEY = os.getenv('ASAAS_API_KEY')
 ASAAS_API_URL = os.getenv('ASAAS_API_URL')
 ASAAS_WEBHOOK_SECRET = os.getenv('ASAAS_WEBHOOK_SECRET')
+# Eventos do webhook do Asaas (subscriptions/webhooks.py): com ASAAS_WEBHOOK_BACKGROUND, uma thread do
+# próprio servidor processa a fila; sem ele, rode `manage.py process_webhook_events --loop` à parte.
+ASAAS_WEBHOOK_BACKGROUND = os.getenv('ASAAS_WEBHOOK_BACKGROUND', 'True') == 'True'
+ASAAS_WEBHOOK_BATCH_SIZE = int(os.getenv('ASAAS_WEBHOOK_BATCH_SIZE', '200'))
+# Eventos que falham voltam para a fila com espera exponencial (segundos), até o limite de tentativas
+ASAAS_WEBHOOK_MAX_ATTEMPTS = int(os.getenv('ASAAS_WEBHOOK_MAX_ATTEMPTS', '5'))
+ASAAS_WEBHOOK_RETRY_INITIAL = float(os.getenv('ASAAS_WEBHOOK_RETRY_INITIAL', '30'))
+ASAAS_WEBHOOK_RETRY_MAX = float(os.getenv('ASAAS_WEBHOOK_RETRY_MAX', '3600'))
+# Busca da URL da primeira cobrança após criar a assinatura (segundos): consultas com backoff até o prazo
+ASAAS_PAYMENT_URL_TIMEOUT = float(os.getenv('ASAAS_PAYMENT_URL_TIMEOUT', '10'))
+ASAAS_PAYMENT_URL_POLL_INITIAL = float(os.getenv('ASAAS_PAYMENT_URL_POLL_INITIAL', '0.25'))
+ASAAS_PAYMENT_URL_POLL_MAX = float(os.getenv('ASAAS_PAYMENT_URL_POLL_MAX', '2'))
 HUGGINGFACE_API_KEY = os.getenv('HUGGINGFACE_API_KEY')
 RUNWAY_API_KEY = os.getenv('RUNWAY_API_KEY')
 FRONTEND_URL = 'http://localhost:5173'
 CLIPDROP_API_KEY = os.getenv('CLIPDROP_API_KEY')
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+
+# Pool local de workers que executa o pipeline de geração de GIFs (gif_creator/jobs.py)
+GIF_WORKER_THREADS = int(os.getenv('GIF_WORKER_THREADS', '2'))
+# Quantos jobs podem aguardar na fila além dos que já estão em execução
+GIF_JOB_QUEUE_LIMIT = int(os.getenv('GIF_JOB_QUEUE_LIMIT', '20'))
+# Segundos a partir dos quais o comando fail_stale_jobs dá um job como perdido (worker morto ou
+# reiniciado): em execução, contados de started_at; na fila, contados de created_at. Devem ficar
+# acima da duração máxima legítima (prazo do Runway + esperas do pool de encode e do rascunho).
+GIF_JOB_STALE_AFTER = int(os.getenv('GIF_JOB_STALE_AFTER', '3600'))
+GIF_JOB_QUEUED_STALE_AFTER = int(os.getenv('GIF_JOB_QUEUED_STALE_AFTER', '7200'))
+# Jobs em andamento ao mesmo tempo no event loop de cada worker ASGI (gif_creator/async_jobs.py)
+GIF_ASYNC_MAX_JOBS = int(os.getenv('GIF_ASYNC_MAX_JOBS', '500'))
+# Stream SSE de andamento dos jobs (gif_creator/progress.py), em segundos: por quanto tempo os
+# eventos de um job terminado ficam em memória, e intervalo do keep-alive das conexões abertas
+PROGRESS_RETENTION = int(os.getenv('PROGRESS_RETENTION', '300'))
+PROGRESS_HEARTBEAT = float(os.getenv('PROGRESS_HEARTBEAT', '15'))
+
+# Cache dos prompts aprimorados pelo Gemini (gif_creator/prompt_cache.py)
+PROMPT_CACHE_TTL = int(os.getenv('PROMPT_CACHE_TTL', str(30 * 24 * 3600)))  # segundos
+PROMPT_CACHE_MEMORY_SIZE = int(os.getenv('PROMPT_CACHE_MEMORY_SIZE', '1024'))
+PROMPT_CACHE_MAX_ROWS = int(os.getenv('PROMPT_CACHE_MAX_ROWS', '50000'))
+# A limpeza da tabela (expirados e excedentes) roda a cada N gravações de cada processo
+PROMPT_CACHE_EVICT_EVERY = int(os.getenv('PROMPT_CACHE_EVICT_EVERY', '100'))
+
+# Encoder de GIF (gif_creator/gif_encoder.py)
+GIF_DITHER = os.getenv('GIF_DITHER', 'False') == 'True'
+# Diferença de cor (RGB) abaixo da qual um pixel é considerado inalterado entre quadros
+GIF_DELTA_TOLERANCE = int(os.getenv('GIF_DELTA_TOLERANCE', '8'))
+
+# Versões geradas para cada GIF a partir de uma única decodificação do vídeo (gif_creator/renditions.py).
+# A primeira versão 'gif' é o GIF principal (gif_url).
+GIF_RENDITIONS = [
+    {'name': 'gif_480', 'format': 'gif', 'width': 480},
+    {'name': 'gif_240', 'format': 'gif', 'width': 240},
+    {'name': 'webp_480', 'format': 'webp', 'width': 480},
+    {'name': 'mp4_480', 'format': 'mp4', 'width': 480},
+]
+GIF_RENDITION_FPS = 12
+# Máximo de quadros por versão (30 s a 12 fps). GIF e WebP guardam todos os quadros até o fim:
+# cada largura custa largura x altura x 3 bytes por quadro (ver gif_creator/renditions.py)
+GIF_RENDITION_MAX_FRAMES = int(os.getenv('GIF_RENDITION_MAX_FRAMES', '360'))
+# Pool de processos que decodifica o vídeo e codifica as versões (gif_creator/encode_pool.py).
+# Padrão: um processo por núcleo disponível; 0 codifica na própria thread do job.
+GIF_ENCODE_PROCESSES = int(os.getenv('GIF_ENCODE_PROCESSES', str(
+    len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1)))
+# Encodes que podem aguardar na fila além dos em execução; acima disso o job espera por uma vaga
+GIF_ENCODE_QUEUE_LIMIT = int(os.getenv('GIF_ENCODE_QUEUE_LIMIT', '8'))
+GIF_ENCODE_WAIT_TIMEOUT = float(os.getenv('GIF_ENCODE_WAIT_TIMEOUT', '600'))  # segundos
+WEBP_QUALITY = int(os.getenv('WEBP_QUALITY', '70'))
+
+# Espaço de rascunho dos jobs (gif_creator/scratch.py): vídeo baixado e versões em codificação.
+# De preferência um tmpfs, fora do disco das mídias.
+GIF_SCRATCH_DIR = os.getenv('GIF_SCRATCH_DIR', os.path.join(
+    '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'gif_scratch'))
+# Total de bytes reservados ao mesmo tempo POR PROCESSO; jobs que não cabem esperam.
+# O orçamento não é coordenado entre processos: com N processos (workers do servidor + workers
+# de jobs) o diretório pode chegar a N x GIF_SCRATCH_BUDGET_BYTES, então dimensione como
+# (espaço livre em GIF_SCRATCH_DIR) / N.
+GIF_SCRATCH_BUDGET_BYTES = int(os.getenv('GIF_SCRATCH_BUDGET_BYTES', str(512 * 1024 * 1024)))
+GIF_SCRATCH_WAIT_TIMEOUT = float(os.getenv('GIF_SCRATCH_WAIT_TIMEOUT', '300'))  # segundos
+# Reserva de cada job de versões (todas juntas); cada download de vídeo reserva VIDEO_DOWNLOAD_MAX_BYTES
+GIF_SCRATCH_RENDITIONS_BYTES = int(os.getenv('GIF_SCRATCH_RENDITIONS_BYTES', str(32 * 1024 * 1024)))
+# Reservas até este tamanho ficam num arquivo anônimo em memória (memfd, Linux); 0 desliga
+GIF_SCRATCH_MEMORY_MAX_BYTES = int(os.getenv('GIF_SCRATCH_MEMORY_MAX_BYTES', str(32 * 1024 * 1024)))
+
+# Download do vídeo gerado pelo Runway
+VIDEO_DOWNLOAD_MAX_BYTES = int(os.getenv('VIDEO_DOWNLOAD_MAX_BYTES', str(100 * 1024 * 1024)))
+VIDEO_DOWNLOAD_TIMEOUT = int(os.getenv('VIDEO_DOWNLOAD_TIMEOUT', '120'))  # segundos, download inteiro
+VIDEO_DOWNLOAD_READ_TIMEOUT = int(os.getenv('VIDEO_DOWNLOAD_READ_TIMEOUT', '30'))  # segundos sem receber dados
+
+# Clientes HTTP dos provedores externos (Gif_generator_project/http_clients.py)
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '60'))
+HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', '3'))
+HTTP_BACKOFF_FACTOR = float(os.getenv('HTTP_BACKOFF_FACTOR', '0.5'))
+HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', '10'))
+# Sobrescreve as opções acima por provedor ('clipdrop', 'runway', 'asaas')
+HTTP_CLIENT_OPTIONS = {
+    'clipdrop': {'read_timeout': 120},
+}
+# Poller das tarefas do Runway (gif_creator/runway_poller.py), em segundos
+RUNWAY_POLL_INITIAL_INTERVAL = float(os.getenv('RUNWAY_POLL_INITIAL_INTERVAL', '1'))
+RUNWAY_POLL_MAX_INTERVAL = float(os.getenv('RUNWAY_POLL_MAX_INTERVAL', '10'))
+RUNWAY_TASK_TIMEOUT = float(os.getenv('RUNWAY_TASK_TIMEOUT', '600'))
+# /metrics (Gif_generator_project/metrics.py) é negado por padrão: libera quem enviar
+# 'Authorization: Bearer <METRICS_TOKEN>' ou vier de METRICS_ALLOWED_IPS (IPs ou redes separados
+# por vírgula, ex.: '127.0.0.1,10.0.0.0/8'; atrás de um proxy local todos vêm de 127.0.0.1).
+# As métricas são por processo: com vários workers, colete cada um separadamente.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.getenv('METRICS_ALLOWED_IPS', '').split(',') if ip.strip()]
+# Timeout (segundos) da chamada ao Gemini, que usa o SDK do Google em vez dos clientes acima
+GEMINI_TIMEOUT = float(os.getenv('GEMINI_TIMEOUT', '60'))
+
+# Provedores do pipeline (gif_creator/providers.py). Com GIF_FAKE_PROVIDERS=True usa os
+# provedores locais de gif_creator/fake_providers.py, sem rede e sem custo (testes de carga).
+GIF_FAKE_PROVIDERS = os.getenv('GIF_FAKE_PROVIDERS', 'False') == 'True'
+if GIF_FAKE_PROVIDERS:
+    GIF_PROVIDERS = {
+        'prompt': 'gif_creator.fake_providers.FakePromptEnhancer',
+        'image': 'gif_creator.fake_providers.FakeImageGenerator',
+        'video': 'gif_creator.fake_providers.FakeVideoGenerator',
+    }
+    GIF_ASYNC_PROVIDERS = {
+        'prompt': 'gif_creator.fake_providers.AsyncFakePromptEnhancer',
+        'image': 'gif_creator.fake_providers.AsyncFakeImageGenerator',
+        'video': 'gif_creator.fake_providers.AsyncFakeVideoGenerator',
+    }
+    # Latências em segundos; ver fake_providers.sample_latency para as distribuições aceitas
+    GIF_PROVIDER_OPTIONS = {
+        'prompt': {'latency': ('lognormal', 2, 0.3), 'error_rate': 0.01},
+        'image': {'latency': ('lognormal', 6, 0.3), 'error_rate': 0.02},
+        'video': {'latency': ('lognormal', 40, 0.4), 'error_rate': 0.03},
+    }
+else:
+    GIF_PROVIDERS = {
+        'prompt': 'gif_creator.providers.GeminiPromptEnhancer',
+        'image': 'gif_creator.providers.ClipDropImageGenerator',
+        'video': 'gif_creator.providers.RunwayVideoGenerator',
+    }
+    # Versões assíncronas (gif_creator/async_providers.py, requer httpx), usadas por generate-image-async/ sob ASGI
+    GIF_ASYNC_PROVIDERS = {
+        'prompt': 'gif_creator.async_providers.AsyncGeminiPromptEnhancer',
+        'image': 'gif_creator.async_providers.AsyncClipDropImageGenerator',
+        'video': 'gif_creator.async_providers.AsyncRunwayVideoGenerator',
+    }
+    GIF_PROVIDER_OPTIONS = {}
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
@@ -165,6 +339,26 @@ CORS_ALLOWED_ORIGINS = [
 STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Armazenamento dos GIFs gerados (gif_creator/storage.py): nome = hash do conteúdo, em subdiretórios
+GIF_STORAGE_BACKEND = os.getenv('GIF_STORAGE_BACKEND', 'gif_creator.storage.ShardedFileSystemStorage')
+GIF_STORAGE_OPTIONS = {}
+# Artefatos intermediários (imagem base, vídeo do Runway) em MEDIA_ROOT/artifacts (gif_creator/artifacts.py):
+# o comando evict_artifacts remove os sem uso há GIF_ARTIFACTS_TTL segundos e, acima de
+# GIF_ARTIFACTS_MAX_BYTES, os menos usados
+GIF_ARTIFACTS_TTL = int(os.getenv('GIF_ARTIFACTS_TTL', str(7 * 24 * 3600)))
+GIF_ARTIFACTS_MAX_BYTES = int(os.getenv('GIF_ARTIFACTS_MAX_BYTES', str(5 * 1024 * 1024 * 1024)))
+# Guardar também o vídeo do Runway em MEDIA_ROOT/artifacts? Só serve para refazer as versões de um
+# pedido idêntico cujo GIF sumiu sem pagar outra animação; desligado, o vídeo fica só no rascunho.
+GIF_ARTIFACTS_CACHE_VIDEO = os.getenv('GIF_ARTIFACTS_CACHE_VIDEO', 'False') == 'True'
+# Quem envia os bytes dos GIFs (gif_creator.views.serve_media):
+#   'django'           - o próprio Django (desenvolvimento), com suporte a Range
+#   'x-accel-redirect' - nginx, com uma location interna apontando para MEDIA_ROOT:
+#                            location /protected-media/ { internal; alias /caminho/do/MEDIA_ROOT/; }
+#   'x-sendfile'       - Apache (mod_xsendfile) ou lighttpd
+MEDIA_SERVE_MODE = os.getenv('MEDIA_SERVE_MODE', 'django')
+MEDIA_ACCEL_PREFIX = os.getenv('MEDIA_ACCEL_PREFIX', '/protected-media/')
+MEDIA_CACHE_MAX_AGE = int(os.getenv('MEDIA_CACHE_MAX_AGE', str(365 * 24 * 3600)))  # segundos
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
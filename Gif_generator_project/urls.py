@@ -1,9 +1,10 @@
 # gif_generator_project/urls.py
 
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+from gif_creator.views import serve_media
+from .metrics import metrics_view
 
 
 
@@ -14,9 +15,9 @@ urlpatterns = [
     path('api/users/', include('users.urls')),
     path('api/subscriptions/', include('subscriptions.urls')),
     path('api/gif/', include('gif_creator.urls')),
+    path('metrics', metrics_view, name='metrics'),
+    # GIFs gerados: ETag/cache/Range aqui, bytes pelo servidor web conforme MEDIA_SERVE_MODE
+    re_path(rf"^{settings.MEDIA_URL.strip('/')}/(?P<path>.+)$", serve_media, name='media'),
 
 
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
@@ -2,15 +2,32 @@
 
 import React, { useState } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { generateAiImage } from '../services/api';
+import { generateAiImage, getGenerationJob, streamGenerationEvents } from '../services/api';
 import './GifGenerator.css';
 
+// Intervalo entre as consultas ao status do job de geração
+const JOB_POLL_INTERVAL_MS = 3000;
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// Mensagem exibida para cada etapa recebida do stream de andamento
+const STAGE_MESSAGES = {
+  started: 'Começando...',
+  prompt_enhanced: 'Prompt aprimorado, criando a imagem...',
+  base_image_ready: 'Imagem pronta, enviando para animação...',
+  runway_queued: 'Animação na fila...',
+  runway_progress: 'Animando a imagem...',
+  downloaded: 'Vídeo recebido, montando o GIF...',
+  encoded: 'GIF montado, salvando...',
+  saved: 'Quase lá...',
+};
+
 const GifGenerator = ({ subscriptionActive }) => {
   const [prompt, setPrompt] = useState('');
   const [overlayText, setOverlayText] = useState('');
   const [generatedGifUrl, setGeneratedGifUrl] = useState(null);
   const [isLoading, setIsLoading] = useState(false);
   const [error, setError] = useState('');
+  const [stageMessage, setStageMessage] = useState('');
   const navigate = useNavigate();
 
   // Se o usuário não tiver assinatura ativa, exibe uma mensagem e um botão para ver planos
@@ -38,13 +55,41 @@ const GifGenerator = ({ subscriptionActive }) => {
         setIsLoading(true);
         setError('');
         setGeneratedGifUrl(null);
+        setStageMessage('');
 
         try {
           const response = await generateAiImage({
             prompt: prompt,
             text: overlayText,
           });
-          setGeneratedGifUrl(response.gif_url);
+
+          // A geração roda em segundo plano. Se o servidor oferece o stream de andamento
+          // (events_url, só sob ASGI), acompanha as etapas por ele e, no fim, busca o job uma
+          // vez para obter a URL do GIF; senão, consulta o job periodicamente.
+          let job = response;
+          if (response.events_url) {
+            try {
+              await streamGenerationEvents(response.job_id, (event, data) => {
+                if (event === 'runway_progress' && data.progress != null) {
+                  setStageMessage(`Animando a imagem... ${Math.round(data.progress * 100)}%`);
+                } else if (STAGE_MESSAGES[event]) {
+                  setStageMessage(STAGE_MESSAGES[event]);
+                }
+              });
+              job = await getGenerationJob(response.job_id);
+            } catch {
+              // Stream interrompido (proxy, navegador antigo): cai na consulta periódica abaixo.
+            }
+          }
+          while (job.status === 'pending' || job.status === 'running') {
+            await sleep(JOB_POLL_INTERVAL_MS);
+            job = await getGenerationJob(response.job_id);
+          }
+
+          if (job.status === 'failed') {
+            throw new Error(job.error || 'A geração do GIF falhou.');
+          }
+          setGeneratedGifUrl(job.gif_url);
         } catch (err) {
           // Verifica se o status do erro é 403 (Limite Atingido)
           // e se existe uma mensagem de erro específica no objeto 'data'.
@@ -56,6 +101,7 @@ const GifGenerator = ({ subscriptionActive }) => {
           }
         } finally {
           setIsLoading(false);
+          setStageMessage('');
         }
       };
 
@@ -121,6 +167,8 @@ const GifGenerator = ({ subscriptionActive }) => {
         {isLoading ? 'Criando seu gif, aguarde...' : '✨ Gerar Gif Mágico'}
       </button>
 
+      {isLoading && stageMessage && <div className="stage-message">{stageMessage}</div>}
+
       {error && <div className="error-message">{error}</div>}
 
       {/* Exibe o resultado quando 'generatedGifUrl' tiver um valor */}
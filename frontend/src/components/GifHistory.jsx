@@ -1,7 +1,7 @@
 import React from 'react';
 import './GifHistory.css';
 
-const GifHistory = ({ gifs, isLoading }) => {
+const GifHistory = ({ gifs, isLoading, hasMore, isLoadingMore, onLoadMore }) => {
   if (isLoading) {
     return <p>Carregando histórico...</p>;
   }
@@ -20,13 +20,19 @@ const GifHistory = ({ gifs, isLoading }) => {
     return text.replace(', beautiful, high quality, cinematic', '');
   };
 
+  // Na galeria usa a versão menor do GIF (se existir); o download continua com o GIF original.
+  const thumbnailUrl = (gif) => {
+    const thumbnail = (gif.renditions || []).find((rendition) => rendition.name === 'gif_240');
+    return thumbnail ? thumbnail.url : gif.gif_url;
+  };
+
   return (
     <div className="gif-history-list">
       {gifs.map((gif) => (
         <div key={gif.id} className="gif-history-card">
           {/* Coluna da Imagem */}
           <div className="gif-image-container">
-            <img src={gif.gif_url} alt={gif.prompt} className="gif-history-image" />
+            <img src={thumbnailUrl(gif)} alt={gif.prompt} className="gif-history-image" />
           </div>
 
           {/* Coluna dos Detalhes */}
@@ -52,6 +58,13 @@ const GifHistory = ({ gifs, isLoading }) => {
           </div>
         </div>
       ))}
+
+      {/* O histórico é paginado: carrega a próxima página sob demanda */}
+      {hasMore && (
+        <button className="btn btn-secondary load-more-btn" onClick={onLoadMore} disabled={isLoadingMore}>
+          {isLoadingMore ? 'Carregando...' : 'Carregar mais'}
+        </button>
+      )}
     </div>
   );
 };
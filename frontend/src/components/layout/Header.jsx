@@ -2,13 +2,20 @@
 
 import React from 'react';
 import { Link, useNavigate } from 'react-router-dom';
+import { logoutUser } from '../../services/api';
 import './Header.css';
 
 export const Header = () => {
   const navigate = useNavigate();
   const authToken = localStorage.getItem('authToken');
 
-  const handleLogout = () => {
+  const handleLogout = async () => {
+    // Invalida o token no servidor; mesmo se falhar, o logout local continua.
+    try {
+      await logoutUser();
+    } catch (error) {
+      console.error('Falha ao encerrar a sessão no servidor:', error);
+    }
     localStorage.removeItem('authToken');
     // Redireciona o usuário para a página de login
     navigate('/login');
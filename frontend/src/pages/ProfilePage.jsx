@@ -4,7 +4,7 @@ import { getUserProfile, getUserSubscriptionDetails, cancelUserSubscription } fr
 import ImageGenerator from '../components/GifGenerator';
 import './ProfilePage.css';
 
-import { getGifHistory } from '../services/api'; //
+import { getGifHistory, getCursorFromUrl } from '../services/api'; //
 import GifHistory from '../components/GifHistory';
 
 const ProfilePage = () => {
@@ -18,6 +18,8 @@ const ProfilePage = () => {
   const [isCanceling, setIsCanceling] = useState(false);
   const [gifHistory, setGifHistory] = useState([]); // 3. Adicione o novo state
   const [isHistoryLoading, setIsHistoryLoading] = useState(true);
+  const [historyCursor, setHistoryCursor] = useState(null); // cursor da próxima página do histórico
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
 
   useEffect(() => {
     const fetchAllData = async () => {
@@ -33,7 +35,8 @@ const ProfilePage = () => {
         // Busca o histórico de GIFs
         try {
           const historyData = await getGifHistory();
-          setGifHistory(historyData);
+          setGifHistory(historyData.results);
+          setHistoryCursor(getCursorFromUrl(historyData.next));
         } catch (historyErr) {
           console.error("Falha ao carregar o histórico de GIFs:", historyErr);
         }
@@ -48,6 +51,19 @@ const ProfilePage = () => {
     fetchAllData();
   }, [navigate]);
 
+    const handleLoadMoreHistory = async () => {
+        setIsLoadingMore(true);
+        try {
+          const historyData = await getGifHistory(historyCursor);
+          setGifHistory((current) => [...current, ...historyData.results]);
+          setHistoryCursor(getCursorFromUrl(historyData.next));
+        } catch (historyErr) {
+          console.error("Falha ao carregar mais GIFs do histórico:", historyErr);
+        } finally {
+          setIsLoadingMore(false);
+        }
+    };
+
     const handleCancelSubscription = async () => {
         if (!window.confirm('Tem certeza que deseja agendar o cancelamento da sua assinatura? Seu acesso continuará ativo até o final do período pago.')) {
           return;
@@ -118,7 +134,13 @@ const ProfilePage = () => {
         )}
 
         {activeTab === 'history' && (
-          <GifHistory gifs={gifHistory} isLoading={isHistoryLoading} />
+          <GifHistory
+            gifs={gifHistory}
+            isLoading={isHistoryLoading}
+            hasMore={Boolean(historyCursor)}
+            isLoadingMore={isLoadingMore}
+            onLoadMore={handleLoadMoreHistory}
+          />
         )}
         {activeTab === 'plan' && (
           <div className="plan-status-card">
@@ -55,6 +55,14 @@ export const loginUser = (credentials) => {
   });
 };
 
+/**
+ * Encerra a sessão no servidor (invalida o token atual).
+ * @returns {Promise<Object>} - Confirmação do logout.
+ */
+export const logoutUser = () => {
+  return request('/users/logout/', { method: 'POST' });
+};
+
 /**
  * Registra um novo usuário.
  * @param {Object} userData - Dados do usuário para registro (username, password, email, first_name, taxId, cellphone).
@@ -123,8 +131,10 @@ export const cancelUserSubscription = async () => {
 
 /**
  * Envia um prompt para a IA gerar uma imagem e animar um GIF.
+ * A geração roda em segundo plano no backend; use getGenerationJob para acompanhar.
  * @param {Object} promptData - Objeto contendo 'prompt' (descrição da imagem) e 'text' (texto para sobrepor).
- * @returns {Promise<Object>} - Um objeto contendo a URL do GIF gerado.
+ * @returns {Promise<Object>} - Um objeto contendo 'job_id', 'status', 'status_url' e, se o servidor
+ *   oferecer o stream de andamento, 'events_url' (ver streamGenerationEvents).
  */
 export const generateAiImage = (promptData) => {
   const endpoint = '/gif/generate-image/';
@@ -133,10 +143,82 @@ export const generateAiImage = (promptData) => {
     body: JSON.stringify(promptData),
   });
 };
+
+/**
+ * Consulta o status de um job de geração de GIF.
+ * @param {string} jobId - O id retornado por generateAiImage.
+ * @returns {Promise<Object>} - Objeto com 'status' ('pending', 'running', 'succeeded', 'failed'), 'gif_url' e 'error'.
+ */
+export const getGenerationJob = (jobId) => {
+  return request(`/gif/jobs/${jobId}/`);
+};
+
+/**
+ * Acompanha as etapas de um job de geração pelo stream SSE do backend (uma única conexão).
+ * Só disponível quando a resposta de generateAiImage traz 'events_url' (backend sob ASGI).
+ * Usa fetch em vez de EventSource para poder enviar o cabeçalho Authorization.
+ * @param {string} jobId - O id retornado por generateAiImage.
+ * @param {Function} onEvent - Chamada com (evento, dados) a cada etapa ('prompt_enhanced', 'base_image_ready', ...).
+ * @param {AbortSignal} [signal] - Permite encerrar a conexão antes do fim.
+ * @returns {Promise<Object>} - Resolve com { event, data } do evento final ('succeeded' ou 'failed').
+ * @throws {Error} - Se a conexão falhar ou terminar antes do evento final.
+ */
+export const streamGenerationEvents = async (jobId, onEvent, signal) => {
+  const token = localStorage.getItem('authToken');
+  const response = await fetch(`${API_BASE_URL}/gif/jobs/${jobId}/events/`, {
+    headers: token ? { Authorization: `Token ${token}`, Accept: 'text/event-stream' } : {},
+    signal,
+  });
+  if (!response.ok || !response.body) {
+    const error = new Error('Não foi possível acompanhar a geração.');
+    error.status = response.status;
+    throw error;
+  }
+
+  const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+  let buffer = '';
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += value;
+    // Cada mensagem SSE termina numa linha em branco
+    let end;
+    while ((end = buffer.indexOf('\n\n')) !== -1) {
+      const message = buffer.slice(0, end);
+      buffer = buffer.slice(end + 2);
+      let event = 'message';
+      let data = '';
+      for (const line of message.split('\n')) {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) data += line.slice(5).trim();
+      }
+      if (!data) continue; // keep-alive (": ping")
+      const parsed = JSON.parse(data);
+      onEvent(event, parsed);
+      if (event === 'succeeded' || event === 'failed') {
+        reader.cancel();
+        return { event, data: parsed };
+      }
+    }
+  }
+  throw new Error('A conexão de acompanhamento foi encerrada antes do fim da geração.');
+};
+
+/**
+ * Obtém uma página do histórico de GIFs gerados pelo usuário autenticado (do mais novo ao mais antigo).
+ * @param {string} [cursor] - Cursor da próxima página, extraído de 'next' da resposta anterior.
+ * @returns {Promise<Object>} - Objeto com 'results' (lista de GIFs), 'next' e 'previous' (URLs ou null).
+ */
+export const getGifHistory = (cursor) => {
+  const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+  return request(`/gif/history/${query}`);
+};
+
 /**
- * Obtém o histórico de GIFs gerados pelo usuário autenticado.
- * @returns {Promise<Array>} - Uma lista de objetos de GIFs.
+ * Extrai o cursor de uma URL 'next'/'previous' devolvida pelo histórico paginado.
+ * @param {string|null} pageUrl - A URL da página.
+ * @returns {string|null} - O cursor, ou null se não houver página.
  */
-export const getGifHistory = () => {
-  return request('/gif/history/');
+export const getCursorFromUrl = (pageUrl) => {
+  return pageUrl ? new URL(pageUrl).searchParams.get('cursor') : null;
 };
\ No newline at end of file
@@ -1,3 +1,12 @@
 from django.contrib import admin
 
 # Register your models here.
+from .models import GenerationJob
+
+
+@admin.register(GenerationJob)
+class GenerationJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'status', 'created_at', 'finished_at')
+    list_select_related = ('user',)
+    list_filter = ('status',)
+    search_fields = ('user__username', 'prompt')
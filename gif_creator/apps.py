@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class GifCreatorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'gif_creator'
+
+    def ready(self):
+        # Remove arquivos de rascunho deixados por processos que morreram no meio de um job.
+        from .scratch import get_scratch
+
+        removed = get_scratch().sweep()
+        if removed:
+            print(f"--- Espaço de rascunho: {removed} arquivo(s) órfão(s) removido(s) ---")
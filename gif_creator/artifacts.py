@@ -0,0 +1,183 @@
+# gif_creator/artifacts.py
+"""
+Cache endereçado por conteúdo dos artefatos de geração e coalescência de pedidos idênticos.
+
+A chave de um pedido é o hash do prompt normalizado + texto sobreposto. Cada etapa cara
+(imagem base do ClipDrop, vídeo do Runway, GIF final) grava seu resultado em um caminho
+derivado da chave, então um pedido repetido só executa as etapas que ainda faltam.
+
+Os artefatos intermediários (imagem base e vídeo) são só cache: `evict` remove os que
+não são usados há GIF_ARTIFACTS_TTL segundos e, se o diretório passar de
+GIF_ARTIFACTS_MAX_BYTES, os menos usados primeiro (comando evict_artifacts). Um artefato
+removido é gerado de novo no próximo pedido igual.
+
+O SingleFlight garante que pedidos idênticos simultâneos no mesmo processo esperem
+por um único pipeline em vez de cada um iniciar o seu (AsyncSingleFlight faz o mesmo
+entre corrotinas do caminho assíncrono).
+"""
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+
+from .prompt_cache import normalize_prompt
+
+ARTIFACTS_DIR = 'artifacts'
+
+
+def artifact_key(prompt, overlay_text=''):
+    payload = f"{normalize_prompt(prompt)}\0{(overlay_text or '').strip()}"
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def artifact_relpath(key, extension):
+    """Caminho (relativo a MEDIA_ROOT) de um artefato intermediário."""
+    return os.path.join(ARTIFACTS_DIR, f"{key}.{extension}")
+
+
+def absolute_path(relpath):
+    return os.path.join(settings.MEDIA_ROOT, relpath)
+
+
+def exists(relpath):
+    """O artefato está no disco? Se estiver, é marcado como usado agora (mtime), para o `evict`."""
+    if not relpath:
+        return False
+    try:
+        os.utime(absolute_path(relpath))
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def write_atomic(relpath, data):
+    """Grava `data` em um arquivo temporário e renomeia, para nunca expor um artefato pela metade."""
+    path = absolute_path(relpath)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # pid + thread: processos diferentes (workers, pool de encode) gravando a mesma chave não se atropelam.
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def evict(ttl=None, max_bytes=None):
+    """
+    Remove os artefatos sem uso há mais de `ttl` segundos e, enquanto o total passar de
+    `max_bytes`, os menos usados (padrões: GIF_ARTIFACTS_TTL e GIF_ARTIFACTS_MAX_BYTES).
+    Temporários (.tmp) de gravações interrompidas seguem a mesma regra.
+
+    Returns:
+        tuple: (arquivos removidos, bytes liberados)
+    """
+    ttl = settings.GIF_ARTIFACTS_TTL if ttl is None else ttl
+    max_bytes = settings.GIF_ARTIFACTS_MAX_BYTES if max_bytes is None else max_bytes
+    directory = absolute_path(ARTIFACTS_DIR)
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return 0, 0
+
+    files = []
+    for entry in entries:
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        if entry.is_file():
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+    files.sort()  # menos usados primeiro
+
+    cutoff = time.time() - ttl
+    total = sum(size for _, size, _ in files)
+    removed = freed = 0
+    for mtime, size, path in files:
+        if mtime >= cutoff and total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        else:
+            removed += 1
+            freed += size
+        total -= size
+    return removed, freed
+
+
+class SingleFlight:
+    """
+    Executa no máximo uma chamada por chave ao mesmo tempo.
+    Quem chega enquanto a chave está em andamento recebe o mesmo resultado (ou a mesma exceção).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = {}
+
+    def run(self, key, fn):
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._in_flight[key] = future
+
+        if not leader:
+            print(f"--- Pedido idêntico em andamento ({key[:12]}); aguardando o resultado ---")
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+
+class AsyncSingleFlight:
+    """SingleFlight para corrotinas num mesmo event loop: `await run(key, fn)`, com `fn` assíncrona."""
+
+    def __init__(self):
+        self._in_flight = {}
+
+    async def run(self, key, fn):
+        future = self._in_flight.get(key)
+        if future is not None:
+            print(f"--- Pedido idêntico em andamento ({key[:12]}); aguardando o resultado ---")
+            # shield: cancelar quem espera não cancela o pipeline do primeiro pedido.
+            return await asyncio.shield(future)
+
+        future = self._in_flight[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Marca a exceção como recuperada caso ninguém mais esteja esperando.
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._in_flight[key]
+
+
+single_flight = SingleFlight()
+async_single_flight = AsyncSingleFlight()
@@ -0,0 +1,65 @@
+# gif_creator/async_jobs.py
+"""
+Executor dos jobs de geração no event loop do servidor ASGI.
+
+Em vez de ocupar uma thread do pool de jobs.py durante todo o pipeline (quase todo ele
+esperando o Runway), cada job vira uma tarefa asyncio no loop do próprio worker ASGI.
+Um único worker acompanha centenas de gerações ao mesmo tempo; o limite é
+GIF_ASYNC_MAX_JOBS tarefas em andamento por processo. As escritas no banco do ciclo de
+vida do job são as mesmas de jobs.py, chamadas via sync_to_async.
+
+Só funciona com um event loop que continue rodando depois da resposta (servidor ASGI).
+Sob WSGI a view assíncrona usa o pool de threads de jobs.py (ver views.py).
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from . import progress
+from .jobs import JobQueueFull, fail_job, finish_job, start_job
+from .pipeline_metrics import JOBS_IN_FLIGHT
+
+_tasks = set()
+
+
+def submit_generation_job_async(job):
+    """
+    Agenda o job como tarefa no event loop em execução.
+
+    Raises:
+        JobQueueFull: se o processo já tem GIF_ASYNC_MAX_JOBS jobs em andamento.
+    """
+    if len(_tasks) >= settings.GIF_ASYNC_MAX_JOBS:
+        raise JobQueueFull("Servidor ocupado. Tente novamente em alguns instantes.")
+    task = asyncio.get_running_loop().create_task(run_job_async(job.pk), name=f"gif-job-{job.pk}")
+    # O loop só guarda referência fraca às tarefas: sem este conjunto o job poderia ser coletado no meio.
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return task
+
+
+def in_flight_count():
+    return len(_tasks)
+
+
+async def run_job_async(job_id):
+    """Executa o pipeline do job `job_id` no event loop atual, do início ao fim."""
+    # Import local para evitar import circular (services importa models).
+    from .services import AsyncAnimationService
+
+    JOBS_IN_FLIGHT.inc()
+    try:
+        job = await sync_to_async(start_job)(job_id)
+        if job is None:
+            return
+        try:
+            service = AsyncAnimationService(user=job.user, prompt=job.prompt, overlay_text=job.overlay_text,
+                                            progress=progress.broker.reporter(job.pk))
+            await service.generate_animated_gif()
+        except Exception as e:
+            await sync_to_async(fail_job)(job, e)
+        else:
+            await sync_to_async(finish_job)(job, service.generated_gif)
+    finally:
+        JOBS_IN_FLIGHT.dec()
@@ -0,0 +1,194 @@
+# gif_creator/async_providers.py
+"""
+Versões assíncronas dos provedores de providers.py, para o caminho de geração em ASGI
+(async_jobs.py).
+
+Mesmos tipos ('prompt', 'image', 'video') e mesmas opções (GIF_PROVIDER_OPTIONS); a
+classe de cada um vem de GIF_ASYNC_PROVIDERS. As chamadas HTTP usam `httpx.AsyncClient`
+(Gif_generator_project/http_clients.py) e a espera pelo Runway é um laço com
+`asyncio.sleep` e backoff, então uma geração em andamento não ocupa nenhuma thread:
+um único event loop acompanha centenas delas.
+"""
+import asyncio
+import threading
+import time
+
+import httpx
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from Gif_generator_project.http_clients import get_async_client
+from Gif_generator_project.metrics import UPSTREAM_ERRORS
+from .pipeline_metrics import STAGE_SECONDS
+from .providers import (
+    CLIPDROP_API_URL, GEMINI_MODEL_NAME, META_PROMPT, VIDEO_DOWNLOAD_CHUNK_SIZE, GeminiPromptEnhancer,
+    RunwayVideoGenerator, clipdrop_error, runway_status_reporter, video_output,
+)
+from .progress import RUNWAY_QUEUED
+from .runway_poller import (
+    RUNWAY_API_BASE_URL, RUNWAY_FAILED_STATUSES, RunwayTaskFailed, RunwayTaskTimeout, get_poller,
+)
+
+
+class AsyncPromptEnhancer:
+    async def enhance(self, prompt):
+        """Retorna o prompt aprimorado, ou None se o provedor não devolver nada utilizável."""
+        raise NotImplementedError
+
+
+class AsyncImageGenerator:
+    async def generate(self, prompt):
+        """Gera a imagem para `prompt` e retorna os bytes do arquivo (PNG/JPEG)."""
+        raise NotImplementedError
+
+
+class AsyncVideoGenerator:
+    async def animate(self, image_bytes, progress=None):
+        """Anima a imagem (JPEG) e retorna uma referência ao vídeo gerado, para `download`."""
+        raise NotImplementedError
+
+    async def download(self, source, path):
+        """Grava em `path` o MP4 referenciado por `source`."""
+        raise NotImplementedError
+
+
+# --- Implementações reais ---
+
+class AsyncGeminiPromptEnhancer(AsyncPromptEnhancer):
+    def __init__(self, model_name=GEMINI_MODEL_NAME, timeout=None):
+        self._gemini = GeminiPromptEnhancer(model_name, timeout)
+
+    async def enhance(self, prompt):
+        response = await self._gemini.model.generate_content_async(
+            META_PROMPT.format(prompt=prompt), request_options={'timeout': self._gemini.timeout},
+        )
+        if not response.parts:
+            return None
+        return response.text.strip()
+
+
+class AsyncClipDropImageGenerator(AsyncImageGenerator):
+    async def generate(self, prompt):
+        files = {'prompt': (None, prompt, 'text/plain')}
+        headers = {'x-api-key': settings.CLIPDROP_API_KEY}
+        response = await get_async_client('clipdrop').post(CLIPDROP_API_URL, headers=headers, files=files)
+        if response.is_success:
+            return response.content
+        raise clipdrop_error(response)
+
+
+class AsyncRunwayVideoGenerator(AsyncVideoGenerator):
+    """
+    Inicia a tarefa no Runway e a acompanha com `asyncio.sleep` entre as consultas, no
+    mesmo calendário do RunwayTaskPoller (runway_poller.PollSchedule, com as settings
+    RUNWAY_POLL_* e RUNWAY_TASK_TIMEOUT).
+    """
+
+    def __init__(self, model='gen4_turbo', duration=3, ratio='960:960'):
+        self._runway = RunwayVideoGenerator(model, duration, ratio)
+
+    async def animate(self, image_bytes, progress=None):
+        """Envia a imagem ao Runway e espera a tarefa terminar. Retorna a URL do vídeo."""
+        headers, start_payload = self._runway.start_request(image_bytes)
+        with STAGE_SECONDS.time(stage='runway_submit'):
+            start_response = await get_async_client('runway').post(f"{RUNWAY_API_BASE_URL}/image_to_video",
+                                                                   headers=headers, json=start_payload)
+        if start_response.status_code != 200:
+            raise Exception(f"Erro ao iniciar a tarefa no Runway: {start_response.text}")
+
+        task_id = start_response.json()['id']
+        print(f"--- Tarefa iniciada com ID: {task_id} ---")
+        on_status = None
+        if progress is not None:
+            progress(RUNWAY_QUEUED, task_id=task_id)
+            on_status = runway_status_reporter(progress)
+
+        with STAGE_SECONDS.time(stage='runway_wait'):
+            status_data = await self._wait(task_id, on_status)
+        return video_output(status_data)
+
+    async def _wait(self, task_id, on_status=None):
+        headers = {
+            "Authorization": f"Bearer {settings.RUNWAY_API_KEY}",
+            "X-Runway-Version": "2024-11-06",
+        }
+        url = f"{RUNWAY_API_BASE_URL}/tasks/{task_id}"
+        schedule = get_poller().schedule()
+
+        while True:
+            now = time.monotonic()
+            await asyncio.sleep(max(0.0, schedule.next_poll_at(now) - now))
+
+            try:
+                response = await get_async_client('runway').get(url, headers=headers)
+                response.raise_for_status()
+                status_data = response.json()
+            except Exception as e:
+                # Erro de rede ou HTTP: tenta de novo no próximo intervalo, até o prazo.
+                print(f"!!! Erro ao consultar a tarefa {task_id} no Runway: {e} !!!")
+                status_data = None
+
+            if status_data is not None:
+                task_status = status_data.get('status')
+                if task_status == 'SUCCEEDED':
+                    return status_data
+                if task_status in RUNWAY_FAILED_STATUSES:
+                    UPSTREAM_ERRORS.inc(provider='runway')
+                    raise RunwayTaskFailed(f"A tarefa no Runway falhou: {status_data}")
+                if on_status is not None:
+                    on_status(status_data)
+
+            if schedule.expired(time.monotonic()):
+                UPSTREAM_ERRORS.inc(provider='runway')
+                raise RunwayTaskTimeout(f"A tarefa {task_id} do Runway excedeu o prazo.")
+            schedule.backoff()
+
+    async def download(self, source, path):
+        """
+        Baixa o vídeo em blocos direto para o disco, com os mesmos limites de
+        tamanho (VIDEO_DOWNLOAD_MAX_BYTES) e de tempo (VIDEO_DOWNLOAD_TIMEOUT) da versão síncrona.
+        """
+        max_bytes = settings.VIDEO_DOWNLOAD_MAX_BYTES
+        deadline = time.monotonic() + settings.VIDEO_DOWNLOAD_TIMEOUT
+
+        runway = get_async_client('runway')
+        timeout = httpx.Timeout(settings.VIDEO_DOWNLOAD_READ_TIMEOUT, connect=runway.timeout.connect, pool=None)
+        async with runway.stream('GET', source, timeout=timeout) as video_response:
+            video_response.raise_for_status()
+
+            content_length = int(video_response.headers.get('Content-Length') or 0)
+            if content_length > max_bytes:
+                raise Exception(f"Vídeo do Runway grande demais ({content_length} bytes).")
+
+            downloaded = 0
+            with open(path, 'wb') as f:
+                async for chunk in video_response.aiter_bytes(chunk_size=VIDEO_DOWNLOAD_CHUNK_SIZE):
+                    downloaded += len(chunk)
+                    if downloaded > max_bytes:
+                        raise Exception(f"Vídeo do Runway passou do limite de {max_bytes} bytes.")
+                    if time.monotonic() > deadline:
+                        raise Exception("Tempo esgotado ao baixar o vídeo do Runway.")
+                    f.write(chunk)
+
+
+_providers = {}
+_lock = threading.Lock()
+
+
+def get_async_provider(kind):
+    """Instância assíncrona do provedor `kind` ('prompt', 'image' ou 'video'), criada uma vez por processo."""
+    provider = _providers.get(kind)
+    if provider is None:
+        with _lock:
+            provider = _providers.get(kind)
+            if provider is None:
+                provider_class = import_string(settings.GIF_ASYNC_PROVIDERS[kind])
+                options = settings.GIF_PROVIDER_OPTIONS.get(kind, {})
+                provider = _providers[kind] = provider_class(**options)
+    return provider
+
+
+def reset_async_providers():
+    """Descarta as instâncias criadas (usado quando GIF_ASYNC_PROVIDERS muda, ex.: em testes)."""
+    with _lock:
+        _providers.clear()
@@ -0,0 +1,206 @@
+# gif_creator/benchmarks.py
+"""
+Casos de benchmark da parte local (CPU) do pipeline, usados pelos comandos bench_*.
+
+As fixtures (imagem base e MP4) são sintéticas e determinísticas: geradas na primeira
+execução num diretório de cache e reaproveitadas depois, para não versionar binários.
+Cada caso roda num processo filho (fork) para que o pico de memória (RSS) medido seja
+só daquele caso; um filho que trava ou morre vira um caso com 'error', sem travar o comando.
+"""
+import multiprocessing
+import os
+import tempfile
+import time
+from io import BytesIO
+from queue import Empty
+
+import numpy as np
+from django.test import override_settings
+from moviepy import VideoClip, VideoFileClip
+from PIL import Image, ImageDraw
+
+from . import gif_encoder, renditions, text_overlay
+from .encode_pool import reset_encode_pool
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+FIXTURE_FPS = 24
+# Tempo máximo de um caso, em segundos
+CASE_TIMEOUT = 600
+OVERLAY_TEXT = "Que seu dia seja iluminado!"
+
+
+def synthetic_clip(width=480, height=480, duration=3.0):
+    """Clipe sintético: gradiente fixo com um bloco em movimento e um pouco de ruído, como um vídeo real."""
+    yy, xx = np.mgrid[0:height, 0:width]
+    background = np.zeros((height, width, 3), dtype=np.uint8)
+    background[..., 0] = xx * 255 // width
+    background[..., 1] = yy * 255 // height
+    background[..., 2] = 128
+    rng = np.random.default_rng(0)
+
+    def make_frame(t):
+        frame = background.copy()
+        x = int((width - 60) * t / duration)
+        frame[height // 2 - 30:height // 2 + 30, x:x + 60] = (255, 220, 0)
+        frame += rng.integers(0, 3, frame.shape, dtype=np.uint8)
+        return frame
+
+    return VideoClip(make_frame, duration=duration)
+
+
+def image_fixture(fixtures_dir, size):
+    path = os.path.join(fixtures_dir, f"base_{size}.png")
+    if not os.path.exists(path):
+        image = Image.new('RGB', (size, size))
+        draw = ImageDraw.Draw(image)
+        for i in range(0, size, max(1, size // 32)):
+            draw.rectangle([i, 0, i + size // 32, size], fill=(i * 255 // size, 90, 255 - i * 255 // size))
+        draw.ellipse([size // 4, size // 4, 3 * size // 4, 3 * size // 4], fill=(240, 200, 40))
+        image.save(path)
+    return path
+
+
+def video_fixture(fixtures_dir, resolution, duration):
+    path = os.path.join(fixtures_dir, f"clip_{resolution}_{duration}s.mp4")
+    if not os.path.exists(path):
+        clip = synthetic_clip(resolution, resolution, duration)
+        clip.write_videofile(path, fps=FIXTURE_FPS, codec='libx264', audio=False, logger=None)
+        clip.close()
+    return path
+
+
+# --- Casos (rodam no processo filho; retornam o tamanho da saída em bytes ou None) ---
+
+def _case_overlay(image_path, iterations=20):
+    base = Image.open(image_path).convert('RGBA')
+    output = None
+    for _ in range(iterations):
+        image = text_overlay.draw_overlay(base.copy(), OVERLAY_TEXT)
+        buffered = BytesIO()
+        image.convert('RGB').save(buffered, format='JPEG')
+        output = buffered.getbuffer().nbytes
+    return output
+
+
+def _case_resize(video_path, fps, width=480):
+    clip = VideoFileClip(video_path)
+    resized = clip.resized(width=width)
+    try:
+        for _ in resized.iter_frames(fps=fps, dtype='uint8'):
+            pass
+    finally:
+        resized.close()
+        clip.close()
+    return None
+
+
+def _case_encode(video_path, fps, output_dir, width=480):
+    clip = VideoFileClip(video_path)
+    resized = clip.resized(width=width)
+    path = os.path.join(output_dir, 'encode.gif')
+    try:
+        gif_encoder.encode_clip(resized, path, fps, tolerance=8)
+    finally:
+        resized.close()
+        clip.close()
+    return os.path.getsize(path)
+
+
+def _case_write_gif(video_path, fps, output_dir, width=480):
+    clip = VideoFileClip(video_path)
+    resized = clip.resized(width=width)
+    path = os.path.join(output_dir, 'moviepy.gif')
+    try:
+        resized.write_gif(path, fps=fps, logger=None)
+    finally:
+        resized.close()
+        clip.close()
+    return os.path.getsize(path)
+
+
+def _case_renditions(video_path, fps, output_dir):
+    # Encode na própria thread do filho: mede só o trabalho do caso (e não o pool de processos,
+    # que não pode ser usado a partir de um processo criado por fork).
+    with override_settings(MEDIA_ROOT=output_dir, GIF_ENCODE_PROCESSES=0):
+        reset_encode_pool()
+        try:
+            outputs = renditions.render_all(video_path, fps=fps)
+        finally:
+            reset_encode_pool()
+    return sum(output['bytes'] for output in outputs)
+
+
+CASES = {
+    'overlay': _case_overlay,
+    'resize': _case_resize,
+    'encode': _case_encode,
+    'write_gif': _case_write_gif,
+    'renditions': _case_renditions,
+}
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss vem em KiB no Linux (e em bytes no macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / 1024 / (1024 if os.uname().sysname == 'Darwin' else 1), 1)
+
+
+def _child(queue, kind, kwargs):
+    try:
+        with tempfile.TemporaryDirectory() as output_dir:
+            if kind in ('encode', 'write_gif', 'renditions'):
+                kwargs = dict(kwargs, output_dir=output_dir)
+            start = time.perf_counter()
+            output_bytes = CASES[kind](**kwargs)
+            wall = time.perf_counter() - start
+        queue.put({'wall_seconds': round(wall, 4), 'peak_rss_mb': _peak_rss_mb(), 'output_bytes': output_bytes})
+    except Exception as e:
+        queue.put({'error': f"{type(e).__name__}: {e}"})
+
+
+def run_case(kind, timeout=CASE_TIMEOUT, **kwargs):
+    """
+    Executa um caso num processo filho e retorna wall time, pico de RSS e bytes de saída,
+    ou {'error': ...} se o caso falhar, o filho morrer ou passar de `timeout` segundos.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    if 'fork' not in methods:
+        # Sem fork (Windows) roda no próprio processo; o RSS medido é o do processo todo.
+        queue = _InlineQueue()
+        _child(queue, kind, kwargs)
+        return queue.get()
+
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    process = context.Process(target=_child, args=(queue, kind, kwargs))
+    process.start()
+    deadline = time.monotonic() + timeout
+    result = None
+    while result is None:
+        try:
+            result = queue.get(timeout=0.5)
+        except Empty:
+            if not process.is_alive():
+                # O resultado pode ter sido enviado logo antes da saída.
+                try:
+                    result = queue.get(timeout=0.5)
+                except Empty:
+                    result = {'error': f"O processo do caso terminou sem resultado (exitcode {process.exitcode})."}
+            elif time.monotonic() > deadline:
+                process.kill()
+                result = {'error': f"Tempo esgotado ({timeout}s)."}
+    process.join(5)
+    return result
+
+
+class _InlineQueue(list):
+    put = list.append
+
+    def get(self):
+        return self.pop(0)
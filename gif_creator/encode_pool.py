@@ -0,0 +1,142 @@
+# gif_creator/encode_pool.py
+"""
+Pool de processos para o trabalho de CPU do pipeline: decodificar o vídeo, redimensionar
+os quadros e codificar as versões (renditions.py).
+
+Em threads, essas etapas disputam o GIL com o resto do processo e alguns encodes simultâneos
+deixam lenta toda a API do worker. Aqui elas rodam em GIF_ENCODE_PROCESSES processos (por
+padrão, um por núcleo disponível). A thread do job só entrega caminhos de arquivo e opções
+simples e recebe de volta o resultado; nada de quadros ou objetos grandes atravessa processos.
+
+No máximo GIF_ENCODE_PROCESSES + GIF_ENCODE_QUEUE_LIMIT encodes ficam no pool (executando
+ou na fila). Acima disso a thread do job espera por uma vaga, até GIF_ENCODE_WAIT_TIMEOUT.
+Com GIF_ENCODE_PROCESSES=0 o encode roda na própria thread, como antes. Também roda na
+própria thread dentro de processos filhos do multiprocessing (ex.: os casos do bench_pipeline):
+ali a saída do filho espera (join) os processos do pool, que só terminariam depois dela, e
+o processo nunca sai. Um pool herdado por fork (ex.: gunicorn com preload) não é reaproveitado:
+get_encode_pool cria outro no processo novo.
+
+Este módulo é importado pelos processos do pool antes do django.setup(): só dependências leves.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+
+class EncodeQueueFull(Exception):
+    """Nenhuma vaga no pool de codificação dentro do tempo de espera."""
+
+
+def _init_worker():
+    # Os processos começam "limpos" (forkserver/spawn): carregam o Django uma vez, na criação.
+    import django
+
+    django.setup()
+
+
+class EncodePool:
+    """
+    Args:
+        processes (int): processos do pool; 0 executa na thread de quem chama.
+        queue_limit (int): encodes que podem esperar na fila além dos em execução.
+        wait_timeout (float): espera máxima por uma vaga, em segundos (None = sem limite).
+        start_method (str): 'forkserver' ou 'spawn'. Não usamos fork: o processo do Django tem
+            threads (jobs, poller do Runway) e um fork no meio delas pode herdar locks presos.
+    """
+
+    def __init__(self, processes, queue_limit=0, wait_timeout=None, start_method=None):
+        self.processes = processes
+        self.wait_timeout = wait_timeout
+        self.pid = os.getpid()
+        if start_method is None:
+            methods = multiprocessing.get_all_start_methods()
+            start_method = 'forkserver' if 'forkserver' in methods else 'spawn'
+        self._context = multiprocessing.get_context(start_method)
+        self._slots = threading.BoundedSemaphore(max(processes, 1) + queue_limit)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._in_pool = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.processes, mp_context=self._context,
+                                                     initializer=_init_worker)
+            return self._executor
+
+    def _discard_executor(self, executor):
+        # Um processo morreu (ex.: falta de memória): o executor fica inutilizável, o próximo encode cria outro.
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def run(self, fn, *args):
+        """
+        Executa `fn(*args)` num processo do pool e retorna o resultado, bloqueando a thread atual.
+        `fn` e os argumentos precisam ser serializáveis (funções de módulo, caminhos, dicts).
+
+        Raises:
+            EncodeQueueFull: se não houver vaga dentro de wait_timeout.
+        """
+        if not self._slots.acquire(timeout=self.wait_timeout):
+            raise EncodeQueueFull(
+                f"Pool de codificação ocupado: nenhuma vaga em {self.wait_timeout}s. Tente novamente.")
+        with self._lock:
+            self._in_pool += 1
+        try:
+            if self.processes == 0 or multiprocessing.parent_process() is not None:
+                return fn(*args)
+            executor = self._get_executor()
+            try:
+                return executor.submit(fn, *args).result()
+            except BrokenProcessPool:
+                self._discard_executor(executor)
+                raise
+        finally:
+            with self._lock:
+                self._in_pool -= 1
+            self._slots.release()
+
+    def in_pool(self):
+        """Encodes executando ou na fila do pool agora."""
+        with self._lock:
+            return self._in_pool
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_encode_pool():
+    """Pool do processo, configurado pelas settings GIF_ENCODE_*; os processos só nascem no primeiro encode."""
+    global _pool
+    if _pool is None or _pool.pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool.pid != os.getpid():
+                # Depois de um fork, o executor herdado não tem as threads que o operam: começa do zero.
+                _pool = EncodePool(
+                    processes=settings.GIF_ENCODE_PROCESSES,
+                    queue_limit=settings.GIF_ENCODE_QUEUE_LIMIT,
+                    wait_timeout=settings.GIF_ENCODE_WAIT_TIMEOUT,
+                )
+    return _pool
+
+
+def reset_encode_pool():
+    """Encerra e descarta o pool (usado quando GIF_ENCODE_* mudam, ex.: em testes e benchmarks)."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None and pool.pid == os.getpid():
+        pool.shutdown()
@@ -0,0 +1,181 @@
+# gif_creator/fake_providers.py
+"""
+Provedores locais, sem rede e sem custo, para testes de carga e desenvolvimento.
+
+Cada um simula a latência do serviço real sorteando de uma distribuição configurável
+e falha numa fração configurável das chamadas. Ex. em GIF_PROVIDER_OPTIONS:
+
+    'video': {'latency': ('lognormal', 45, 0.4), 'error_rate': 0.05}
+
+Distribuições aceitas em `latency` (em segundos):
+    ('fixed', valor), ('uniform', mínimo, máximo), ('normal', média, desvio),
+    ('lognormal', mediana, sigma), ou apenas um número (= fixed).
+
+As classes Async* são as equivalentes para GIF_ASYNC_PROVIDERS: esperam com
+`asyncio.sleep` em vez de `time.sleep` e aceitam as mesmas opções.
+"""
+import asyncio
+import hashlib
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from io import BytesIO
+
+from PIL import Image, ImageDraw
+
+from .async_providers import AsyncImageGenerator, AsyncPromptEnhancer, AsyncVideoGenerator
+from .progress import RUNWAY_QUEUED
+from .providers import ImageGenerator, PromptEnhancer, VideoGenerator
+
+
+class FakeProviderError(Exception):
+    """Falha simulada de um provedor fake."""
+
+
+def sample_latency(latency, rng=random):
+    """Sorteia uma latência (segundos, nunca negativa) da distribuição `latency`."""
+    if isinstance(latency, (int, float)):
+        return max(0.0, float(latency))
+    kind, *params = latency
+    if kind == 'fixed':
+        value = params[0]
+    elif kind == 'uniform':
+        value = rng.uniform(params[0], params[1])
+    elif kind == 'normal':
+        value = rng.gauss(params[0], params[1])
+    elif kind == 'lognormal':
+        median, sigma = params
+        value = median * rng.lognormvariate(0, sigma)
+    else:
+        raise ValueError(f"Distribuição de latência desconhecida: {kind}")
+    return max(0.0, value)
+
+
+class _FakeProvider:
+    name = 'fake'
+
+    def __init__(self, latency=0.0, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def _draw(self):
+        with self._rng_lock:
+            return sample_latency(self.latency, self._rng), self._rng.random() < self.error_rate
+
+    def _simulate_call(self):
+        delay, fail = self._draw()
+        time.sleep(delay)
+        if fail:
+            raise FakeProviderError(f"Falha simulada do provedor {self.name}.")
+
+    async def _simulate_call_async(self):
+        delay, fail = self._draw()
+        await asyncio.sleep(delay)
+        if fail:
+            raise FakeProviderError(f"Falha simulada do provedor {self.name}.")
+
+
+class FakePromptEnhancer(_FakeProvider, PromptEnhancer):
+    name = 'prompt'
+
+    def enhance(self, prompt):
+        self._simulate_call()
+        return f"(masterpiece, best quality:1.2), {prompt}, (detailed:1.1)"
+
+
+class FakeImageGenerator(_FakeProvider, ImageGenerator):
+    name = 'image'
+
+    def __init__(self, size=1024, **kwargs):
+        super().__init__(**kwargs)
+        self.size = size
+
+    def generate(self, prompt):
+        self._simulate_call()
+        return self._render(prompt)
+
+    def _render(self, prompt):
+        # Cores derivadas do prompt: prompts diferentes geram imagens diferentes.
+        digest = hashlib.sha256(prompt.encode('utf-8')).digest()
+        top, bottom = tuple(digest[:3]), tuple(digest[3:6])
+        image = Image.new('RGB', (self.size, self.size))
+        draw = ImageDraw.Draw(image)
+        for y in range(0, self.size, 8):
+            t = y / self.size
+            color = tuple(int(a + (b - a) * t) for a, b in zip(top, bottom))
+            draw.rectangle([0, y, self.size, y + 8], fill=color)
+        radius = self.size // 5
+        center = self.size // 2
+        draw.ellipse([center - radius, center - radius, center + radius, center + radius], fill=tuple(digest[6:9]))
+
+        buffered = BytesIO()
+        image.save(buffered, format='PNG')
+        return buffered.getvalue()
+
+
+class FakeVideoGenerator(_FakeProvider, VideoGenerator):
+    """
+    Devolve sempre o mesmo MP4 sintético, gerado uma vez por processo em `cache_dir`
+    e copiado a cada download (como o vídeo real, que também é baixado para o disco).
+    """
+    name = 'video'
+
+    def __init__(self, size=960, duration=3, fps=24, cache_dir=None, **kwargs):
+        super().__init__(**kwargs)
+        self.size = size
+        self.duration = duration
+        self.fps = fps
+        self.cache_dir = cache_dir or os.path.join(tempfile.gettempdir(), 'gif_fake_provider')
+        self._clip_lock = threading.Lock()
+
+    def _clip_path(self):
+        path = os.path.join(self.cache_dir, f"clip_{self.size}_{self.duration}s_{self.fps}fps.mp4")
+        with self._clip_lock:
+            if not os.path.exists(path):
+                # Import local: o moviepy só é necessário para gerar o clipe na primeira vez.
+                from .benchmarks import synthetic_clip
+
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.tmp.mp4"
+                clip = synthetic_clip(self.size, self.size, self.duration)
+                clip.write_videofile(tmp_path, fps=self.fps, codec='libx264', audio=False, logger=None)
+                clip.close()
+                os.replace(tmp_path, path)
+        return path
+
+    def animate(self, image_bytes, progress=None):
+        if progress is not None:
+            progress(RUNWAY_QUEUED, task_id='fake')
+        self._simulate_call()
+        return self._clip_path()
+
+    def download(self, source, path):
+        shutil.copyfile(source, path)
+
+
+class AsyncFakePromptEnhancer(FakePromptEnhancer, AsyncPromptEnhancer):
+    async def enhance(self, prompt):
+        await self._simulate_call_async()
+        return f"(masterpiece, best quality:1.2), {prompt}, (detailed:1.1)"
+
+
+class AsyncFakeImageGenerator(FakeImageGenerator, AsyncImageGenerator):
+    async def generate(self, prompt):
+        await self._simulate_call_async()
+        return await asyncio.to_thread(self._render, prompt)
+
+
+class AsyncFakeVideoGenerator(FakeVideoGenerator, AsyncVideoGenerator):
+    async def animate(self, image_bytes, progress=None):
+        if progress is not None:
+            progress(RUNWAY_QUEUED, task_id='fake')
+        await self._simulate_call_async()
+        return await asyncio.to_thread(self._clip_path)
+
+    async def download(self, source, path):
+        await asyncio.to_thread(shutil.copyfile, source, path)
@@ -0,0 +1,217 @@
+# gif_creator/gif_encoder.py
+"""
+Encoder de GIF vetorizado com NumPy, usado no lugar do `clip.write_gif` do moviepy.
+
+- Paleta global: uma única paleta de 255 cores é calculada para o clipe inteiro
+  (k-means ponderado sobre o histograma de cores em 15 bits), e cada pixel é mapeado
+  por uma tabela de consulta de 32768 entradas.
+- Dithering opcional: ordenado (matriz de Bayer 4x4). Ao contrário do Floyd-Steinberg,
+  o padrão é estável entre quadros, o que mantém os quadros delta pequenos.
+- Quadros delta: a partir do segundo quadro, só o retângulo que mudou é gravado, e
+  os pixels que não mudaram dentro dele usam o índice transparente.
+
+A compressão LZW de cada quadro é feita pelo encoder em C do Pillow.
+"""
+import os
+import time
+
+import numpy as np
+from PIL import GifImagePlugin, Image
+
+TRANSPARENT_INDEX = 255
+MAX_COLORS = 255  # o índice 255 é reservado para a transparência dos quadros delta
+_BAYER_4X4 = np.array([[0, 8, 2, 10],
+                       [12, 4, 14, 6],
+                       [3, 11, 1, 9],
+                       [15, 7, 13, 5]], dtype=np.float32) / 16.0 - 0.5
+DITHER_STRENGTH = 24.0
+
+
+def _color_codes(frame):
+    """Converte um quadro RGB (uint8) em códigos de 15 bits (5 bits por canal)."""
+    frame = frame.astype(np.uint16)
+    return ((frame[..., 0] >> 3) << 10) | ((frame[..., 1] >> 3) << 5) | (frame[..., 2] >> 3)
+
+
+def _code_colors(codes):
+    """Cor RGB (float32) no centro de cada célula de 15 bits."""
+    codes = np.asarray(codes, dtype=np.int32)
+    rgb = np.stack([(codes >> 10) & 31, (codes >> 5) & 31, codes & 31], axis=-1)
+    return (rgb * 8 + 4).astype(np.float32)
+
+
+def _nearest(points, centers, chunk=8192):
+    """Índice do centro mais próximo de cada ponto (distância euclidiana), em blocos para limitar memória."""
+    result = np.empty(len(points), dtype=np.int32)
+    centers_sq = (centers ** 2).sum(axis=1)
+    for start in range(0, len(points), chunk):
+        block = points[start:start + chunk]
+        # |p - c|^2 = |p|^2 - 2 p.c + |c|^2; |p|^2 não muda o argmin
+        distances = centers_sq[None, :] - 2.0 * block @ centers.T
+        result[start:start + chunk] = distances.argmin(axis=1)
+    return result
+
+
+def build_palette(frames, max_colors=MAX_COLORS, iterations=8, sample_frames=12):
+    """
+    Calcula uma paleta global para uma sequência de quadros RGB.
+
+    Returns:
+        np.ndarray: paleta (n, 3) uint8, com n <= max_colors.
+    """
+    step = max(1, len(frames) // sample_frames)
+    histogram = np.zeros(32768, dtype=np.int64)
+    for frame in frames[::step]:
+        histogram += np.bincount(_color_codes(frame).ravel(), minlength=32768)
+
+    codes = np.flatnonzero(histogram)
+    weights = histogram[codes].astype(np.float32)
+    points = _code_colors(codes)
+
+    if len(codes) <= max_colors:
+        return points.round().clip(0, 255).astype(np.uint8)
+
+    # Inicializa com as cores mais frequentes e refina com k-means ponderado.
+    centers = points[np.argsort(weights)[::-1][:max_colors]].copy()
+    for _ in range(iterations):
+        labels = _nearest(points, centers)
+        totals = np.bincount(labels, weights=weights, minlength=len(centers))
+        used = totals > 0
+        for channel in range(3):
+            sums = np.bincount(labels, weights=weights * points[:, channel], minlength=len(centers))
+            centers[used, channel] = sums[used] / totals[used]
+
+    return centers.round().clip(0, 255).astype(np.uint8)
+
+
+class _Quantizer:
+    """Mapeia quadros RGB para índices da paleta usando uma tabela de 32768 entradas."""
+
+    def __init__(self, palette, dither=False):
+        self.palette = palette
+        self.dither = dither
+        self.lut = _nearest(_code_colors(np.arange(32768)), palette.astype(np.float32)).astype(np.uint8)
+        self._threshold = None
+
+    def __call__(self, frame):
+        if self.dither:
+            h, w = frame.shape[:2]
+            if self._threshold is None or self._threshold.shape != (h, w):
+                reps = (h // 4 + 1, w // 4 + 1)
+                self._threshold = (np.tile(_BAYER_4X4, reps)[:h, :w] * DITHER_STRENGTH)[..., None]
+            frame = (frame + self._threshold).clip(0, 255).astype(np.uint8)
+        return self.lut[_color_codes(frame)]
+
+
+def _frame_durations(count, fps):
+    """Durações em centésimos de segundo, acumulando o arredondamento para não desviar do fps."""
+    timestamps = np.round(np.arange(count + 1) * 100.0 / fps).astype(int)
+    return np.maximum(np.diff(timestamps), 2)
+
+
+def _header(width, height, palette, loop=0):
+    color_table = np.zeros((256, 3), dtype=np.uint8)
+    color_table[:len(palette)] = palette
+    return (
+        b"GIF89a"
+        + width.to_bytes(2, 'little') + height.to_bytes(2, 'little')
+        + bytes([0xF7, 0, 0])  # tabela global de 256 cores, resolução de 8 bits
+        + color_table.tobytes()
+        + b"!\xff\x0bNETSCAPE2.0\x03\x01" + loop.to_bytes(2, 'little') + b"\x00"
+    )
+
+
+def encode_gif(frames, path, fps, dither=False, tolerance=0):
+    """
+    Codifica uma sequência de quadros RGB (H, W, 3) uint8 como GIF animado em `path`.
+
+    Args:
+        frames (list): quadros do clipe, todos do mesmo tamanho.
+        path (str): arquivo de saída.
+        fps (float): quadros por segundo.
+        dither (bool): aplica dithering ordenado antes da quantização.
+        tolerance (int): distância RGB máxima entre as cores da paleta para considerar
+            um pixel "inalterado" entre quadros. 0 mantém os quadros sem perdas em
+            relação à paleta; valores pequenos (ex.: 8) reduzem bastante o arquivo.
+    """
+    frames = list(frames)
+    if not frames:
+        raise ValueError("Nenhum quadro para codificar.")
+
+    height, width = frames[0].shape[:2]
+    palette = build_palette(frames)
+    quantize = _Quantizer(palette, dither=dither)
+
+    palette_f = palette.astype(np.int32)
+    palette_distance = ((palette_f[:, None, :] - palette_f[None, :, :]) ** 2).sum(axis=-1)
+    tolerance_sq = tolerance * tolerance
+
+    durations = _frame_durations(len(frames), fps)
+    # Cada entrada: [imagem do quadro, deslocamento (x, y), duração em cs, usa transparência]
+    pending = []
+    canvas = None
+
+    for frame, duration in zip(frames, durations):
+        indices = quantize(frame)
+
+        if canvas is None:
+            pending.append([indices, (0, 0), int(duration), False])
+            canvas = indices.copy()
+            continue
+
+        changed = palette_distance[indices, canvas] > tolerance_sq
+        rows = np.flatnonzero(changed.any(axis=1))
+        if len(rows) == 0:
+            # Nada mudou: só estende a duração do quadro anterior.
+            pending[-1][2] += int(duration)
+            continue
+        cols = np.flatnonzero(changed.any(axis=0))
+        y0, y1, x0, x1 = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+
+        region_changed = changed[y0:y1, x0:x1]
+        region = np.where(region_changed, indices[y0:y1, x0:x1], TRANSPARENT_INDEX).astype(np.uint8)
+        canvas[y0:y1, x0:x1][region_changed] = indices[y0:y1, x0:x1][region_changed]
+        pending.append([region, (int(x0), int(y0)), int(duration), True])
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as fp:
+        fp.write(_header(width, height, palette))
+        for indices, offset, duration, transparent in pending:
+            image = Image.fromarray(indices)
+            params = {'duration': duration * 10, 'disposal': 1}
+            if transparent:
+                params['transparency'] = TRANSPARENT_INDEX
+            for chunk in GifImagePlugin.getdata(image, offset, **params):
+                fp.write(chunk)
+        fp.write(b";")
+    os.replace(tmp_path, path)
+    return path
+
+
+def encode_clip(clip, path, fps, dither=False, tolerance=0):
+    """Decodifica `clip` (VideoFileClip do moviepy) no fps desejado e codifica como GIF."""
+    frames = list(clip.iter_frames(fps=fps, dtype='uint8'))
+    return encode_gif(frames, path, fps, dither=dither, tolerance=tolerance)
+
+
+def compare_with_write_gif(clip, output_dir, fps, dither=False, tolerance=0):
+    """
+    Benchmark: codifica o mesmo clipe com este encoder e com `clip.write_gif` do moviepy.
+
+    Returns:
+        dict: tempo de codificação (s) e tamanho do arquivo (bytes) de cada encoder.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    results = {}
+
+    native_path = os.path.join(output_dir, 'native.gif')
+    start = time.perf_counter()
+    encode_clip(clip, native_path, fps, dither=dither, tolerance=tolerance)
+    results['native'] = {'seconds': time.perf_counter() - start, 'bytes': os.path.getsize(native_path)}
+
+    moviepy_path = os.path.join(output_dir, 'moviepy.gif')
+    start = time.perf_counter()
+    clip.write_gif(moviepy_path, fps=fps, logger=None)
+    results['moviepy'] = {'seconds': time.perf_counter() - start, 'bytes': os.path.getsize(moviepy_path)}
+
+    return results
@@ -0,0 +1,175 @@
+# gif_creator/jobs.py
+"""
+Pool local e limitado de workers que executa o pipeline de geração de GIFs.
+
+A view de geração apenas cria um GenerationJob e o entrega para este módulo.
+O pipeline (Gemini -> ClipDrop -> Runway -> download -> GIF) leva minutos, então
+ele roda em threads próprias, liberando os workers WSGI para o resto da API.
+"""
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+from subscriptions.quota import release_gif_slot
+from . import progress
+from .models import GenerationJob
+from .pipeline_metrics import JOBS_IN_FLIGHT, JOBS_TOTAL
+
+
+class JobQueueFull(Exception):
+    """Lançada quando o pool já tem o número máximo de jobs aguardando ou em execução."""
+
+
+_executor = ThreadPoolExecutor(max_workers=settings.GIF_WORKER_THREADS, thread_name_prefix='gif-job')
+# Limita jobs em execução + aguardando na fila, para não acumular trabalho sem fim em memória.
+_slots = threading.BoundedSemaphore(settings.GIF_WORKER_THREADS + settings.GIF_JOB_QUEUE_LIMIT)
+
+
+def submit_generation_job(job):
+    """
+    Agenda o job no pool de workers.
+
+    Raises:
+        JobQueueFull: se não houver vaga no pool; o chamador deve marcar o job como falho.
+    """
+    if not _slots.acquire(blocking=False):
+        raise JobQueueFull("Servidor ocupado. Tente novamente em alguns instantes.")
+    try:
+        _executor.submit(_run_job, job.pk)
+    except Exception:
+        _slots.release()
+        raise
+
+
+def _run_job(job_id):
+    close_old_connections()
+    try:
+        run_job(job_id)
+    finally:
+        _slots.release()
+        close_old_connections()
+
+
+def run_job(job_id):
+    """Executa o pipeline do job `job_id` na thread atual, do início ao fim."""
+    # Import local para evitar import circular (services importa models).
+    from .services import AnimationService
+
+    JOBS_IN_FLIGHT.inc()
+    try:
+        job = start_job(job_id)
+        if job is None:
+            return
+        try:
+            service = AnimationService(user=job.user, prompt=job.prompt, overlay_text=job.overlay_text,
+                                       progress=progress.broker.reporter(job.pk))
+            service.generate_animated_gif()
+        except Exception as e:
+            fail_job(job, e)
+        else:
+            finish_job(job, service.generated_gif)
+    finally:
+        JOBS_IN_FLIGHT.dec()
+
+
+# As funções abaixo concentram as escritas no banco do ciclo de vida do job; o executor
+# assíncrono (async_jobs.py) chama as mesmas via sync_to_async.
+#
+# Cada transição é um UPDATE condicional ao status anterior (pending -> running -> succeeded/failed):
+# um job que o fail_stale_jobs já deu como perdido (e reembolsou) não volta a rodar nem a concluir.
+
+def start_job(job_id):
+    """
+    Marca o job como em execução e o carrega (com o usuário). Retorna None se ele não estava
+    mais pendente (ex.: marcado como falho pelo fail_stale_jobs enquanto esperava na fila).
+    """
+    now = timezone.now()
+    if not GenerationJob.objects.filter(pk=job_id, status='pending').update(status='running', started_at=now):
+        print(f"--- Job {job_id} não está mais pendente; descartado ---")
+        return None
+    job = GenerationJob.objects.select_related('user').get(pk=job_id)
+    progress.broker.publish(job.pk, progress.STARTED)
+    return job
+
+
+def finish_job(job, gif):
+    job.gif = gif
+    job.status = 'succeeded'
+    if not _save_finished(job):
+        # O job foi dado como perdido (e a vaga devolvida) no meio do caminho: o resultado é descartado.
+        print(f"--- Job {job.pk} já finalizado por outro caminho; resultado descartado ---")
+        if gif is not None:
+            gif.delete()
+
+
+def fail_job(job, error):
+    print("\n" + "!" * 60)
+    print(f"      EXCEÇÃO NO JOB DE GERAÇÃO {job.pk}")
+    print("!" * 60)
+    print(f"TIPO DE ERRO: {type(error).__name__}")
+    print(f"MENSAGEM: {error}")
+    traceback.print_exception(error)
+    print("!" * 60 + "\n")
+
+    job.status = 'failed'
+    job.error = f"Erro interno no servidor: {error}"
+    # A vaga reservada na cota pela view é devolvida: o usuário não paga por falhas.
+    # Só se foi esta transição que finalizou o job; senão quem finalizou já devolveu.
+    if _save_finished(job) and job.subscription_id:
+        release_gif_slot(job.subscription_id, job.user_id, job.subscription_cycle)
+
+
+def _save_finished(job):
+    """Grava o desfecho se o job ainda estiver em execução. Retorna False se outro caminho já o finalizou."""
+    job.finished_at = timezone.now()
+    finished = GenerationJob.objects.filter(pk=job.pk, status='running').update(
+        status=job.status, gif=job.gif, error=job.error, finished_at=job.finished_at,
+    )
+    if not finished:
+        return False
+    JOBS_TOTAL.inc(status=job.status)
+    # Publicado depois de gravar: quem recebe o evento final já encontra o job atualizado no banco.
+    data = {'error': job.error} if job.status == 'failed' else {'gif_id': job.gif_id}
+    progress.broker.publish(job.pk, job.status, **data)
+    return True
+
+
+def fail_stale_jobs(running_for=None, queued_for=None):
+    """
+    Marca como falhos os jobs em execução há mais de `running_for` segundos (desde started_at)
+    e os pendentes na fila há mais de `queued_for` (desde created_at), e devolve a vaga da cota
+    de cada um. Padrões: GIF_JOB_STALE_AFTER e GIF_JOB_QUEUED_STALE_AFTER.
+
+    O pool é local ao processo: se o worker morre ou reinicia no meio de um job, ninguém
+    mais o conclui e a vaga reservada ficaria presa. Se o worker na verdade estava vivo,
+    as transições condicionais de start_job/finish_job descartam o que ele fizer depois.
+    Retorna quantos jobs foram marcados.
+    """
+    now = timezone.now()
+    running_cutoff = now - timedelta(seconds=settings.GIF_JOB_STALE_AFTER if running_for is None else running_for)
+    queued_cutoff = now - timedelta(
+        seconds=settings.GIF_JOB_QUEUED_STALE_AFTER if queued_for is None else queued_for)
+    stale = GenerationJob.objects.filter(
+        Q(status='running', started_at__lt=running_cutoff) | Q(status='pending', created_at__lt=queued_cutoff)
+    )
+    failed = 0
+    for job_id, job_status, user_id, subscription_id, cycle in stale.values_list(
+            'pk', 'status', 'user_id', 'subscription_id', 'subscription_cycle'):
+        # UPDATE condicional: se o job mudou de status nesse meio-tempo, não é tocado nem reembolsado.
+        updated = GenerationJob.objects.filter(pk=job_id, status=job_status).update(
+            status='failed', error="O job foi interrompido antes de terminar. Tente novamente.",
+            finished_at=timezone.now(),
+        )
+        if not updated:
+            continue
+        failed += 1
+        JOBS_TOTAL.inc(status='failed')
+        if subscription_id:
+            release_gif_slot(subscription_id, user_id, cycle)
+    return failed
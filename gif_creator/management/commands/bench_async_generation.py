@@ -0,0 +1,167 @@
+# gif_creator/management/commands/bench_async_generation.py
+import asyncio
+import json
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.test import override_settings
+
+from gif_creator.async_jobs import run_job_async
+from gif_creator.async_providers import reset_async_providers
+from gif_creator.jobs import run_job
+from gif_creator.models import GenerationJob
+from gif_creator.providers import reset_providers
+from .load_test_generate import create_load_test_user, summarize
+
+MODES = ('wsgi', 'asgi')
+
+
+class _ThreadSampler:
+    """Registra o maior número de threads vivas no processo enquanto está ativo."""
+
+    def __init__(self, interval=0.02):
+        self.interval = interval
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def _run_threaded_job(job_id):
+    try:
+        run_job(job_id)
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara a vazão do pipeline de geração nos dois modelos de execução, com provedores "
+        "fake: 'wsgi' (cada job ocupa uma thread do início ao fim, como em jobs.py) e 'asgi' "
+        "(todos os jobs como tarefas num único event loop, como em async_jobs.py)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=100, help="Jobs por modo.")
+        parser.add_argument('--threads', type=int, default=8,
+                            help="Threads do modo 'wsgi' (jobs em andamento ao mesmo tempo).")
+        parser.add_argument('--modes', default=','.join(MODES), help="Modos a medir, separados por vírgula.")
+        parser.add_argument('--prompt-latency', type=float, default=0.2, help="Mediana do provedor 'prompt' (s).")
+        parser.add_argument('--image-latency', type=float, default=0.5, help="Mediana do provedor 'image' (s).")
+        parser.add_argument('--video-latency', type=float, default=3.0, help="Mediana do provedor 'video' (s).")
+        parser.add_argument('--sigma', type=float, default=0.3, help="Sigma das latências lognormais (0 = fixas).")
+        parser.add_argument('--size', type=int, default=64,
+                            help="Lado da imagem e do vídeo fake, e largura do único GIF gerado.")
+        parser.add_argument('--output', help="Grava o relatório JSON neste arquivo.")
+
+    def handle(self, *args, **options):
+        modes = [m.strip() for m in options['modes'].split(',') if m.strip()]
+        unknown = set(modes) - set(MODES)
+        if unknown:
+            raise CommandError(f"Modos desconhecidos: {', '.join(sorted(unknown))}")
+
+        def latency(median):
+            return ('lognormal', median, options['sigma']) if options['sigma'] else ('fixed', median)
+
+        size = options['size']
+        media_root = tempfile.mkdtemp(prefix='bench_async_generation_')
+        overrides = override_settings(
+            MEDIA_ROOT=media_root,
+            GIF_RENDITIONS=[{'name': 'gif', 'format': 'gif', 'width': size}],
+            GIF_PROVIDERS={
+                'prompt': 'gif_creator.fake_providers.FakePromptEnhancer',
+                'image': 'gif_creator.fake_providers.FakeImageGenerator',
+                'video': 'gif_creator.fake_providers.FakeVideoGenerator',
+            },
+            GIF_ASYNC_PROVIDERS={
+                'prompt': 'gif_creator.fake_providers.AsyncFakePromptEnhancer',
+                'image': 'gif_creator.fake_providers.AsyncFakeImageGenerator',
+                'video': 'gif_creator.fake_providers.AsyncFakeVideoGenerator',
+            },
+            GIF_PROVIDER_OPTIONS={
+                'prompt': {'latency': latency(options['prompt_latency'])},
+                'image': {'latency': latency(options['image_latency']), 'size': size},
+                'video': {'latency': latency(options['video_latency']), 'size': size},
+            },
+        )
+
+        create_load_test_user(gif_limit=options['jobs'] * len(modes))
+        user = get_user_model().objects.get(username='load-test')
+        run_id = uuid.uuid4().hex[:8]
+        report = {
+            'jobs': options['jobs'],
+            'threads': options['threads'],
+            'latency_medians': {k: options[f'{k}_latency'] for k in ('prompt', 'image', 'video')},
+            'modes': {},
+        }
+
+        with overrides:
+            reset_providers()
+            reset_async_providers()
+            try:
+                for mode in modes:
+                    self.stderr.write(f"Modo {mode}: {options['jobs']} jobs...")
+                    report['modes'][mode] = self._run_mode(mode, user, run_id, options)
+            finally:
+                reset_providers()
+                reset_async_providers()
+                shutil.rmtree(media_root, ignore_errors=True)
+
+        if 'wsgi' in report['modes'] and 'asgi' in report['modes']:
+            wsgi, asgi = report['modes']['wsgi'], report['modes']['asgi']
+            if wsgi['throughput_per_minute'] and asgi['throughput_per_minute']:
+                report['asgi_speedup'] = round(asgi['throughput_per_minute'] / wsgi['throughput_per_minute'], 2)
+
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output)
+        self.stdout.write(output)
+
+    def _run_mode(self, mode, user, run_id, options):
+        jobs = GenerationJob.objects.bulk_create([
+            GenerationJob(user=user, prompt=f"Um gato astronauta #{run_id}-{mode}-{i}")
+            for i in range(options['jobs'])
+        ])
+        job_ids = [job.pk for job in jobs]
+
+        started = time.perf_counter()
+        with _ThreadSampler() as sampler:
+            if mode == 'wsgi':
+                with ThreadPoolExecutor(max_workers=options['threads'], thread_name_prefix='bench-job') as pool:
+                    list(pool.map(_run_threaded_job, job_ids))
+            else:
+                async def run_all():
+                    await asyncio.gather(*(run_job_async(job_id) for job_id in job_ids))
+
+                asyncio.run(run_all())
+        wall = time.perf_counter() - started
+
+        finished = list(GenerationJob.objects.filter(pk__in=job_ids).values('status', 'created_at', 'finished_at'))
+        succeeded = [j for j in finished if j['status'] == 'succeeded']
+        return {
+            'succeeded': len(succeeded),
+            'failed': sum(1 for j in finished if j['status'] == 'failed'),
+            'wall_seconds': round(wall, 3),
+            'throughput_per_minute': round(len(succeeded) / wall * 60, 3) if wall else None,
+            'end_to_end_seconds': summarize([(j['finished_at'] - j['created_at']).total_seconds() for j in succeeded]),
+            'peak_threads': sampler.peak,
+        }
@@ -0,0 +1,38 @@
+# gif_creator/management/commands/bench_gif_encoder.py
+import json
+import tempfile
+
+from django.core.management.base import BaseCommand
+from moviepy import VideoFileClip
+
+from gif_creator import gif_encoder
+from gif_creator.benchmarks import synthetic_clip
+
+
+class Command(BaseCommand):
+    help = "Compara o encoder de GIF próprio com o clip.write_gif do moviepy (tempo e tamanho do arquivo)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('video', nargs='?', help="Vídeo MP4 de entrada. Sem ele, usa um clipe sintético.")
+        parser.add_argument('--width', type=int, default=480)
+        parser.add_argument('--fps', type=int, default=12)
+        parser.add_argument('--dither', action='store_true')
+        parser.add_argument('--tolerance', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['video']:
+            source = VideoFileClip(options['video'])
+            clip = source.resized(width=options['width'])
+        else:
+            source = clip = synthetic_clip(width=options['width'], height=options['width'])
+
+        try:
+            with tempfile.TemporaryDirectory() as output_dir:
+                results = gif_encoder.compare_with_write_gif(
+                    clip, output_dir, options['fps'], dither=options['dither'], tolerance=options['tolerance']
+                )
+        finally:
+            clip.close()
+            source.close()
+
+        self.stdout.write(json.dumps(results, indent=2))
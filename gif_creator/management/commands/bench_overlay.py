@@ -0,0 +1,52 @@
+# gif_creator/management/commands/bench_overlay.py
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from PIL import Image, ImageDraw, ImageFont
+
+from gif_creator import text_overlay
+
+
+def legacy_overlay(image, text):
+    """Renderização anterior: carrega a fonte a cada chamada e desenha o texto 5 vezes para a sombra."""
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.truetype(text_overlay.default_font_path(), int(image.width / 12))
+    bbox = draw.textbbox((0, 0), text, font=font)
+    x = (image.width - (bbox[2] - bbox[0])) / 2
+    y = (image.height - (bbox[3] - bbox[1])) * 0.85
+    for dx, dy in ((-2, -2), (2, -2), (-2, 2), (2, 2)):
+        draw.text((x + dx, y + dy), text, font=font, fill='#404040')
+    draw.text((x, y), text, font=font, fill='white')
+    return image
+
+
+def time_renderer(render, base, text, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        render(base.copy(), text)
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+class Command(BaseCommand):
+    help = "Micro-benchmark da renderização do texto sobreposto (ms por imagem)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=1024, help="Largura/altura da imagem base.")
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--text', default="Que seu dia seja iluminado!")
+
+    def handle(self, *args, **options):
+        base = Image.new('RGBA', (options['size'], options['size']), (30, 90, 160, 255))
+        text, iterations = options['text'], options['iterations']
+
+        # Primeira chamada fora da medição: aquece o cache de fontes e métricas.
+        text_overlay.draw_overlay(base.copy(), text)
+
+        results = {
+            'legacy_ms': time_renderer(legacy_overlay, base, text, iterations),
+            'cached_ms': time_renderer(text_overlay.draw_overlay, base, text, iterations),
+            'font_cache': text_overlay.get_font.cache_info()._asdict(),
+            'width_cache': text_overlay.text_width.cache_info()._asdict(),
+        }
+        self.stdout.write(json.dumps(results, indent=2))
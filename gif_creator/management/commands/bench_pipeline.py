@@ -0,0 +1,113 @@
+# gif_creator/management/commands/bench_pipeline.py
+import json
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gif_creator import benchmarks
+
+# Métricas comparadas com o baseline; todas são "quanto menor, melhor".
+COMPARED_METRICS = ('wall_seconds', 'peak_rss_mb', 'output_bytes')
+
+
+def _int_list(value):
+    return [int(item) for item in value.split(',') if item.strip()]
+
+
+def _float_list(value):
+    return [float(item) for item in value.split(',') if item.strip()]
+
+
+def case_name(kind, **params):
+    return kind + ''.join(f"/{key}={value}" for key, value in sorted(params.items()))
+
+
+def compare(results, baseline, threshold):
+    """
+    Compara cada caso com o mesmo caso no baseline.
+
+    Returns:
+        list: regressões encontradas (métrica pior que o baseline por mais que `threshold`).
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous or 'error' in current or 'error' in previous:
+            continue
+        for metric in COMPARED_METRICS:
+            old, new = previous.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if change > threshold:
+                regressions.append({
+                    'case': name, 'metric': metric, 'baseline': old, 'current': new, 'change': round(change, 3),
+                })
+    return regressions
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark da parte local do pipeline (texto sobreposto, resize e encode do GIF) "
+        "com fixtures sintéticas. Mede wall time, pico de RSS e bytes de saída, em JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--resolutions', type=_int_list, default=[480, 960],
+                            help="Resoluções (lado, em px) das fixtures, separadas por vírgula.")
+        parser.add_argument('--fps', type=_int_list, default=[8, 12], help="FPS do GIF, separados por vírgula.")
+        parser.add_argument('--durations', type=_float_list, default=[2, 4],
+                            help="Durações dos vídeos de entrada, em segundos.")
+        parser.add_argument('--cases', default='overlay,resize,encode',
+                            help=f"Casos a executar, entre: {', '.join(benchmarks.CASES)}.")
+        parser.add_argument('--fixtures-dir', default=os.path.join(tempfile.gettempdir(), 'gif_bench_fixtures'),
+                            help="Onde as fixtures sintéticas são geradas e reaproveitadas.")
+        parser.add_argument('--timeout', type=float, default=benchmarks.CASE_TIMEOUT,
+                            help="Tempo máximo de cada caso, em segundos; o caso é registrado com erro.")
+        parser.add_argument('--output', help="Grava o resultado em JSON neste arquivo (para usar como baseline).")
+        parser.add_argument('--baseline', help="Resultado anterior para comparar; falha se houver regressão.")
+        parser.add_argument('--threshold', type=float, default=0.15,
+                            help="Piora relativa tolerada em relação ao baseline (0.15 = 15%%).")
+
+    def handle(self, *args, **options):
+        cases = [case.strip() for case in options['cases'].split(',') if case.strip()]
+        unknown = set(cases) - set(benchmarks.CASES)
+        if unknown:
+            raise CommandError(f"Casos desconhecidos: {', '.join(sorted(unknown))}")
+
+        fixtures_dir = options['fixtures_dir']
+        os.makedirs(fixtures_dir, exist_ok=True)
+
+        results = {}
+        for resolution in options['resolutions']:
+            if 'overlay' in cases:
+                image_path = benchmarks.image_fixture(fixtures_dir, resolution)
+                results[case_name('overlay', resolution=resolution)] = benchmarks.run_case(
+                    'overlay', timeout=options['timeout'], image_path=image_path
+                )
+            for duration in options['durations']:
+                video_path = benchmarks.video_fixture(fixtures_dir, resolution, duration)
+                for fps in options['fps']:
+                    for kind in cases:
+                        if kind == 'overlay':
+                            continue
+                        name = case_name(kind, resolution=resolution, duration=duration, fps=fps)
+                        self.stderr.write(f"Executando {name}...")
+                        results[name] = benchmarks.run_case(kind, timeout=options['timeout'], video_path=video_path, fps=fps)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+
+        report = {'results': results}
+        regressions = []
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            regressions = compare(results, baseline.get('results', baseline), options['threshold'])
+            report['regressions'] = regressions
+
+        self.stdout.write(json.dumps(report, indent=2))
+        if regressions:
+            raise CommandError(f"{len(regressions)} regressão(ões) acima de {options['threshold']:.0%} em relação ao baseline.")
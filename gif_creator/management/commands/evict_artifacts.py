@@ -0,0 +1,22 @@
+# gif_creator/management/commands/evict_artifacts.py
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from gif_creator import artifacts
+
+
+class Command(BaseCommand):
+    help = (
+        "Remove de MEDIA_ROOT/artifacts as imagens base e vídeos sem uso há mais de --ttl segundos e, "
+        "se o total passar de --max-bytes, os menos usados. Feito para rodar periodicamente (cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ttl', type=int, default=settings.GIF_ARTIFACTS_TTL,
+                            help="Tempo sem uso, em segundos, a partir do qual o artefato é removido.")
+        parser.add_argument('--max-bytes', type=int, default=settings.GIF_ARTIFACTS_MAX_BYTES,
+                            help="Tamanho máximo do diretório de artefatos.")
+
+    def handle(self, *args, **options):
+        removed, freed = artifacts.evict(options['ttl'], options['max_bytes'])
+        self.stdout.write(f"{removed} artefato(s) removido(s), {freed / 1024 / 1024:.1f} MB liberados.")
@@ -0,0 +1,22 @@
+# gif_creator/management/commands/fail_stale_jobs.py
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from gif_creator.jobs import fail_stale_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Marca como falhos os jobs de geração que ficaram pendentes/em execução (worker morto ou "
+        "reiniciado) e devolve a vaga da cota. Feito para rodar na inicialização e periodicamente (cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--running-for', type=int, default=settings.GIF_JOB_STALE_AFTER,
+                            help="Tempo em execução (desde started_at), em segundos.")
+        parser.add_argument('--queued-for', type=int, default=settings.GIF_JOB_QUEUED_STALE_AFTER,
+                            help="Tempo na fila (desde created_at), em segundos.")
+
+    def handle(self, *args, **options):
+        failed = fail_stale_jobs(options['running_for'], options['queued_for'])
+        self.stdout.write(f"{failed} job(s) interrompido(s) marcado(s) como falho(s).")
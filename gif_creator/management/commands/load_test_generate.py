@@ -0,0 +1,146 @@
+# gif_creator/management/commands/load_test_generate.py
+import json
+import math
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+FINAL_STATUSES = ('succeeded', 'failed')
+
+
+def percentile(values, p):
+    """Percentil por posição mais próxima (nearest-rank) de uma lista de números."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return round(ordered[rank - 1], 3)
+
+
+def summarize(values):
+    return {
+        'count': len(values),
+        'p50': percentile(values, 50),
+        'p90': percentile(values, 90),
+        'p99': percentile(values, 99),
+        'max': round(max(values), 3) if values else None,
+    }
+
+
+def create_load_test_user(gif_limit):
+    """Cria (ou reaproveita) um usuário com assinatura ativa e limite alto, e retorna o token dele."""
+    from django.contrib.auth import get_user_model
+    from rest_framework.authtoken.models import Token
+    from subscriptions.models import Plan, Subscription
+
+    user, _ = get_user_model().objects.get_or_create(
+        username='load-test',
+        defaults={'taxId': '00000000000', 'cellphone': '0', 'has_active_subscription': True},
+    )
+    plan, _ = Plan.objects.get_or_create(
+        name='Load test', defaults={'description': 'Plano de teste de carga', 'price': 0, 'is_active': False},
+    )
+    plan.gif_limit = gif_limit
+    plan.save(update_fields=['gif_limit'])
+    Subscription.objects.update_or_create(
+        user=user, plan=plan,
+        defaults={'status': 'active', 'gif_count': 0, 'end_date': timezone.now() + timedelta(days=1)},
+    )
+    token, _ = Token.objects.get_or_create(user=user)
+    return token.key
+
+
+class Command(BaseCommand):
+    help = (
+        "Dispara N pedidos simultâneos em generate-image/, acompanha cada job até o fim e "
+        "relata vazão e percentis de latência. Use com o servidor rodando com GIF_FAKE_PROVIDERS=True."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000', help="URL do servidor a testar.")
+        parser.add_argument('--requests', type=int, default=20, help="Total de pedidos.")
+        parser.add_argument('--concurrency', type=int, default=10, help="Pedidos em andamento ao mesmo tempo.")
+        parser.add_argument('--token', help="Token de um usuário com assinatura ativa.")
+        parser.add_argument('--create-user', action='store_true',
+                            help="Cria um usuário 'load-test' com assinatura ativa no banco local e usa o token dele.")
+        parser.add_argument('--same-prompt', action='store_true',
+                            help="Envia o mesmo prompt em todos os pedidos (mede a deduplicação).")
+        parser.add_argument('--poll-interval', type=float, default=1.0)
+        parser.add_argument('--job-timeout', type=float, default=900.0, help="Prazo de cada job, em segundos.")
+
+    def handle(self, *args, **options):
+        total = options['requests']
+        if options['create_user']:
+            token = create_load_test_user(gif_limit=total * 10)
+        elif options['token']:
+            token = options['token']
+        else:
+            raise CommandError("Informe --token ou --create-user.")
+
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=options['concurrency'])
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers['Authorization'] = f"Token {token}"
+        generate_url = options['base_url'].rstrip('/') + '/api/gif/generate-image/'
+        run_id = uuid.uuid4().hex[:8]
+        printed = threading.Lock()
+
+        def one_request(index):
+            prompt = "Um gato astronauta" if options['same_prompt'] else f"Um gato astronauta #{run_id}-{index}"
+            start = time.perf_counter()
+            try:
+                response = session.post(generate_url, json={'prompt': prompt, 'text': 'Bom dia!'}, timeout=30)
+            except requests.RequestException as e:
+                return {'outcome': 'http_error', 'error': str(e)}
+            submit = time.perf_counter() - start
+            if response.status_code == 503:
+                return {'outcome': 'rejected', 'submit': submit}
+            if response.status_code != 202:
+                return {'outcome': 'http_error', 'submit': submit, 'error': f"{response.status_code}: {response.text[:200]}"}
+
+            status_url = response.json()['status_url']
+            deadline = start + options['job_timeout']
+            while time.perf_counter() < deadline:
+                time.sleep(options['poll_interval'])
+                try:
+                    job = session.get(status_url, timeout=30).json()
+                except (requests.RequestException, ValueError):
+                    continue
+                if job.get('status') in FINAL_STATUSES:
+                    result = {'outcome': job['status'], 'submit': submit, 'total': time.perf_counter() - start}
+                    if job.get('error'):
+                        result['error'] = job['error']
+                    with printed:
+                        self.stderr.write(f"[{index}] {job['status']} em {result['total']:.1f}s")
+                    return result
+            return {'outcome': 'timeout', 'submit': submit}
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            results = list(pool.map(one_request, range(total)))
+        wall = time.perf_counter() - started
+
+        outcomes = {}
+        for result in results:
+            outcomes[result['outcome']] = outcomes.get(result['outcome'], 0) + 1
+        succeeded = [r['total'] for r in results if r['outcome'] == 'succeeded']
+        errors = sorted({r['error'] for r in results if r.get('error')})
+
+        report = {
+            'requests': total,
+            'concurrency': options['concurrency'],
+            'wall_seconds': round(wall, 3),
+            'throughput_per_minute': round(len(succeeded) / wall * 60, 3) if wall else None,
+            'outcomes': outcomes,
+            'submit_latency_seconds': summarize([r['submit'] for r in results if 'submit' in r]),
+            'end_to_end_seconds': summarize(succeeded),
+            'errors': errors[:20],
+        }
+        self.stdout.write(json.dumps(report, indent=2, ensure_ascii=False))
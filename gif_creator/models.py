@@ -1,11 +1,41 @@
+import uuid
+
 from django.db import models
 from django.conf import settings
 
+class GenerationArtifact(models.Model):
+    """
+    Artefatos de uma geração, endereçados pelo conteúdo do pedido (prompt + texto).
+    Pedidos idênticos reaproveitam a imagem base, o vídeo do Runway e o GIF final (ver artifacts.py).
+    Os caminhos são relativos a MEDIA_ROOT; vazio significa que a etapa ainda não foi concluída.
+    O prompt aprimorado não fica aqui: é lido do cache de prompts (prompt_cache.py).
+    """
+    key = models.CharField(max_length=64, unique=True)
+    base_image_path = models.CharField(max_length=255, blank=True, default='')
+    video_path = models.CharField(max_length=255, blank=True, default='')
+    gif_path = models.CharField(max_length=255, blank=True, default='')
+    # Versões geradas a partir do vídeo (ver renditions.py): name, format, path, url, width, height, bytes
+    renditions = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.key
+
+    class Meta:
+        verbose_name = "Artefato de Geração"
+        verbose_name_plural = "Artefatos de Geração"
+
+
 class GeneratedGif(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='gifs')
     prompt = models.TextField(verbose_name="Descrição (Prompt)")
     overlay_text = models.CharField(max_length=255, blank=True, null=True, verbose_name="Texto Sobreposto")
     gif_url = models.URLField(max_length=500, verbose_name="URL do GIF")
+    # GIFs de pedidos idênticos apontam para o mesmo artefato (e o mesmo arquivo)
+    artifact = models.ForeignKey(GenerationArtifact, on_delete=models.SET_NULL, null=True, blank=True,
+                                 related_name='gifs')
+    # Versões disponíveis (GIF menor, WebP, MP4...), para o cliente escolher a mais leve que serve
+    renditions = models.JSONField(default=list, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -14,4 +44,64 @@ class GeneratedGif(models.Model):
     class Meta:
         verbose_name = "GIF Gerado"
         verbose_name_plural = "GIFs Gerados"
-        ordering = ['-created_at'] # Ordena do mais novo para o mais antigo
\ No newline at end of file
+        ordering = ['-created_at'] # Ordena do mais novo para o mais antigo
+        indexes = [
+            # Histórico do usuário, paginado por cursor em (created_at, id) (GifHistoryView)
+            models.Index(fields=['user', '-created_at', '-id'], name='gif_user_created_idx'),
+        ]
+
+
+class GenerationJob(models.Model):
+    """
+    Representa uma geração de GIF executada em segundo plano.
+    A view apenas cria o job e devolve o id; o pipeline roda no pool de workers (ver jobs.py).
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Na fila'),
+        ('running', 'Em processamento'),
+        ('succeeded', 'Concluído'),
+        ('failed', 'Falhou'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='generation_jobs')
+    prompt = models.TextField(verbose_name="Descrição (Prompt)")
+    overlay_text = models.CharField(max_length=255, blank=True, default='', verbose_name="Texto Sobreposto")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    gif = models.ForeignKey(GeneratedGif, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    # Assinatura em que a vaga da cota foi reservada; devolvida se o job falhar (subscriptions/quota.py)
+    subscription = models.ForeignKey('subscriptions.Subscription', on_delete=models.SET_NULL, null=True, blank=True,
+                                     related_name='+')
+    # Ciclo da assinatura em que a vaga foi reservada: só é devolvida se a assinatura ainda estiver nele
+    subscription_cycle = models.PositiveIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Job {self.id} de {self.user.username} ({self.status})"
+
+    class Meta:
+        verbose_name = "Job de Geração"
+        verbose_name_plural = "Jobs de Geração"
+        ordering = ['-created_at']
+
+
+class EnhancedPrompt(models.Model):
+    """
+    Cache persistente dos prompts aprimorados pelo Gemini (ver prompt_cache.py).
+    A chave é o hash do prompt do usuário já normalizado.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    normalized_prompt = models.TextField()
+    enhanced_prompt = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.normalized_prompt[:50]
+
+    class Meta:
+        verbose_name = "Prompt Aprimorado"
+        verbose_name_plural = "Prompts Aprimorados"
@@ -1,8 +1,10 @@
 from rest_framework.permissions import BasePermission
 
+from subscriptions.context import get_active_subscription
+
 class IsSubscribedUser(BasePermission):
     message = "Apenas usuários com assinatura ativa podem gerar GIFs."
 
     def has_permission(self, request, view):
-        # A propriedade `has_active_subscription` que criamos no modelo User
-        return request.user and request.user.is_authenticated and request.user.has_active_subscription
\ No newline at end of file
+        # A assinatura fica memorizada na requisição; a view a reutiliza sem nova consulta.
+        return bool(request.user and request.user.is_authenticated and get_active_subscription(request) is not None)
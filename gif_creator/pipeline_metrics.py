@@ -0,0 +1,44 @@
+# gif_creator/pipeline_metrics.py
+"""Métricas do pipeline de geração, publicadas em /metrics (ver Gif_generator_project/metrics.py)."""
+from Gif_generator_project.metrics import CallbackMetric, Counter, Gauge, Histogram
+from . import prompt_cache
+from .encode_pool import get_encode_pool
+from .scratch import get_scratch
+
+STAGE_SECONDS = Histogram(
+    'gif_pipeline_stage_seconds', "Duração de cada etapa do pipeline de geração.", ['stage'],
+)
+JOBS_IN_FLIGHT = Gauge('gif_jobs_in_flight', "Jobs de geração em execução neste processo.")
+JOBS_TOTAL = Counter('gif_jobs_total', "Jobs de geração finalizados, por resultado.", ['status'])
+
+
+def _prompt_cache_requests():
+    stats = prompt_cache.get_stats()
+    return {('memory_hit',): stats['memory_hits'], ('db_hit',): stats['db_hits'], ('miss',): stats['misses']}
+
+
+def _scratch_space_bytes():
+    usage = get_scratch().usage()
+    return {('reserved',): usage['reserved_bytes'], ('used',): usage['used_bytes'],
+            ('budget',): usage['budget_bytes']}
+
+
+CallbackMetric(
+    'gif_prompt_cache_requests_total', "Consultas ao cache de prompts aprimorados, por resultado.",
+    _prompt_cache_requests, ['result'], kind='counter',
+)
+CallbackMetric(
+    'gif_scratch_disk_bytes', "Bytes em disco ocupados agora pelos arquivos de rascunho dos jobs (sem os memfd).",
+    lambda: get_scratch().usage()['disk_bytes'],
+)
+CallbackMetric(
+    'gif_scratch_space_bytes', "Espaço de rascunho dos jobs: bytes reservados, ocupados de fato e orçamento.",
+    _scratch_space_bytes, ['state'],
+)
+CallbackMetric(
+    'gif_scratch_waiting_jobs', "Jobs esperando espaço de rascunho.", lambda: get_scratch().usage()['waiting'],
+)
+CallbackMetric(
+    'gif_encode_pool_depth', "Encodes executando ou na fila do pool de processos.",
+    lambda: get_encode_pool().in_pool(),
+)
@@ -0,0 +1,143 @@
+# gif_creator/progress.py
+"""
+Eventos de andamento dos jobs de geração, para o stream SSE (views.job_events).
+
+O pipeline publica cada etapa concluída (`publish(job_id, evento, **dados)`) num canal em
+memória por job; quem acompanha o job (uma ou mais conexões SSE) recebe os eventos na ordem,
+inclusive os que já tinham passado quando se conectou. Publicar é barato (um append sob lock
+e acordar quem espera), então os hooks não pesam no pipeline.
+
+Os canais vivem no processo que executa o job (o mesmo que recebeu o POST; ver jobs.py e
+async_jobs.py) e são descartados PROGRESS_RETENTION segundos depois do evento final.
+"""
+import asyncio
+import itertools
+import threading
+import time
+
+from django.conf import settings
+
+# Eventos, na ordem em que normalmente acontecem
+STARTED = 'started'
+PROMPT_ENHANCED = 'prompt_enhanced'
+BASE_IMAGE_READY = 'base_image_ready'
+RUNWAY_QUEUED = 'runway_queued'
+RUNWAY_PROGRESS = 'runway_progress'
+DOWNLOADED = 'downloaded'
+ENCODED = 'encoded'
+SAVED = 'saved'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+FINAL_EVENTS = (SUCCEEDED, FAILED)
+
+
+class _Channel:
+    def __init__(self):
+        self.events = []  # (seq, evento, dados)
+        self.finished_at = None
+        self.waiters = set()  # funções sem argumentos que acordam um assinante
+
+
+class ProgressBroker:
+    """Canais de eventos por job, seguros para threads e para corrotinas."""
+
+    def __init__(self, retention):
+        self.retention = retention
+        self._channels = {}
+        self._lock = threading.Lock()
+        self._sequence = itertools.count(1)
+
+    def publish(self, job_id, event, **data):
+        key = str(job_id)
+        with self._lock:
+            channel = self._channels.get(key)
+            if channel is None:
+                channel = self._channels[key] = _Channel()
+            channel.events.append((next(self._sequence), event, data))
+            if event in FINAL_EVENTS:
+                channel.finished_at = time.monotonic()
+                self._sweep()
+            waiters = list(channel.waiters)
+        for wake in waiters:
+            wake()
+
+    def reporter(self, job_id):
+        """Função `(evento, **dados)` que publica no canal de `job_id` (o hook passado ao AnimationService)."""
+        return lambda event, **data: self.publish(job_id, event, **data)
+
+    def events_after(self, job_id, after=0):
+        """
+        Eventos do job com sequência maior que `after`.
+
+        Returns:
+            (list, bool): os eventos (seq, evento, dados) e se o canal existe neste processo.
+        """
+        with self._lock:
+            channel = self._channels.get(str(job_id))
+            if channel is None:
+                return [], False
+            return [e for e in channel.events if e[0] > after], True
+
+    def subscribe(self, job_id, wake):
+        """Registra `wake` para ser chamada a cada evento novo do job. Cria o canal se preciso."""
+        key = str(job_id)
+        with self._lock:
+            channel = self._channels.get(key)
+            if channel is None:
+                channel = self._channels[key] = _Channel()
+            channel.waiters.add(wake)
+
+    def unsubscribe(self, job_id, wake):
+        key = str(job_id)
+        with self._lock:
+            channel = self._channels.get(key)
+            if channel is not None:
+                channel.waiters.discard(wake)
+                # Canal criado só pela assinatura (job rodando em outro processo): não fica para trás.
+                if not channel.waiters and not channel.events:
+                    del self._channels[key]
+
+    def _sweep(self):
+        # Chamado com o lock: remove os canais finalizados há mais de `retention` segundos.
+        cutoff = time.monotonic() - self.retention
+        for key in [k for k, c in self._channels.items() if c.finished_at is not None and c.finished_at < cutoff]:
+            del self._channels[key]
+
+    def __len__(self):
+        return len(self._channels)
+
+
+broker = ProgressBroker(settings.PROGRESS_RETENTION)
+
+
+async def aiter_events(job_id, after=0, heartbeat=None):
+    """
+    Gerador assíncrono dos eventos do job a partir de `after`; espera sem ocupar thread.
+
+    Produz (seq, evento, dados) e, se `heartbeat` segundos passarem sem evento, None (para o
+    chamador mandar um keep-alive e conferir o job no banco). Termina no evento final.
+    """
+    loop = asyncio.get_running_loop()
+    woken = asyncio.Event()
+
+    def wake():
+        # Publicado de uma thread de job ou do próprio loop
+        loop.call_soon_threadsafe(woken.set)
+
+    broker.subscribe(job_id, wake)
+    try:
+        while True:
+            woken.clear()
+            events, _ = broker.events_after(job_id, after)
+            for event in events:
+                yield event
+                after = event[0]
+                if event[1] in FINAL_EVENTS:
+                    return
+            if not events:
+                try:
+                    await asyncio.wait_for(woken.wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+    finally:
+        broker.unsubscribe(job_id, wake)
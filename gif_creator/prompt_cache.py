@@ -0,0 +1,123 @@
+# gif_creator/prompt_cache.py
+"""
+Cache dos prompts aprimorados pelo Gemini.
+
+Dois níveis: um LRU em memória (por processo) na frente da tabela EnhancedPrompt.
+As entradas expiram após PROMPT_CACHE_TTL segundos e cada nível tem um tamanho
+máximo; as entradas menos usadas recentemente são descartadas primeiro. A limpeza da
+tabela custa um COUNT e até dois DELETEs, então roda a cada PROMPT_CACHE_EVICT_EVERY
+gravações do processo, e não em toda gravação.
+"""
+import hashlib
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import EnhancedPrompt
+
+_lock = threading.Lock()
+# chave -> (prompt aprimorado, instante em que foi gravado no cache)
+_memory = OrderedDict()
+_stats = {'memory_hits': 0, 'db_hits': 0, 'misses': 0}
+_stores_since_evict = 0
+
+
+def normalize_prompt(prompt):
+    """Normaliza o prompt para que variações triviais (caixa, espaços, pontuação final) tenham a mesma chave."""
+    text = unicodedata.normalize('NFKC', prompt).casefold()
+    return ' '.join(text.split()).strip(' .!?;,')
+
+
+def _key(normalized):
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def _remember(key, enhanced, stored_at):
+    with _lock:
+        _memory[key] = (enhanced, stored_at)
+        _memory.move_to_end(key)
+        while len(_memory) > settings.PROMPT_CACHE_MEMORY_SIZE:
+            _memory.popitem(last=False)
+
+
+def lookup(prompt):
+    """Retorna o prompt aprimorado em cache para `prompt`, ou None."""
+    key = _key(normalize_prompt(prompt))
+    ttl = settings.PROMPT_CACHE_TTL
+    now = time.time()
+
+    with _lock:
+        entry = _memory.get(key)
+        if entry is not None:
+            if now - entry[1] < ttl:
+                _memory.move_to_end(key)
+                _stats['memory_hits'] += 1
+                return entry[0]
+            del _memory[key]
+
+    cutoff = timezone.now() - timedelta(seconds=ttl)
+    row = EnhancedPrompt.objects.filter(key=key, created_at__gte=cutoff).only('enhanced_prompt', 'created_at').first()
+    if row is None:
+        with _lock:
+            _stats['misses'] += 1
+        return None
+
+    EnhancedPrompt.objects.filter(pk=row.pk).update(last_used_at=timezone.now())
+    _remember(key, row.enhanced_prompt, row.created_at.timestamp())
+    with _lock:
+        _stats['db_hits'] += 1
+    return row.enhanced_prompt
+
+
+def store(prompt, enhanced):
+    """Grava o prompt aprimorado nos dois níveis do cache."""
+    normalized = normalize_prompt(prompt)
+    key = _key(normalized)
+    now = timezone.now()
+    EnhancedPrompt.objects.update_or_create(
+        key=key,
+        defaults={'normalized_prompt': normalized, 'enhanced_prompt': enhanced,
+                  'created_at': now, 'last_used_at': now},
+    )
+    _remember(key, enhanced, now.timestamp())
+    if _evict_due():
+        _evict_db()
+
+
+def _evict_due():
+    global _stores_since_evict
+    with _lock:
+        _stores_since_evict += 1
+        if _stores_since_evict < settings.PROMPT_CACHE_EVICT_EVERY:
+            return False
+        _stores_since_evict = 0
+        return True
+
+
+def _evict_db():
+    """Remove da tabela as entradas expiradas e as excedentes (menos usadas primeiro)."""
+    cutoff = timezone.now() - timedelta(seconds=settings.PROMPT_CACHE_TTL)
+    EnhancedPrompt.objects.filter(created_at__lt=cutoff).delete()
+
+    excess = EnhancedPrompt.objects.count() - settings.PROMPT_CACHE_MAX_ROWS
+    if excess > 0:
+        stale_ids = list(EnhancedPrompt.objects.order_by('last_used_at').values_list('pk', flat=True)[:excess])
+        EnhancedPrompt.objects.filter(pk__in=stale_ids).delete()
+
+
+def get_stats():
+    """Contadores de acertos/erros do cache desde o início do processo."""
+    with _lock:
+        stats = dict(_stats)
+        stats['memory_size'] = len(_memory)
+    return stats
+
+
+def clear_memory():
+    with _lock:
+        _memory.clear()
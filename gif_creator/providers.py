@@ -0,0 +1,222 @@
+# gif_creator/providers.py
+"""
+Provedores externos usados pelo pipeline de geração, atrás de uma interface comum:
+
+- 'prompt': aprimoramento do prompt (Gemini)
+- 'image':  texto -> imagem (ClipDrop)
+- 'video':  imagem -> vídeo (Runway)
+
+A implementação de cada um é escolhida em GIF_PROVIDERS (caminho da classe) e recebe
+como argumentos as opções de GIF_PROVIDER_OPTIONS[tipo]. Trocando as três pelas de
+fake_providers.py o pipeline roda inteiro sem rede e sem gastar créditos.
+"""
+import base64
+import threading
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from Gif_generator_project.http_clients import get_client
+from .pipeline_metrics import STAGE_SECONDS
+from .progress import RUNWAY_PROGRESS, RUNWAY_QUEUED
+from .runway_poller import RUNWAY_API_BASE_URL, get_poller
+
+CLIPDROP_API_URL = "https://clipdrop-api.co/text-to-image/v1"
+GEMINI_MODEL_NAME = 'gemini-2.5-pro'
+VIDEO_DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
+META_PROMPT = (
+    "Aprimore o seguinte prompt de usuário para gerar uma imagem mais detalhada, "
+    "artística e de alta qualidade em uma API de IA (como Stable Diffusion/ClipDrop). "
+    "Ex de melhoria "
+    "Prompt Usuario: Uma manhã bonita em uma plantação de milho com o sol nascendo"
+    "Prompt melhorado: (masterpiece, 8k, best quality:1.3), a beautiful morning in a corn field with the sun rising, vibrant golden hues reflecting off the corn leaves, (landscape:1.2), (atmospheric:1.1), (depth of field:1.1), (clear sky:1.2), (greenery details:1.3), (sunlight filtering through corn stalks:1.3), Negative prompt: (worst quality, low quality:1.4), blurry, ugly, text, watermark. Steps: 30, Sampler: DPM++ 2M Karras, CFG scale: 7."
+    "e composição, mas mantenha a ideia central do usuário. "
+    "Retorne APENAS o prompt aprimorado, sem nenhuma introdução ou texto extra.\n\n"
+    "Prompt do Usuário: \"{prompt}\""
+)
+
+
+class PromptEnhancer:
+    def enhance(self, prompt):
+        """Retorna o prompt aprimorado, ou None se o provedor não devolver nada utilizável."""
+        raise NotImplementedError
+
+
+class ImageGenerator:
+    def generate(self, prompt):
+        """Gera a imagem para `prompt` e retorna os bytes do arquivo (PNG/JPEG)."""
+        raise NotImplementedError
+
+
+class VideoGenerator:
+    def animate(self, image_bytes, progress=None):
+        """
+        Anima a imagem (JPEG) e retorna uma referência ao vídeo gerado, para `download`.
+        `progress(evento, **dados)`, se informado, recebe o andamento da tarefa (ver progress.py).
+        """
+        raise NotImplementedError
+
+    def download(self, source, path):
+        """Grava em `path` o MP4 referenciado por `source`."""
+        raise NotImplementedError
+
+
+# --- Implementações reais ---
+
+class GeminiPromptEnhancer(PromptEnhancer):
+    def __init__(self, model_name=GEMINI_MODEL_NAME, timeout=None):
+        # Import local: o SDK do Google só é necessário quando este provedor está em uso.
+        import google.generativeai as genai
+
+        genai.configure(api_key=settings.GEMINI_API_KEY)
+        self.model = genai.GenerativeModel(model_name)
+        self.timeout = timeout or settings.GEMINI_TIMEOUT
+
+    def enhance(self, prompt):
+        response = self.model.generate_content(META_PROMPT.format(prompt=prompt),
+                                               request_options={'timeout': self.timeout})
+        if not response.parts:
+            return None
+        return response.text.strip()
+
+
+class ClipDropImageGenerator(ImageGenerator):
+    def generate(self, prompt):
+        files = {'prompt': (None, prompt, 'text/plain')}
+        headers = {'x-api-key': settings.CLIPDROP_API_KEY}
+        response = get_client('clipdrop').post(CLIPDROP_API_URL, headers=headers, files=files)
+        if response.ok:
+            return response.content
+        raise clipdrop_error(response)
+
+
+def clipdrop_error(response):
+    """Exceção com a mensagem de erro de uma resposta do ClipDrop (requests ou httpx)."""
+    try:
+        error_data = response.json()
+        error_message = error_data.get('error', response.text)
+    except ValueError:  # inclui requests.exceptions.JSONDecodeError
+        error_message = response.text
+    return Exception(f"Erro na API ClipDrop ({response.status_code}): {error_message}")
+
+
+class RunwayVideoGenerator(VideoGenerator):
+    def __init__(self, model='gen4_turbo', duration=3, ratio='960:960'):
+        self.model = model
+        self.duration = duration
+        self.ratio = ratio
+
+    def start_request(self, image_bytes):
+        """Cabeçalhos e corpo do POST /image_to_video que inicia a tarefa."""
+        data_uri = f"data:image/jpeg;base64,{base64.b64encode(image_bytes).decode('utf-8')}"
+        headers = {
+            "Authorization": f"Bearer {settings.RUNWAY_API_KEY}",
+            "Content-Type": "application/json",
+            "X-Runway-Version": "2024-11-06"
+        }
+        start_payload = {
+            "promptImage": data_uri,
+            "model": self.model,
+            "duration": self.duration,
+            "ratio": self.ratio
+        }
+        return headers, start_payload
+
+    def animate(self, image_bytes, progress=None):
+        """Envia a imagem ao Runway e espera a tarefa terminar. Retorna a URL do vídeo."""
+        headers, start_payload = self.start_request(image_bytes)
+        with STAGE_SECONDS.time(stage='runway_submit'):
+            start_response = get_client('runway').post(f"{RUNWAY_API_BASE_URL}/image_to_video",
+                                                       headers=headers, json=start_payload)
+
+        if start_response.status_code != 200:
+            raise Exception(f"Erro ao iniciar a tarefa no Runway: {start_response.text}")
+
+        task_id = start_response.json()['id']
+        print(f"--- Tarefa iniciada com ID: {task_id} ---")
+        on_status = None
+        if progress is not None:
+            progress(RUNWAY_QUEUED, task_id=task_id)
+            on_status = runway_status_reporter(progress)
+
+        # O poller compartilhado acompanha a tarefa; esta thread só espera o resultado.
+        with STAGE_SECONDS.time(stage='runway_wait'):
+            status_data = get_poller().track(task_id, on_status=on_status).result()
+
+        return video_output(status_data)
+
+    def download(self, source, path):
+        """
+        Baixa o vídeo em blocos direto para o disco, sem manter o MP4 inteiro em memória.
+        Aborta se o arquivo passar de VIDEO_DOWNLOAD_MAX_BYTES ou se o download
+        inteiro demorar mais que VIDEO_DOWNLOAD_TIMEOUT segundos.
+        """
+        max_bytes = settings.VIDEO_DOWNLOAD_MAX_BYTES
+        deadline = time.monotonic() + settings.VIDEO_DOWNLOAD_TIMEOUT
+
+        runway = get_client('runway')
+        timeout = (runway.timeout[0], settings.VIDEO_DOWNLOAD_READ_TIMEOUT)
+        with runway.get(source, stream=True, timeout=timeout) as video_response:
+            video_response.raise_for_status()
+
+            content_length = int(video_response.headers.get('Content-Length') or 0)
+            if content_length > max_bytes:
+                raise Exception(f"Vídeo do Runway grande demais ({content_length} bytes).")
+
+            downloaded = 0
+            with open(path, 'wb') as f:
+                for chunk in video_response.iter_content(chunk_size=VIDEO_DOWNLOAD_CHUNK_SIZE):
+                    downloaded += len(chunk)
+                    if downloaded > max_bytes:
+                        raise Exception(f"Vídeo do Runway passou do limite de {max_bytes} bytes.")
+                    if time.monotonic() > deadline:
+                        raise Exception("Tempo esgotado ao baixar o vídeo do Runway.")
+                    f.write(chunk)
+
+
+def runway_status_reporter(progress):
+    """
+    Converte as consultas de status do Runway em eventos RUNWAY_PROGRESS, publicando só
+    quando o status ou o percentual mudam (a maioria das consultas repete o anterior).
+    """
+    last = {}
+
+    def report(status_data):
+        current = {'status': status_data.get('status'), 'progress': status_data.get('progress')}
+        if current != last:
+            last.update(current)
+            progress(RUNWAY_PROGRESS, **current)
+
+    return report
+
+
+def video_output(status_data):
+    """URL do vídeo na resposta de uma tarefa concluída do Runway."""
+    # A resposta de sucesso pode ser uma lista, pegamos o primeiro item
+    output = status_data.get('output')
+    return output[0] if isinstance(output, list) else output
+
+
+_providers = {}
+_lock = threading.Lock()
+
+
+def get_provider(kind):
+    """Instância do provedor `kind` ('prompt', 'image' ou 'video'), criada uma vez por processo."""
+    provider = _providers.get(kind)
+    if provider is None:
+        with _lock:
+            provider = _providers.get(kind)
+            if provider is None:
+                provider_class = import_string(settings.GIF_PROVIDERS[kind])
+                options = settings.GIF_PROVIDER_OPTIONS.get(kind, {})
+                provider = _providers[kind] = provider_class(**options)
+    return provider
+
+
+def reset_providers():
+    """Descarta as instâncias criadas (usado quando GIF_PROVIDERS muda, ex.: em testes)."""
+    with _lock:
+        _providers.clear()
@@ -0,0 +1,194 @@
+# gif_creator/renditions.py
+"""
+Gera todas as versões (renditions) de um GIF a partir de uma única decodificação do MP4.
+
+As versões são configuradas em GIF_RENDITIONS, por exemplo:
+    {'name': 'gif_240', 'format': 'gif', 'width': 240}
+Formatos suportados: 'gif' (gif_encoder.py), 'webp' (WebP animado) e 'mp4' (H.264).
+Cada quadro decodificado é redimensionado uma vez por largura e entregue a todas as
+versões daquela largura. A codificação é feita em arquivos do espaço de rascunho
+(scratch.py) e os arquivos prontos vão para o armazenamento (storage.py).
+
+A decodificação, o redimensionamento e a codificação (encode_files) rodam num processo do
+pool de encode_pool.py; recebem só caminhos e opções, sem ler as settings.
+
+Memória: o MP4 é codificado em fluxo pelo ffmpeg, mas o encoder de GIF (paleta global
+calculada sobre o clipe todo) e o WebP animado do Pillow precisam de todos os quadros no
+fim. Cada largura usada por versões GIF/WebP guarda um quadro de largura x altura x 3 bytes
+por quadro (versões da mesma largura compartilham o mesmo array). O número de quadros é
+limitado a GIF_RENDITION_MAX_FRAMES: ex. 360 quadros de 480x480 ≈ 250 MB por largura.
+"""
+import os
+import time
+
+import imageio_ffmpeg
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from moviepy import VideoFileClip
+from PIL import Image
+
+from . import artifacts, gif_encoder
+from .encode_pool import get_encode_pool
+from .scratch import get_scratch
+from .storage import get_storage
+from .pipeline_metrics import STAGE_SECONDS
+
+EXTENSIONS = {'gif': 'gif', 'webp': 'webp', 'mp4': 'mp4'}
+
+
+class _GifSink:
+    def __init__(self, path, fps, options):
+        self.path, self.fps, self.options, self.frames = path, fps, options, []
+
+    def add(self, frame):
+        self.frames.append(frame)
+
+    def close(self):
+        gif_encoder.encode_gif(self.frames, self.path, self.fps,
+                               dither=self.options['dither'], tolerance=self.options['tolerance'])
+
+
+class _WebpSink:
+    def __init__(self, path, fps, options):
+        self.path, self.fps, self.options, self.frames = path, fps, options, []
+
+    def add(self, frame):
+        # Guarda o array (o mesmo de um GIF da mesma largura); a Image só é criada no close.
+        self.frames.append(frame)
+
+    def close(self):
+        first, *rest = [Image.fromarray(frame) for frame in self.frames]
+        first.save(self.path, format='WEBP', save_all=True, append_images=rest,
+                   duration=int(round(1000 / self.fps)), loop=0, quality=self.options['webp_quality'], method=4)
+
+
+class _Mp4Sink:
+    def __init__(self, path, fps, size):
+        self.path = path
+        self.writer = imageio_ffmpeg.write_frames(
+            path, size, fps=fps, codec='libx264', pix_fmt_out='yuv420p', quality=None,
+            bitrate=None, output_params=['-crf', '28', '-preset', 'veryfast', '-movflags', '+faststart'],
+            macro_block_size=2,
+        )
+        self.writer.send(None)  # inicia o processo do ffmpeg
+
+    def add(self, frame):
+        self.writer.send(np.ascontiguousarray(frame))
+
+    def close(self):
+        self.writer.close()
+
+
+def _target_size(source_size, width, even=False):
+    source_width, source_height = source_size
+    height = max(1, round(source_height * width / source_width))
+    if even:
+        width, height = width - width % 2, height - height % 2
+    return width, height
+
+
+def render_all(video_path, specs=None, fps=None):
+    """
+    Decodifica `video_path` (relativo a MEDIA_ROOT, ou absoluto, como um arquivo de rascunho)
+    uma vez e grava todas as versões.
+
+    Returns:
+        list[dict]: para cada versão, 'name', 'format', 'path' (caminho no armazenamento),
+        'width', 'height' e 'bytes', na mesma ordem de `specs`.
+    """
+    specs = specs if specs is not None else settings.GIF_RENDITIONS
+    fps = fps or settings.GIF_RENDITION_FPS
+    if not any(spec['format'] == 'gif' for spec in specs):
+        raise ImproperlyConfigured("GIF_RENDITIONS precisa de ao menos uma versão no formato 'gif'.")
+
+    options = {
+        'dither': settings.GIF_DITHER,
+        'tolerance': settings.GIF_DELTA_TOLERANCE,
+        'webp_quality': settings.WEBP_QUALITY,
+        'max_frames': settings.GIF_RENDITION_MAX_FRAMES,
+    }
+    suffixes = [f".{EXTENSIONS.get(spec['format'], 'tmp')}" for spec in specs]
+    # Uma reserva para todas as versões do job; os arquivos são removidos na saída, com ou sem erro.
+    with get_scratch().files(suffixes, nbytes=settings.GIF_SCRATCH_RENDITIONS_BYTES) as tmp_files:
+        tmp_paths = [f.path for f in tmp_files]
+        result = get_encode_pool().run(encode_files, artifacts.absolute_path(video_path), specs, fps,
+                                       tmp_paths, options)
+        for stage, seconds in result['timings'].items():
+            STAGE_SECONDS.observe(seconds, stage=stage)
+
+        storage = get_storage()
+        renditions = []
+        for spec, tmp_path, (width, height) in zip(specs, tmp_paths, result['sizes']):
+            size_bytes = os.path.getsize(tmp_path)
+            renditions.append({
+                'name': spec['name'],
+                'format': spec['format'],
+                'path': storage.save(tmp_path, EXTENSIONS[spec['format']]),
+                'width': width,
+                'height': height,
+                'bytes': size_bytes,
+            })
+        return renditions
+
+
+def encode_files(video_path, specs, fps, tmp_paths, options):
+    """
+    Decodifica `video_path` (absoluto) e grava cada versão de `specs` no caminho correspondente
+    de `tmp_paths`. Executada no pool de processos. Quadros além de options['max_frames'] são
+    descartados (o clipe é cortado), para limitar a memória das versões GIF/WebP.
+
+    Returns:
+        dict: 'sizes' ([largura, altura] de cada versão) e 'timings' (segundos de decode, resize e encode).
+    """
+    clip = VideoFileClip(video_path)
+    outputs = []
+    try:
+        for spec, tmp_path in zip(specs, tmp_paths):
+            size = _target_size(clip.size, spec['width'], even=spec['format'] == 'mp4')
+
+            if spec['format'] == 'gif':
+                sink = _GifSink(tmp_path, fps, options)
+            elif spec['format'] == 'webp':
+                sink = _WebpSink(tmp_path, fps, options)
+            elif spec['format'] == 'mp4':
+                sink = _Mp4Sink(tmp_path, fps, size)
+            else:
+                raise ImproperlyConfigured(f"Formato de versão desconhecido: {spec['format']}")
+            outputs.append({'size': size, 'sink': sink})
+
+        # Tempo acumulado de cada parte da passada única; quem chamou registra nas métricas.
+        timings = {'decode': 0.0, 'resize': 0.0, 'encode': 0.0}
+        frames = clip.iter_frames(fps=fps, dtype='uint8')
+        for _ in range(options['max_frames']):
+            start = time.perf_counter()
+            frame = next(frames, None)
+            timings['decode'] += time.perf_counter() - start
+            if frame is None:
+                break
+
+            start = time.perf_counter()
+            source = Image.fromarray(frame)
+            resized = {}
+            for output in outputs:
+                size = output['size']
+                if size not in resized:
+                    resized[size] = np.asarray(source.resize(size, Image.Resampling.LANCZOS))
+            timings['resize'] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            for output in outputs:
+                output['sink'].add(resized[output['size']])
+            timings['encode'] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        for output in outputs:
+            output['sink'].close()
+        timings['encode'] += time.perf_counter() - start
+        return {'sizes': [list(output['size']) for output in outputs], 'timings': timings}
+    finally:
+        clip.close()
+        # Em caso de erro, não deixa processos do ffmpeg para trás.
+        for output in outputs:
+            if isinstance(output['sink'], _Mp4Sink):
+                output['sink'].writer.close()
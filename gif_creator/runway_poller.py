@@ -0,0 +1,202 @@
+# gif_creator/runway_poller.py
+"""
+Poller único para as tarefas do Runway.
+
+Em vez de cada geração ficar num `while True` + `time.sleep(5)`, todas as tarefas em
+andamento são registradas aqui e consultadas por uma única thread, cada uma no seu
+próprio intervalo: curto no início e crescendo com backoff exponencial + jitter.
+Quem registrou a tarefa recebe um `concurrent.futures.Future` que é concluído quando
+a tarefa termina, falha ou estoura o prazo.
+
+O calendário das consultas (PollSchedule) é o mesmo do caminho assíncrono
+(async_providers.AsyncRunwayVideoGenerator), que o obtém de `get_poller().schedule()`.
+"""
+import heapq
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+
+from Gif_generator_project.http_clients import get_client
+from Gif_generator_project.metrics import UPSTREAM_ERRORS
+
+RUNWAY_API_BASE_URL = "https://api.dev.runwayml.com/v1"
+# Status finais sem vídeo: a tarefa não vai mais mudar, não adianta esperar o prazo.
+RUNWAY_FAILED_STATUSES = ('FAILED', 'CANCELLED')
+
+
+class RunwayTaskFailed(Exception):
+    """A tarefa terminou com status FAILED (ou foi cancelada) no Runway."""
+
+
+class RunwayTaskTimeout(Exception):
+    """A tarefa não terminou dentro do prazo configurado."""
+
+
+class PollSchedule:
+    """
+    Quando consultar uma tarefa: o intervalo começa em `initial_interval` e cresce `multiplier`
+    vezes a cada consulta até `max_interval`, com variação aleatória de ±`jitter`, sem passar
+    do prazo de `timeout` segundos a partir da criação.
+    """
+
+    def __init__(self, initial_interval, max_interval, multiplier, jitter, timeout):
+        self.interval = initial_interval
+        self.max_interval = max_interval
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.deadline = time.monotonic() + timeout
+
+    def next_poll_at(self, now):
+        """Momento (time.monotonic) da próxima consulta."""
+        jittered = self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+        return min(now + jittered, self.deadline)
+
+    def expired(self, now):
+        return now >= self.deadline
+
+    def backoff(self):
+        """Chamado depois de cada consulta sem resultado final."""
+        self.interval = min(self.interval * self.multiplier, self.max_interval)
+
+
+class _Task:
+    def __init__(self, task_id, schedule, on_status=None):
+        self.task_id = task_id
+        self.schedule = schedule
+        self.on_status = on_status
+        self.future = Future()
+
+
+def fetch_task_status(task_id):
+    """Consulta GET /tasks/{id} no Runway e retorna o JSON da resposta."""
+    headers = {
+        "Authorization": f"Bearer {settings.RUNWAY_API_KEY}",
+        "X-Runway-Version": "2024-11-06",
+    }
+    response = get_client('runway').get(f"{RUNWAY_API_BASE_URL}/tasks/{task_id}", headers=headers)
+    response.raise_for_status()
+    return response.json()
+
+
+class RunwayTaskPoller:
+    """
+    Acompanha várias tarefas do Runway com uma única thread.
+
+    Args:
+        fetch_status: função task_id -> dict com o status da tarefa.
+        initial_interval (float): espera antes da primeira consulta, em segundos.
+        max_interval (float): intervalo máximo entre consultas da mesma tarefa.
+        multiplier (float): fator de crescimento do intervalo a cada consulta.
+        jitter (float): variação aleatória relativa do intervalo (0.2 = ±20%).
+        task_timeout (float): prazo padrão de cada tarefa, em segundos.
+    """
+
+    def __init__(self, fetch_status=fetch_task_status, initial_interval=1.0, max_interval=10.0,
+                 multiplier=1.5, jitter=0.2, task_timeout=600.0):
+        self.fetch_status = fetch_status
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.task_timeout = task_timeout
+
+        self._heap = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def schedule(self, timeout=None):
+        """Calendário de consultas de uma tarefa nova, com a configuração deste poller."""
+        return PollSchedule(self.initial_interval, self.max_interval, self.multiplier, self.jitter,
+                            timeout or self.task_timeout)
+
+    def track(self, task_id, timeout=None, on_status=None):
+        """
+        Passa a acompanhar `task_id`. Retorna um Future com o JSON final da tarefa.
+        `on_status(json)`, se informado, é chamado (na thread do poller) a cada consulta sem resultado final.
+        """
+        task = _Task(task_id, self.schedule(timeout), on_status)
+        with self._condition:
+            self._schedule(task, task.schedule.next_poll_at(time.monotonic()))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='runway-poller', daemon=True)
+                self._thread.start()
+            self._condition.notify()
+        return task.future
+
+    def pending_count(self):
+        with self._condition:
+            return len(self._heap)
+
+    def _schedule(self, task, when):
+        heapq.heappush(self._heap, (when, next(self._sequence), task))
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._heap:
+                    self._condition.wait()
+                when, _, task = self._heap[0]
+                delay = when - time.monotonic()
+                if delay > 0:
+                    # Acorda antes se uma tarefa nova, com prazo menor, for registrada.
+                    self._condition.wait(delay)
+                    continue
+                heapq.heappop(self._heap)
+
+            self._poll(task)
+
+    def _poll(self, task):
+        try:
+            status_data = self.fetch_status(task.task_id)
+        except Exception as e:
+            # Erro de rede ou HTTP: tenta de novo no próximo intervalo, até o prazo.
+            print(f"!!! Erro ao consultar a tarefa {task.task_id} no Runway: {e} !!!")
+            status_data = None
+
+        if status_data is not None:
+            task_status = status_data.get('status')
+            if task_status == 'SUCCEEDED':
+                task.future.set_result(status_data)
+                return
+            if task_status in RUNWAY_FAILED_STATUSES:
+                UPSTREAM_ERRORS.inc(provider='runway')
+                task.future.set_exception(RunwayTaskFailed(f"A tarefa no Runway falhou: {status_data}"))
+                return
+            if task.on_status is not None:
+                try:
+                    task.on_status(status_data)
+                except Exception as e:
+                    print(f"!!! Erro ao repassar o status da tarefa {task.task_id}: {e} !!!")
+
+        now = time.monotonic()
+        if task.schedule.expired(now):
+            UPSTREAM_ERRORS.inc(provider='runway')
+            task.future.set_exception(RunwayTaskTimeout(f"A tarefa {task.task_id} do Runway excedeu o prazo."))
+            return
+
+        task.schedule.backoff()
+        with self._condition:
+            self._schedule(task, task.schedule.next_poll_at(now))
+
+
+_poller = None
+_poller_lock = threading.Lock()
+
+
+def get_poller():
+    """Poller compartilhado pelo processo, configurado pelas settings RUNWAY_POLL_*."""
+    global _poller
+    if _poller is None:
+        with _poller_lock:
+            if _poller is None:
+                _poller = RunwayTaskPoller(
+                    initial_interval=settings.RUNWAY_POLL_INITIAL_INTERVAL,
+                    max_interval=settings.RUNWAY_POLL_MAX_INTERVAL,
+                    task_timeout=settings.RUNWAY_TASK_TIMEOUT,
+                )
+    return _poller
@@ -0,0 +1,324 @@
+# gif_creator/scratch.py
+"""
+Espaço de rascunho dos jobs: arquivos temporários do pipeline (download do vídeo, versões
+sendo codificadas) fora do disco que serve as mídias.
+
+Os arquivos ficam em GIF_SCRATCH_DIR (tmpfs, como /dev/shm, quando disponível) ou, para
+arquivos pequenos o bastante, num arquivo anônimo em memória (memfd, só Linux). Cada
+arquivo é aberto por um context manager que o remove na saída, com ou sem erro; o que
+sobrar de um processo que morreu no meio é removido pelo sweep na inicialização (apps.py).
+
+O total reservado pelos jobs de um processo é limitado a GIF_SCRATCH_BUDGET_BYTES: um job
+que não cabe espera até outro liberar espaço (ou até GIF_SCRATCH_WAIT_TIMEOUT). O orçamento
+é de cada processo, não do diretório: com vários workers, o uso de GIF_SCRATCH_DIR pode
+chegar ao orçamento vezes o número de processos (ver settings).
+"""
+import asyncio
+import errno
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from django.conf import settings
+
+# Os arquivos levam o pid no nome, para o sweep saber se o dono ainda está vivo.
+FILE_PREFIX = 'gifscratch-'
+
+
+class ScratchSpaceTimeout(Exception):
+    """O job esperou mais que o permitido por espaço de rascunho."""
+
+
+def move_file(src, dest):
+    """
+    Move `src` para `dest` atomicamente: rename se estiverem no mesmo sistema de arquivos,
+    senão cópia para um temporário ao lado de `dest` + rename.
+    """
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    try:
+        os.replace(src, dest)
+        return
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+    copy_file(src, dest)
+    os.remove(src)
+
+
+def copy_file(src, dest):
+    """Copia `src` para `dest` atomicamente (temporário ao lado de `dest` + rename)."""
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    tmp_path = f"{dest}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, dest)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class ScratchFile:
+    """Um arquivo de rascunho: `path` pode ser passado a qualquer código que abra arquivos (inclusive ffmpeg)."""
+
+    def __init__(self, path, fd=None):
+        self.path = path
+        self._fd = fd  # memfd: o arquivo existe enquanto o descritor estiver aberto
+
+    @property
+    def in_memory(self):
+        return self._fd is not None
+
+    def size(self):
+        try:
+            return os.fstat(self._fd).st_size if self.in_memory else os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def persist(self, dest):
+        """Publica o conteúdo em `dest` (fora do rascunho) atomicamente."""
+        if self.in_memory:
+            copy_file(self.path, dest)
+        else:
+            move_file(self.path, dest)
+
+    def _discard(self):
+        if self.in_memory:
+            os.close(self._fd)
+        elif os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class ScratchSpace:
+    """
+    Args:
+        directory (str): onde criar os arquivos (de preferência um tmpfs).
+        budget_bytes (int): total que pode estar reservado ao mesmo tempo neste processo.
+        memory_max_bytes (int): reservas até este tamanho podem ir para um memfd (0 desliga).
+        wait_timeout (float): espera máxima por espaço, em segundos.
+    """
+
+    def __init__(self, directory, budget_bytes, memory_max_bytes=0, wait_timeout=None):
+        self.directory = directory
+        self.budget_bytes = budget_bytes
+        self.memory_max_bytes = memory_max_bytes if hasattr(os, 'memfd_create') else 0
+        self.wait_timeout = wait_timeout
+
+        self._condition = threading.Condition()
+        self._reserved = 0
+        self._waiting = 0
+        self._files = set()
+        # (loop, asyncio.Event) de cada areserve esperando; _release os acorda de qualquer thread.
+        self._async_waiters = set()
+
+    # --- Orçamento ---
+
+    def _fits(self, nbytes):
+        # Uma reserva maior que o orçamento inteiro passa quando não há mais nada reservado.
+        return self._reserved + nbytes <= self.budget_bytes or self._reserved == 0
+
+    def _try_acquire(self, nbytes):
+        with self._condition:
+            if not self._fits(nbytes):
+                return False
+            self._reserved += nbytes
+            return True
+
+    def _acquire(self, nbytes):
+        deadline = None if self.wait_timeout is None else time.monotonic() + self.wait_timeout
+        with self._condition:
+            self._waiting += 1
+            try:
+                while not self._fits(nbytes):
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise ScratchSpaceTimeout(
+                            f"Sem espaço de rascunho para {nbytes} bytes após {self.wait_timeout}s.")
+                    self._condition.wait(remaining)
+                self._reserved += nbytes
+            finally:
+                self._waiting -= 1
+
+    def _release(self, nbytes):
+        with self._condition:
+            self._reserved -= nbytes
+            self._condition.notify_all()
+            async_waiters = list(self._async_waiters)
+        for loop, event in async_waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # loop já fechado: não há mais quem acordar
+
+    @contextmanager
+    def reserve(self, nbytes):
+        """Reserva `nbytes` do orçamento enquanto o bloco executa, esperando se preciso."""
+        if not self._try_acquire(nbytes):
+            self._acquire(nbytes)
+        try:
+            yield
+        finally:
+            self._release(nbytes)
+
+    @asynccontextmanager
+    async def areserve(self, nbytes):
+        """Como `reserve`, para o event loop: espera sem bloquear o loop, acordada a cada liberação."""
+        if not self._try_acquire(nbytes):
+            await self._aacquire(nbytes)
+        try:
+            yield
+        finally:
+            self._release(nbytes)
+
+    async def _aacquire(self, nbytes):
+        deadline = None if self.wait_timeout is None else time.monotonic() + self.wait_timeout
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._condition:
+            self._waiting += 1
+        try:
+            while True:
+                # Verifica e se inscreve sob o mesmo lock: uma liberação entre os dois não se perde.
+                with self._condition:
+                    if self._fits(nbytes):
+                        self._reserved += nbytes
+                        return
+                    waiter[1].clear()
+                    self._async_waiters.add(waiter)
+                remaining = None if deadline is None else deadline - time.monotonic()
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), remaining)
+                except asyncio.TimeoutError:
+                    raise ScratchSpaceTimeout(
+                        f"Sem espaço de rascunho para {nbytes} bytes após {self.wait_timeout}s.") from None
+        finally:
+            with self._condition:
+                self._async_waiters.discard(waiter)
+                self._waiting -= 1
+
+    # --- Arquivos ---
+
+    def _create(self, suffix, in_memory):
+        if in_memory:
+            fd = os.memfd_create(f"{FILE_PREFIX}{suffix}")
+            # Pelo /proc o memfd pode ser aberto por nome, inclusive por subprocessos (ffmpeg).
+            scratch_file = ScratchFile(f"/proc/{os.getpid()}/fd/{fd}", fd)
+        else:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, path = tempfile.mkstemp(suffix=suffix, prefix=f"{FILE_PREFIX}{os.getpid()}-", dir=self.directory)
+            os.close(fd)
+            scratch_file = ScratchFile(path)
+        with self._condition:
+            self._files.add(scratch_file)
+        return scratch_file
+
+    def _discard(self, scratch_file):
+        with self._condition:
+            self._files.discard(scratch_file)
+        scratch_file._discard()
+
+    @contextmanager
+    def file(self, suffix='', nbytes=0, in_memory=False):
+        """
+        Arquivo de rascunho removido ao sair do bloco. Reserva `nbytes` do orçamento; com
+        `in_memory`, usa um memfd se `nbytes` couber em memory_max_bytes.
+        """
+        with self.reserve(nbytes):
+            scratch_file = self._create(suffix, in_memory and 0 < nbytes <= self.memory_max_bytes)
+            try:
+                yield scratch_file
+            finally:
+                self._discard(scratch_file)
+
+    @asynccontextmanager
+    async def afile(self, suffix='', nbytes=0, in_memory=False):
+        """Como `file`, para o event loop."""
+        async with self.areserve(nbytes):
+            scratch_file = self._create(suffix, in_memory and 0 < nbytes <= self.memory_max_bytes)
+            try:
+                yield scratch_file
+            finally:
+                self._discard(scratch_file)
+
+    @contextmanager
+    def files(self, suffixes, nbytes=0):
+        """Vários arquivos em disco sob uma única reserva de `nbytes` (ex.: todas as versões de um job)."""
+        with self.reserve(nbytes):
+            created = []
+            try:
+                for suffix in suffixes:
+                    created.append(self._create(suffix, in_memory=False))
+                yield created
+            finally:
+                for scratch_file in created:
+                    self._discard(scratch_file)
+
+    def sweep(self):
+        """Remove arquivos deixados por processos que não existem mais. Retorna quantos foram removidos."""
+        removed = 0
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return 0
+        for name in names:
+            if not name.startswith(FILE_PREFIX):
+                continue
+            pid = name[len(FILE_PREFIX):].split('-', 1)[0]
+            if pid.isdigit() and _process_alive(int(pid)):
+                continue
+            try:
+                os.remove(os.path.join(self.directory, name))
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+    def usage(self):
+        """
+        Situação atual: bytes reservados e ocupados de fato (total e só em disco), orçamento, jobs
+        esperando e arquivos abertos. Custa um stat por arquivo aberto, sem varrer diretórios.
+        """
+        with self._condition:
+            files = list(self._files)
+            reserved, waiting = self._reserved, self._waiting
+        sizes = [(f.size(), f.in_memory) for f in files]
+        return {
+            'reserved_bytes': reserved,
+            'used_bytes': sum(size for size, _ in sizes),
+            'disk_bytes': sum(size for size, in_memory in sizes if not in_memory),
+            'budget_bytes': self.budget_bytes,
+            'waiting': waiting,
+            'files': len(files),
+        }
+
+
+def _process_alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # existe, mas é de outro usuário
+    return True
+
+
+_scratch = None
+_lock = threading.Lock()
+
+
+def get_scratch():
+    """Espaço de rascunho do processo, configurado pelas settings GIF_SCRATCH_*."""
+    global _scratch
+    if _scratch is None:
+        with _lock:
+            if _scratch is None:
+                _scratch = ScratchSpace(
+                    directory=settings.GIF_SCRATCH_DIR,
+                    budget_bytes=settings.GIF_SCRATCH_BUDGET_BYTES,
+                    memory_max_bytes=settings.GIF_SCRATCH_MEMORY_MAX_BYTES,
+                    wait_timeout=settings.GIF_SCRATCH_WAIT_TIMEOUT,
+                )
+    return _scratch
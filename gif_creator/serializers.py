@@ -1,13 +1,19 @@
 from rest_framework import serializers
-from .models import GeneratedGif
+from .models import GeneratedGif, GenerationJob
+
+
+def absolute_renditions(request, renditions):
+    """Troca a URL relativa de cada versão pela URL absoluta."""
+    return [{**rendition, 'url': request.build_absolute_uri(rendition['url'])} for rendition in renditions]
 
 
 class GeneratedGifSerializer(serializers.ModelSerializer):
     gif_url = serializers.SerializerMethodField()
+    renditions = serializers.SerializerMethodField()
 
     class Meta:
         model = GeneratedGif
-        fields = ['id', 'prompt', 'overlay_text', 'gif_url', 'created_at']
+        fields = ['id', 'prompt', 'overlay_text', 'gif_url', 'renditions', 'created_at']
 
     def get_gif_url(self, obj):
         """
@@ -21,4 +27,63 @@ class GeneratedGifSerializer(serializers.ModelSerializer):
 
         # request.build_absolute_uri() pega o caminho relativo (obj.gif_url)
         # e o transforma em uma URL completa (ex: http://127.0.0.1:8000/media/...)
-        return request.build_absolute_uri(obj.gif_url)
\ No newline at end of file
+        return request.build_absolute_uri(obj.gif_url)
+
+    def get_renditions(self, obj):
+        request = self.context.get('request')
+        if request is None:
+            return obj.renditions
+        return absolute_renditions(request, obj.renditions)
+
+
+_datetime_field = serializers.DateTimeField()
+
+
+def _join_base(base_url, path):
+    # Caminhos relativos ao servidor (MEDIA_URL) recebem o esquema e host; URLs completas ficam como estão.
+    return base_url + path if path.startswith('/') else path
+
+
+class GifHistorySerializer(serializers.BaseSerializer):
+    """
+    Serializer enxuto para a listagem do histórico.
+
+    Monta o dicionário direto, sem campos declarados, e usa a URL base do servidor
+    calculada uma única vez por resposta (context['base_url']) em vez de chamar
+    request.build_absolute_uri para cada GIF e cada versão.
+    """
+    # Colunas lidas do banco (GifHistoryView usa com .only())
+    model_fields = ['id', 'prompt', 'overlay_text', 'gif_url', 'renditions', 'created_at']
+
+    def to_representation(self, obj):
+        base_url = self.context.get('base_url', '')
+        return {
+            'id': obj.id,
+            'prompt': obj.prompt,
+            'overlay_text': obj.overlay_text,
+            'gif_url': _join_base(base_url, obj.gif_url),
+            'renditions': [{**r, 'url': _join_base(base_url, r['url'])} for r in obj.renditions],
+            'created_at': _datetime_field.to_representation(obj.created_at),
+        }
+
+
+class GenerationJobSerializer(serializers.ModelSerializer):
+    gif_url = serializers.SerializerMethodField()
+    renditions = serializers.SerializerMethodField()
+
+    class Meta:
+        model = GenerationJob
+        fields = ['id', 'status', 'gif_url', 'renditions', 'error', 'created_at', 'started_at', 'finished_at']
+
+    def get_gif_url(self, obj):
+        # Só existe URL depois que o job terminou com sucesso.
+        request = self.context.get('request')
+        if request is None or obj.gif is None:
+            return None
+        return request.build_absolute_uri(obj.gif.gif_url)
+
+    def get_renditions(self, obj):
+        request = self.context.get('request')
+        if request is None or obj.gif is None:
+            return []
+        return absolute_renditions(request, obj.gif.renditions)
@@ -1,22 +1,79 @@
-from gif_creator.models import GeneratedGif
-import os
-import uuid
-import base64
-import requests
-import time 
+from gif_creator.models import GeneratedGif, GenerationArtifact
+import asyncio
 from io import BytesIO
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from PIL import Image, ImageDraw, ImageFont
-from moviepy import VideoFileClip
-import google.generativeai as genai
+from Gif_generator_project.metrics import UPSTREAM_ERRORS
+from PIL import Image
 
-RUNWAY_API_BASE_URL = "https://api.dev.runwayml.com/v1"
-CLIPDROP_API_URL = "https://clipdrop-api.co/text-to-image/v1"
+from . import artifacts, progress, prompt_cache, renditions, text_overlay
+from .pipeline_metrics import STAGE_SECONDS
+from .async_providers import get_async_provider
+from .providers import get_provider
+from .scratch import get_scratch
+from .storage import get_storage
+
+
+def enhance_prompt(original_prompt):
+    """
+    Aprimora o prompt do usuário com o provedor 'prompt' (Gemini, por padrão).
+
+    Consulta antes o cache de prompts (prompt_cache.py); só chama o provedor em caso de miss.
+    Se o provedor falhar, devolve o prompt original (e não grava nada no cache).
+    """
+    cached_prompt = _cached_enhanced_prompt(original_prompt)
+    if cached_prompt is not None:
+        return cached_prompt
+    return _enhance_uncached(original_prompt)
+
+
+def _cached_enhanced_prompt(original_prompt):
+    print(f"--- Etapa 0: Aprimorando prompt (Original: '{original_prompt}') ---")
+    cached_prompt = prompt_cache.lookup(original_prompt)
+    if cached_prompt is not None:
+        print(f"--- Prompt Aprimorado encontrado no cache: '{cached_prompt}' ---")
+    return cached_prompt
+
+
+def _enhance_uncached(original_prompt):
+    try:
+        enhanced_prompt = get_provider('prompt').enhance(original_prompt)
+    except Exception as e:
+        return _enhance_failed(original_prompt, e)
+    return _enhance_done(original_prompt, enhanced_prompt)
+
+
+async def _enhance_uncached_async(original_prompt):
+    """Como `_enhance_uncached`, com o provedor assíncrono; o cache de prompts é gravado via sync_to_async."""
+    try:
+        enhanced_prompt = await get_async_provider('prompt').enhance(original_prompt)
+    except Exception as e:
+        return _enhance_failed(original_prompt, e)
+    return await sync_to_async(_enhance_done)(original_prompt, enhanced_prompt)
+
+
+def _enhance_failed(original_prompt, error):
+    UPSTREAM_ERRORS.inc(provider='gemini')
+    print(f"!!! Erro ao aprimorar o prompt: {error}. Usando o prompt original. !!!")
+    return original_prompt
+
+
+def _enhance_done(original_prompt, enhanced_prompt):
+    if not enhanced_prompt:
+        print("!!! Resposta do provedor de prompt vazia ou bloqueada. Usando prompt original. !!!")
+        return original_prompt
+    print(f"--- Prompt Aprimorado: '{enhanced_prompt}' ---")
+    prompt_cache.store(original_prompt, enhanced_prompt)
+    return enhanced_prompt
+
+
+def _ignore_progress(event, **data):
+    pass
 
 
 class AnimationService:
 
-    def __init__(self, user, prompt, overlay_text=''):
+    def __init__(self, user, prompt, overlay_text='', progress=None):
         """
         Initializes the AnimationService.
 
@@ -24,186 +81,238 @@ class AnimationService:
             user: The User object making the request.
             prompt (str): The initial text prompt provided by the user.
             overlay_text (str, optional): Text to overlay on the generated GIF. Defaults to ''.
+            progress (callable, optional): `progress(evento, **dados)`, chamado a cada etapa
+                concluída (ver progress.py). Defaults to None.
         """
         self.user = user
+        self.progress = progress or _ignore_progress
 
-        # --- API Configurations ---
-        self.clipdrop_api_key = settings.CLIPDROP_API_KEY
-        self.clipdrop_headers = {'x-api-key': self.clipdrop_api_key}
-        self.runway_api_key = settings.RUNWAY_API_KEY
-        self.runway_headers = {
-            "Authorization": f"Bearer {self.runway_api_key}",
-            "Content-Type": "application/json",
-            "X-Runway-Version": "2024-11-06"
-        }
-
-        # --- Prompt Enhancement with Gemini ---
-        original_prompt = prompt
-        print(f"--- Etapa 0: Aprimorando prompt com Gemini (Original: '{original_prompt}') ---")
-        try:
-            genai.configure(api_key=settings.GEMINI_API_KEY)
-
-            model = genai.GenerativeModel('gemini-2.5-pro')  
-
-            meta_prompt = (
-                "Aprimore o seguinte prompt de usuário para gerar uma imagem mais detalhada, "
-                "artística e de alta qualidade em uma API de IA (como Stable Diffusion/ClipDrop). "
-                "Ex de melhoria "
-                "Prompt Usuario: Uma manhã bonita em uma plantação de milho com o sol nascendo"
-                "Prompt melhorado: (masterpiece, 8k, best quality:1.3), a beautiful morning in a corn field with the sun rising, vibrant golden hues reflecting off the corn leaves, (landscape:1.2), (atmospheric:1.1), (depth of field:1.1), (clear sky:1.2), (greenery details:1.3), (sunlight filtering through corn stalks:1.3), Negative prompt: (worst quality, low quality:1.4), blurry, ugly, text, watermark. Steps: 30, Sampler: DPM++ 2M Karras, CFG scale: 7."
-                "e composição, mas mantenha a ideia central do usuário. "
-                "Retorne APENAS o prompt aprimorado, sem nenhuma introdução ou texto extra.\n\n"
-                f"Prompt do Usuário: \"{original_prompt}\""
-            )
-
-            response = model.generate_content(meta_prompt)
-            if response.parts:
-                enhanced_prompt_from_gemini = response.text.strip()
-            else:
-                print("!!! Resposta do Gemini vazia ou bloqueada. Usando prompt original. !!!")
-                enhanced_prompt_from_gemini = original_prompt
-
-            print(f"--- Prompt Aprimorado pelo Gemini: '{enhanced_prompt_from_gemini}' ---")
-
-        except Exception as e:
-            print(f"!!! Erro ao chamar a API do Gemini: {e}. Usando o prompt original. !!!")
-            enhanced_prompt_from_gemini = original_prompt
+        # O prompt é aprimorado durante a geração (etapa 0), e só se ainda não estiver no
+        # cache de prompts; o cache é a única fonte do prompt aprimorado (ver _save_generated_gif).
+        self.original_prompt = prompt
+        self.prompt = None
+        self.overlay_text = overlay_text.strip().strip('"\'')
+        self.artifact_key = artifacts.artifact_key(prompt, self.overlay_text)
 
-        final_prompt_for_clipdrop =  enhanced_prompt_from_gemini
+    def _generate_base_image(self):
+        print("--- Etapa 1: Gerando imagem base ---")
+        print(f"--- Prompt Final Enviado: {self.prompt} ---")
+        return self._compose_base_image(get_provider('image').generate(self.prompt))
 
-        self.prompt = final_prompt_for_clipdrop
-        self.overlay_text = overlay_text.strip().strip('"\'')
-        self.font_path = os.path.join(settings.BASE_DIR, 'static', 'fonts', 'fonte.ttf')
-        self.output_filename = f"{uuid.uuid4()}.gif"
-        self.output_path = os.path.join(settings.MEDIA_ROOT, 'ai_gifs', self.output_filename)
-
-    def _generate_base_image_with_text(self):
-        print("--- Etapa 1: Gerando imagem base com ClipDrop ---")
-        print(f"--- Prompt Final Enviado para ClipDrop: {self.prompt} ---")
-        files = {'prompt': (None, self.prompt, 'text/plain')}
-        response = requests.post(CLIPDROP_API_URL, headers=self.clipdrop_headers, files=files)
-
-        if response.ok:
-            image = Image.open(BytesIO(response.content)).convert("RGBA")
-            print("--- Imagem gerada com sucesso pela ClipDrop ---")
-        else:
-            try:
-                error_data = response.json()
-                error_message = error_data.get('error', response.text)
-            except requests.exceptions.JSONDecodeError:
-                error_message = response.text
-            raise Exception(f"Erro na API ClipDrop ({response.status_code}): {error_message}")
+    def _compose_base_image(self, image_bytes):
+        """Aplica o texto sobre a imagem do provedor e devolve o JPEG que vai para a animação."""
+        image = Image.open(BytesIO(image_bytes)).convert("RGBA")
+        print("--- Imagem base gerada com sucesso ---")
 
         if self.overlay_text:
-            if self.overlay_text:
-                draw = ImageDraw.Draw(image)
-                font_size = int(image.width / 12)
-                try:
-                    font = ImageFont.truetype(self.font_path, font_size)
-                except IOError:
-                    font = ImageFont.load_default()
-
-            bbox = draw.textbbox((0, 0), self.overlay_text, font=font)
-            text_width = bbox[2] - bbox[0]
-            text_height = bbox[3] - bbox[1]
-            x = (image.width - text_width) / 2
-            y = (image.height - text_height) * 0.85
-            shadow_color = '#404040'
-            draw.text((x - 2, y - 2), self.overlay_text, font=font, fill=shadow_color)
-            draw.text((x + 2, y - 2), self.overlay_text, font=font, fill=shadow_color)
-            draw.text((x - 2, y + 2), self.overlay_text, font=font, fill=shadow_color)
-            draw.text((x + 2, y + 2), self.overlay_text, font=font, fill=shadow_color)
-            draw.text((x, y), self.overlay_text, font=font, fill='white')
-
-        return image
+            text_overlay.draw_overlay(image, self.overlay_text)
 
-    def generate_animated_gif(self):
-        """Orquestra todo o processo: imagem -> animação -> conversão para GIF."""
-        # 1. Gera a imagem estática com o texto
-        final_image_pil = self._generate_base_image_with_text()
         # Converte a imagem de RGBA para RGB antes de enviar.
         # Isso remove o canal de transparência que pode causar o erro no Runway.
         print("--- Convertendo imagem para RGB antes de enviar ---")
-        final_image_rgb = final_image_pil.convert("RGB")
-
         buffered = BytesIO()
-        # Salva a imagem RGB (pode usar JPEG que é mais leve, ou PNG)
-        final_image_rgb.save(buffered, format="JPEG")
-        base64_image = base64.b64encode(buffered.getvalue()).decode("utf-8")
-        # Ajusta o data_uri para o formato correto
-        data_uri = f"data:image/jpeg;base64,{base64_image}"
-
-        # 2. Inicia a tarefa de animação no Runway
-        print("--- Etapa 2: Enviando para animação no Runway... ---")
-        start_payload = {
-            "promptImage": data_uri,
-            "model": "gen4_turbo",
-            "duration": 3,
-            "ratio": "960:960"
-        }
-        start_response = requests.post(f"{RUNWAY_API_BASE_URL}/image_to_video", headers=self.runway_headers,
-                                       json=start_payload)
-
-        if start_response.status_code != 200:
-            raise Exception(f"Erro ao iniciar a tarefa no Runway: {start_response.text}")
-
-        response_json = start_response.json()
-        task_id = response_json['id']
-        # --------------------------------
-
-        print(f"--- Tarefa iniciada com ID: {task_id} ---")
-
-        while True:
-            print("--- Verificando status da tarefa... ---")
-            status_response = requests.get(f"{RUNWAY_API_BASE_URL}/tasks/{task_id}", headers=self.runway_headers)
-            status_data = status_response.json()
-
-            if status_data['status'] == 'SUCCEEDED':
-                # A resposta de sucesso pode ser uma lista, pegamos o primeiro item
-                video_url = status_data['output'][0] if isinstance(status_data.get('output'),
-                                                                   list) else status_data.get('output')
-                print("--- Etapa 3: Vídeo gerado! URL:", video_url, "---")
-                break
-            elif status_data['status'] == 'FAILED':
-                raise Exception(f"A tarefa no Runway falhou: {status_data}")
-
-            time.sleep(5)
-
-        print("--- Etapa 4: Baixando vídeo e preparando para conversão... ---")
-        video_response = requests.get(video_url)
-
-        temp_video_path = os.path.join(settings.MEDIA_ROOT, 'temp_videos', f'{uuid.uuid4()}.mp4')
-        os.makedirs(os.path.dirname(temp_video_path), exist_ok=True)
-        with open(temp_video_path, "wb") as f:
-            f.write(video_response.content)
-
-        clip = VideoFileClip(temp_video_path)
+        image.convert("RGB").save(buffered, format="JPEG")
+        return buffered.getvalue()
 
-        print("--- Etapa 5: Aplicando compressão (redimensionamento e FPS)... ---")
+    def _animate_image(self, image_bytes):
+        """Envia a imagem base (JPEG) ao provedor de vídeo e espera terminar. Retorna a referência do vídeo."""
+        print("--- Etapa 2: Enviando para animação... ---")
+        video_source = get_provider('video').animate(image_bytes, progress=self.progress)
+        print("--- Etapa 3: Vídeo gerado!", video_source, "---")
+        return video_source
 
-        # 1. Redimensiona o vídeo para uma largura máxima de 480 pixels, mantendo a proporção.
-        final_clip = clip.resized(width=480)
-
-        target_fps = 12
-
-        print("--- Etapa 6: Convertendo vídeo otimizado para GIF... ---")
-        os.makedirs(os.path.dirname(self.output_path), exist_ok=True)
+    def _video_scratch_file(self):
+        """
+        Arquivo de rascunho para o download do vídeo. A reserva é o tamanho máximo que o
+        download aceita (VIDEO_DOWNLOAD_MAX_BYTES), para o orçamento nunca ser ultrapassado.
+        """
+        return get_scratch().file('.mp4', nbytes=settings.VIDEO_DOWNLOAD_MAX_BYTES, in_memory=True)
 
-        # Usa o clipe redimensionado ('final_clip') e o novo FPS para criar o GIF.
-        final_clip.write_gif(self.output_path, fps=target_fps)
+    def _download_video(self, video_source, path):
+        """Baixa o vídeo em `path` (o arquivo de rascunho)."""
+        print("--- Etapa 4: Baixando vídeo e preparando para conversão... ---")
+        get_provider('video').download(video_source, path)
 
-        # Fecha os clipes para liberar memória
-        final_clip.close()
-        clip.close()
+    def _keep_video(self, artifact, tmp):
+        """
+        Caminho de onde renderizar o vídeo baixado. Com GIF_ARTIFACTS_CACHE_VIDEO ele é publicado no
+        cache de artefatos antes; senão é renderizado direto do rascunho e descartado em seguida.
+        """
+        if not settings.GIF_ARTIFACTS_CACHE_VIDEO:
+            return tmp.path
+        tmp.persist(artifacts.absolute_path(artifact.video_path))
+        artifact.save(update_fields=['video_path'])
+        return artifact.video_path
+
+    def _render_outputs(self, video_path):
+        """Gera o GIF principal e as demais versões configuradas com uma única decodificação do vídeo."""
+        print("--- Etapas 5-6: Redimensionando e gerando GIF e demais versões... ---")
+        rendition_list = renditions.render_all(video_path)
+        for rendition in rendition_list:
+            rendition['url'] = get_storage().url(rendition['path'])
+        return rendition_list
+
+    # --- Etapas de _build_artifact que tocam o banco ou o disco ---
+    # Compartilhadas com AsyncAnimationService, que as chama via sync_to_async (fora do event loop).
+
+    def _load_artifact(self):
+        """GenerationArtifact da chave deste pedido e se o GIF final dele já está no armazenamento."""
+        artifact, _ = GenerationArtifact.objects.get_or_create(key=self.artifact_key)
+        done = get_storage().exists(artifact.gif_path)
+        if done:
+            print(f"--- GIF idêntico já existe ({artifact.gif_path}); reaproveitando ---")
+        return artifact, done
+
+    def _cached_base_image(self, artifact):
+        """Imagem base já gerada por um pedido idêntico, ou None."""
+        if not artifacts.exists(artifact.base_image_path):
+            return None
+        print("--- Etapa 1: Imagem base reaproveitada do cache ---")
+        with open(artifacts.absolute_path(artifact.base_image_path), 'rb') as f:
+            return f.read()
+
+    def _store_base_image(self, artifact, image_bytes):
+        artifact.base_image_path = artifacts.artifact_relpath(self.artifact_key, 'jpg')
+        artifacts.write_atomic(artifact.base_image_path, image_bytes)
+        artifact.save(update_fields=['base_image_path'])
+
+    def _has_cached_video(self, artifact):
+        cached = artifacts.exists(artifact.video_path)
+        if cached:
+            print("--- Etapas 2-4: Vídeo do Runway reaproveitado do cache ---")
+        else:
+            artifact.video_path = artifacts.artifact_relpath(self.artifact_key, 'mp4')
+        return cached
 
-        os.remove(temp_video_path)
+    def _save_outputs(self, artifact, rendition_list):
+        artifact.renditions = rendition_list
+        # O GIF principal (gif_url) é a primeira versão no formato GIF.
+        artifact.gif_path = next(r['path'] for r in artifact.renditions if r['format'] == 'gif')
+        artifact.save(update_fields=['renditions', 'gif_path'])
 
-        gif_path = os.path.join(settings.MEDIA_URL, 'ai_gifs', self.output_filename)
+    def _build_artifact(self):
+        """
+        Executa as etapas que ainda faltam para a chave deste pedido e retorna o GenerationArtifact completo.
+        Etapas já concluídas por um pedido idêntico anterior são reaproveitadas do disco.
+        """
+        artifact, done = self._load_artifact()
+        if done:
+            self.progress(progress.ENCODED, cached=True)
+            return artifact
+
+        self.prompt = _cached_enhanced_prompt(self.original_prompt)
+        cached = self.prompt is not None
+        if not cached:
+            with STAGE_SECONDS.time(stage='prompt_enhance'):
+                self.prompt = _enhance_uncached(self.original_prompt)
+        self.progress(progress.PROMPT_ENHANCED, cached=cached)
 
-        GeneratedGif.objects.create(
-            user=self.user,
-            prompt=self.prompt,
-            overlay_text=self.overlay_text,
-            gif_url=gif_path
-        )
+        # 1. Gera a imagem estática com o texto
+        image_bytes = self._cached_base_image(artifact)
+        cached = image_bytes is not None
+        if not cached:
+            with STAGE_SECONDS.time(stage='base_image'):
+                image_bytes = self._generate_base_image()
+            self._store_base_image(artifact, image_bytes)
+        self.progress(progress.BASE_IMAGE_READY, cached=cached)
+
+        if self._has_cached_video(artifact):
+            self.progress(progress.DOWNLOADED, cached=True)
+            rendition_list = self._render_outputs(artifact.video_path)
+        else:
+            video_source = self._animate_image(image_bytes)
+            with self._video_scratch_file() as tmp:
+                with STAGE_SECONDS.time(stage='download'):
+                    self._download_video(video_source, tmp.path)
+                self.progress(progress.DOWNLOADED, cached=False)
+                rendition_list = self._render_outputs(self._keep_video(artifact, tmp))
+
+        self._save_outputs(artifact, rendition_list)
+        self.progress(progress.ENCODED, cached=False)
+        return artifact
+
+    def _save_generated_gif(self, artifact):
+        if self.prompt is None:
+            # GIF reaproveitado ou pipeline de outro pedido (single flight): o prompt aprimorado
+            # vem do cache de prompts; sem ele (aprimoramento falhou ou expirou), fica o original.
+            self.prompt = prompt_cache.lookup(self.original_prompt) or self.original_prompt
+        gif_path = get_storage().url(artifact.gif_path)
+
+        with STAGE_SECONDS.time(stage='save'):
+            self.generated_gif = GeneratedGif.objects.create(
+                user=self.user,
+                prompt=self.prompt,
+                overlay_text=self.overlay_text,
+                gif_url=gif_path,
+                artifact=artifact,
+                renditions=[{k: v for k, v in r.items() if k != 'path'} for r in artifact.renditions]
+            )
+        self.progress(progress.SAVED, gif_id=self.generated_gif.pk)
         return gif_path
+
+    def generate_animated_gif(self):
+        """Orquestra todo o processo: imagem -> animação -> conversão para GIF."""
+        # Pedidos idênticos simultâneos esperam pelo mesmo pipeline.
+        artifact = artifacts.single_flight.run(self.artifact_key, self._build_artifact)
+        return self._save_generated_gif(artifact)
+
+
+class AsyncAnimationService(AnimationService):
+    """
+    O mesmo pipeline de AnimationService, para rodar num event loop (async_jobs.py).
+
+    As chamadas aos provedores usam as versões assíncronas (async_providers.py) e, enquanto
+    esperam, não ocupam thread nenhuma. As etapas que tocam banco ou disco são as mesmas de
+    AnimationService e rodam fora do loop: via sync_to_async (uma thread compartilhada) e,
+    o trabalho pesado de CPU (composição da imagem e renderização das versões), no pool de
+    threads do loop.
+    """
+
+    async def _build_artifact_async(self):
+        artifact, done = await sync_to_async(self._load_artifact)()
+        if done:
+            self.progress(progress.ENCODED, cached=True)
+            return artifact
+
+        self.prompt = await sync_to_async(_cached_enhanced_prompt)(self.original_prompt)
+        cached = self.prompt is not None
+        if not cached:
+            with STAGE_SECONDS.time(stage='prompt_enhance'):
+                self.prompt = await _enhance_uncached_async(self.original_prompt)
+        self.progress(progress.PROMPT_ENHANCED, cached=cached)
+
+        image_bytes = await sync_to_async(self._cached_base_image)(artifact)
+        cached = image_bytes is not None
+        if not cached:
+            with STAGE_SECONDS.time(stage='base_image'):
+                print("--- Etapa 1: Gerando imagem base ---")
+                print(f"--- Prompt Final Enviado: {self.prompt} ---")
+                raw_image = await get_async_provider('image').generate(self.prompt)
+                image_bytes = await asyncio.to_thread(self._compose_base_image, raw_image)
+            await sync_to_async(self._store_base_image)(artifact, image_bytes)
+        self.progress(progress.BASE_IMAGE_READY, cached=cached)
+
+        if await sync_to_async(self._has_cached_video)(artifact):
+            self.progress(progress.DOWNLOADED, cached=True)
+            rendition_list = await asyncio.to_thread(self._render_outputs, artifact.video_path)
+        else:
+            print("--- Etapa 2: Enviando para animação... ---")
+            video_source = await get_async_provider('video').animate(image_bytes, progress=self.progress)
+            print("--- Etapa 3: Vídeo gerado!", video_source, "---")
+            async with get_scratch().afile('.mp4', nbytes=settings.VIDEO_DOWNLOAD_MAX_BYTES, in_memory=True) as tmp:
+                with STAGE_SECONDS.time(stage='download'):
+                    print("--- Etapa 4: Baixando vídeo e preparando para conversão... ---")
+                    await get_async_provider('video').download(video_source, tmp.path)
+                self.progress(progress.DOWNLOADED, cached=False)
+                # Publicar no cache (cópia do memfd ou rename) toca o disco e o banco: fora do loop.
+                video_path = await sync_to_async(self._keep_video)(artifact, tmp)
+                rendition_list = await asyncio.to_thread(self._render_outputs, video_path)
+
+        await sync_to_async(self._save_outputs)(artifact, rendition_list)
+        self.progress(progress.ENCODED, cached=False)
+        return artifact
+
+    async def generate_animated_gif(self):
+        """Orquestra todo o processo: imagem -> animação -> conversão para GIF."""
+        artifact = await artifacts.async_single_flight.run(self.artifact_key, self._build_artifact_async)
+        return await sync_to_async(self._save_generated_gif)(artifact)
@@ -0,0 +1,129 @@
+# gif_creator/storage.py
+"""
+Armazenamento das versões finais (GIF, WebP, MP4) servidas aos usuários.
+
+Cada arquivo é gravado com o nome igual ao hash SHA-256 do próprio conteúdo, em
+subdiretórios derivados do hash (ai_gifs/ab/cd/abcd….gif), para nenhum diretório
+acumular milhares de entradas. O conteúdo de uma URL nunca muda, então ela pode ser
+servida com ETag forte (o próprio hash) e `Cache-Control: immutable` (ver views.serve_media).
+
+O backend é escolhido em GIF_STORAGE_BACKEND e criado uma vez por processo (get_storage).
+"""
+import hashlib
+import os
+import re
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .scratch import move_file
+
+GIFS_DIR = 'ai_gifs'
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Nome gravado por ShardedFileSystemStorage: <hash sha256>.<extensão>
+_CONTENT_NAME = re.compile(r'^([0-9a-f]{64})\.[a-z0-9]+$')
+
+
+class MediaStorage:
+    """Interface dos backends de armazenamento das versões finais."""
+
+    def save(self, tmp_path, extension):
+        """Move o arquivo `tmp_path`, já completo, para o armazenamento. Retorna o caminho relativo."""
+        raise NotImplementedError
+
+    def exists(self, relpath):
+        raise NotImplementedError
+
+    def path(self, relpath):
+        """Caminho absoluto do arquivo no disco."""
+        raise NotImplementedError
+
+    def url(self, relpath):
+        """URL (relativa ao servidor) pela qual o arquivo é servido."""
+        raise NotImplementedError
+
+
+class ShardedFileSystemStorage(MediaStorage):
+    """
+    Arquivos em MEDIA_ROOT/<prefix>/, nomeados pelo hash do conteúdo e distribuídos em
+    `depth` níveis de subdiretórios de 2 caracteres do hash.
+
+    Args:
+        root (str): diretório base (padrão: MEDIA_ROOT).
+        base_url (str): URL correspondente a `root` (padrão: MEDIA_URL).
+        prefix (str): subdiretório das versões dentro de `root`.
+        depth (int): níveis de subdiretórios.
+    """
+
+    def __init__(self, root=None, base_url=None, prefix=GIFS_DIR, depth=2):
+        self._root = root
+        self._base_url = base_url
+        self.prefix = prefix
+        self.depth = depth
+
+    # Lidos a cada uso quando não informados, para acompanhar MEDIA_ROOT/MEDIA_URL (ex.: override_settings).
+    @property
+    def root(self):
+        return self._root or settings.MEDIA_ROOT
+
+    @property
+    def base_url(self):
+        return self._base_url or settings.MEDIA_URL
+
+    def relpath_for(self, digest, extension):
+        shards = [digest[i * 2:i * 2 + 2] for i in range(self.depth)]
+        return '/'.join([self.prefix, *shards, f"{digest}.{extension}"])
+
+    def save(self, tmp_path, extension):
+        digest = file_sha256(tmp_path)
+        relpath = self.relpath_for(digest, extension)
+        # Rename (ou cópia + rename, vindo de outro sistema de arquivos): quem lê vê o arquivo
+        # inteiro ou nenhum. Se o mesmo conteúdo já existe, a substituição é inofensiva.
+        move_file(tmp_path, self.path(relpath))
+        return relpath
+
+    def exists(self, relpath):
+        return bool(relpath) and os.path.exists(self.path(relpath))
+
+    def path(self, relpath):
+        return os.path.join(self.root, relpath)
+
+    def url(self, relpath):
+        return f"{self.base_url.rstrip('/')}/{relpath}"
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def content_hash(relpath):
+    """Hash do conteúdo contido no nome do arquivo, ou None para nomes antigos (ai_gifs/<chave>_<versão>.gif)."""
+    match = _CONTENT_NAME.match(os.path.basename(relpath))
+    return match.group(1) if match else None
+
+
+_storage = None
+_lock = threading.Lock()
+
+
+def get_storage():
+    """Backend configurado em GIF_STORAGE_BACKEND (com GIF_STORAGE_OPTIONS), criado uma vez por processo."""
+    global _storage
+    if _storage is None:
+        with _lock:
+            if _storage is None:
+                _storage = import_string(settings.GIF_STORAGE_BACKEND)(**settings.GIF_STORAGE_OPTIONS)
+    return _storage
+
+
+def reset_storage():
+    """Descarta o backend criado (usado quando GIF_STORAGE_* mudam, ex.: em testes)."""
+    global _storage
+    with _lock:
+        _storage = None
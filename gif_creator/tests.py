@@ -1,3 +1,1483 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import heapq
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest import mock, skipUnless
+
+import httpx
+import numpy as np
+import requests
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import close_old_connections
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from Gif_generator_project import http_clients
+from Gif_generator_project.metrics import UPSTREAM_ERRORS
+from PIL import Image, ImageSequence
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from subscriptions.models import Plan, Subscription
+from subscriptions.quota import QuotaExceeded, release_gif_slot, reserve_gif_slot
+from users.authentication import token_cache
+from . import artifacts, benchmarks, gif_encoder, progress, prompt_cache, renditions, text_overlay
+from .async_jobs import run_job_async
+from .async_providers import AsyncRunwayVideoGenerator, reset_async_providers
+from .encode_pool import EncodePool, EncodeQueueFull, get_encode_pool, reset_encode_pool
+from .models import EnhancedPrompt, GeneratedGif, GenerationJob
+from .providers import RunwayVideoGenerator
+from .runway_poller import RunwayTaskFailed, RunwayTaskPoller, RunwayTaskTimeout
+from .scratch import FILE_PREFIX, ScratchSpace, ScratchSpaceTimeout
+from .storage import content_hash, get_storage
+
+
+def create_subscriber(gif_limit, gif_count=0):
+    user = get_user_model().objects.create_user(
+        username='cliente', password='senha-forte-123', taxId='12345678901', cellphone='11999999999',
+        has_active_subscription=True,
+    )
+    plan = Plan.objects.create(name='Básico', description='', price=990, gif_limit=gif_limit)
+    subscription = Subscription.objects.create(
+        user=user, plan=plan, status='active', gif_count=gif_count, end_date=timezone.now() + timedelta(days=30),
+    )
+    return user, subscription
+
+
+class GifQuotaReservationTests(TransactionTestCase):
+    """A cota é reservada com um UPDATE condicional, então pedidos paralelos não passam do limite."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_parallel_reservations_never_exceed_limit(self):
+        user, subscription = create_subscriber(gif_limit=5)
+        attempts = 20
+        barrier = threading.Barrier(attempts)
+        outcomes = []
+        outcomes_lock = threading.Lock()
+
+        def reserve():
+            try:
+                barrier.wait()
+                try:
+                    reserve_gif_slot(subscription)
+                    outcome = 'reserved'
+                except QuotaExceeded:
+                    outcome = 'rejected'
+                with outcomes_lock:
+                    outcomes.append(outcome)
+            finally:
+                close_old_connections()
+
+        threads = [threading.Thread(target=reserve) for _ in range(attempts)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            # Sem lock de linha longo: todas as threads terminam rapidamente.
+            thread.join(timeout=10)
+            self.assertFalse(thread.is_alive())
+
+        subscription.refresh_from_db()
+        self.assertEqual(outcomes.count('reserved'), 5)
+        self.assertEqual(outcomes.count('rejected'), attempts - 5)
+        self.assertEqual(subscription.gif_count, 5)
+
+    def test_release_returns_slot(self):
+        user, subscription = create_subscriber(gif_limit=1)
+        reserve_gif_slot(subscription)
+        with self.assertRaises(QuotaExceeded):
+            reserve_gif_slot(subscription)
+
+        release_gif_slot(subscription.pk, user.pk)
+        reserve_gif_slot(subscription)
+        subscription.refresh_from_db()
+        self.assertEqual(subscription.gif_count, 1)
+
+    def test_release_never_goes_negative(self):
+        user, subscription = create_subscriber(gif_limit=1)
+        release_gif_slot(subscription.pk, user.pk)
+        subscription.refresh_from_db()
+        self.assertEqual(subscription.gif_count, 0)
+
+    @mock.patch('gif_creator.views.submit_generation_job')
+    def test_generate_view_rejects_when_limit_reached(self, submit):
+        user, subscription = create_subscriber(gif_limit=2, gif_count=1)
+        client = APIClient()
+        client.force_authenticate(user)
+
+        first = client.post('/api/gif/generate-image/', {'prompt': 'Um gato'}, format='json')
+        second = client.post('/api/gif/generate-image/', {'prompt': 'Um cachorro'}, format='json')
+
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual(second.status_code, 403)
+        self.assertEqual(submit.call_count, 1)
+        self.assertEqual(GenerationJob.objects.get().subscription, subscription)
+        subscription.refresh_from_db()
+        self.assertEqual(subscription.gif_count, 2)
+
+    def test_release_skips_a_renewed_cycle(self):
+        user, subscription = create_subscriber(gif_limit=5)
+        stale = Subscription.objects.select_related('plan').get(pk=subscription.pk)  # ex.: contexto em cache
+        old_cycle = reserve_gif_slot(subscription)
+
+        # Renovação (webhook de pagamento): contador zerado, ciclo novo.
+        Subscription.objects.filter(pk=subscription.pk).update(gif_count=0, cycle=F('cycle') + 1)
+        # Uma leitura de antes da renovação ainda reserva, e no ciclo atual.
+        new_cycle = reserve_gif_slot(stale)
+        self.assertEqual(new_cycle, old_cycle + 1)
+
+        release_gif_slot(subscription.pk, user.pk, old_cycle)
+        subscription.refresh_from_db()
+        self.assertEqual(subscription.gif_count, 1)  # a vaga do ciclo antigo não sai do novo
+        release_gif_slot(subscription.pk, user.pk, new_cycle)
+        subscription.refresh_from_db()
+        self.assertEqual(subscription.gif_count, 0)
+
+    def test_inactive_subscription_cannot_reserve(self):
+        user, subscription = create_subscriber(gif_limit=5)
+        Subscription.objects.filter(pk=subscription.pk).update(status='inactive')
+        with self.assertRaises(QuotaExceeded):
+            reserve_gif_slot(subscription)
+        subscription.refresh_from_db()
+        self.assertEqual(subscription.gif_count, 0)
+
+    @mock.patch('gif_creator.views.submit_generation_job')
+    def test_slot_is_not_kept_when_job_creation_fails(self, submit):
+        user, subscription = create_subscriber(gif_limit=2)
+        client = APIClient(raise_request_exception=False)
+        client.force_authenticate(user)
+
+        with mock.patch.object(GenerationJob.objects, 'create', side_effect=Exception("banco indisponível")):
+            response = client.post('/api/gif/generate-image/', {'prompt': 'Um gato'}, format='json')
+
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(submit.called)
+        subscription.refresh_from_db()
+        self.assertEqual(subscription.gif_count, 0)
+
+    @mock.patch('gif_creator.views.submit_generation_job')
+    def test_overlay_text_longer_than_field_is_rejected(self, submit):
+        user, subscription = create_subscriber(gif_limit=2)
+        token = Token.objects.create(user=user).key
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {token}")
+
+        for url in ['/api/gif/generate-image/', '/api/gif/generate-image-async/']:
+            response = client.post(url, {'prompt': 'Um gato', 'text': 'x' * 256}, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('255', response.json()['error'])
+            response = client.post(url, {'prompt': 'Um gato', 'text': ['não', 'é', 'texto']}, format='json')
+            self.assertEqual(response.status_code, 400)
+
+        self.assertFalse(submit.called)
+        self.assertFalse(GenerationJob.objects.exists())
+        subscription.refresh_from_db()
+        self.assertEqual(subscription.gif_count, 0)
+
+    def test_failed_job_refunds_slot(self):
+        from . import jobs
+
+        user, subscription = create_subscriber(gif_limit=3)
+        reserve_gif_slot(subscription)
+        job = GenerationJob.objects.create(user=user, prompt='Um gato', subscription=subscription)
+        jobs._slots.acquire()  # _run_job libera a vaga do pool ao terminar
+
+        with mock.patch('gif_creator.services.AnimationService.generate_animated_gif',
+                        side_effect=Exception("falha simulada")):
+            jobs._run_job(job.pk)
+
+        job.refresh_from_db()
+        subscription.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(subscription.gif_count, 0)
+
+
+class GenerationJobLifecycleTests(TestCase):
+    """Ciclo de vida do job: enfileirado -> em execução -> concluído/falho, com a cota reservada e devolvida."""
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.user, self.subscription = create_subscriber(gif_limit=3)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=self.user).key}")
+
+    def submit(self):
+        before = self.gif_count()
+        with mock.patch('gif_creator.views.submit_generation_job') as submit:
+            response = self.client.post('/api/gif/generate-image/', {'prompt': 'Um gato'}, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(submit.call_count, 1)
+        job = GenerationJob.objects.get(pk=response.json()['job_id'])
+        self.assertEqual(job.status, 'pending')
+        self.assertEqual(self.gif_count(), before + 1)
+        return job
+
+    def run_job(self, job, generate):
+        from . import jobs
+
+        seen = {}
+
+        def fake_generate(service):
+            seen['status'] = GenerationJob.objects.get(pk=job.pk).status
+            return generate(service)
+
+        with mock.patch('gif_creator.services.AnimationService.generate_animated_gif', fake_generate):
+            jobs.run_job(job.pk)
+        self.assertEqual(seen['status'], 'running')
+        return self.client.get(f'/api/gif/jobs/{job.pk}/').json()
+
+    def gif_count(self):
+        self.subscription.refresh_from_db()
+        return self.subscription.gif_count
+
+    def test_succeeded_job_keeps_slot(self):
+        job = self.submit()
+
+        def generate(service):
+            service.generated_gif = GeneratedGif.objects.create(user=self.user, prompt='Um gato',
+                                                                gif_url='/media/ai_gifs/gato.gif')
+
+        body = self.run_job(job, generate)
+        self.assertEqual(body['status'], 'succeeded')
+        self.assertTrue(body['gif_url'].endswith('/media/ai_gifs/gato.gif'))
+        self.assertEqual(self.gif_count(), 1)
+
+    def test_failed_job_refunds_slot(self):
+        job = self.submit()
+
+        def generate(service):
+            raise Exception("falha simulada")
+
+        body = self.run_job(job, generate)
+        self.assertEqual(body['status'], 'failed')
+        self.assertIn('falha simulada', body['error'])
+        self.assertEqual(self.gif_count(), 0)
+
+    def test_stale_jobs_are_failed_and_refunded_once(self):
+        now = timezone.now()
+        stale_running = self.submit()
+        # Esperou muito na fila, mas começou agora: ainda dentro do prazo de execução.
+        long_queued = self.submit()
+        stale_pending = self.submit()
+        GenerationJob.objects.filter(pk=stale_running.pk).update(
+            status='running', created_at=now - timedelta(hours=1), started_at=now - timedelta(hours=1))
+        GenerationJob.objects.filter(pk=long_queued.pk).update(
+            status='running', created_at=now - timedelta(hours=3), started_at=now - timedelta(minutes=5))
+        GenerationJob.objects.filter(pk=stale_pending.pk).update(created_at=now - timedelta(hours=3))
+        done = GenerationJob.objects.create(user=self.user, prompt='Um gato', status='succeeded',
+                                            subscription=self.subscription)
+        GenerationJob.objects.filter(pk=done.pk).update(created_at=now - timedelta(hours=3))
+
+        out = StringIO()
+        call_command('fail_stale_jobs', running_for=1800, queued_for=7200, stdout=out)
+        self.assertIn('2 job(s)', out.getvalue())
+        statuses = dict(GenerationJob.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses[stale_running.pk], 'failed')
+        self.assertEqual(statuses[stale_pending.pk], 'failed')
+        self.assertEqual(statuses[long_queued.pk], 'running')
+        self.assertEqual(statuses[done.pk], 'succeeded')
+        self.assertEqual(self.gif_count(), 1)
+
+        # Rodar de novo não devolve a vaga outra vez.
+        call_command('fail_stale_jobs', running_for=1800, queued_for=7200, stdout=StringIO())
+        self.assertEqual(self.gif_count(), 1)
+
+    def test_worker_cannot_finish_a_job_the_sweeper_failed(self):
+        from . import jobs
+
+        job = self.submit()
+
+        def generate(service):
+            # O sweeper dá o job como perdido enquanto o pipeline ainda roda.
+            jobs.fail_stale_jobs(running_for=0, queued_for=0)
+            service.generated_gif = GeneratedGif.objects.create(user=self.user, prompt='Um gato',
+                                                                gif_url='/media/ai_gifs/gato.gif')
+
+        body = self.run_job(job, generate)
+        self.assertEqual(body['status'], 'failed')
+        self.assertIn('interrompido', body['error'])
+        self.assertFalse(GeneratedGif.objects.exists())  # resultado descartado
+        self.assertEqual(self.gif_count(), 0)  # devolvida uma única vez
+
+        # Uma falha tardia do worker também não devolve de novo.
+        jobs.fail_job(job, Exception("falha tardia"))
+        self.assertEqual(self.gif_count(), 0)
+
+    def test_worker_does_not_start_a_job_the_sweeper_failed(self):
+        from . import jobs
+
+        job = self.submit()
+        jobs.fail_stale_jobs(running_for=0, queued_for=0)
+        with mock.patch('gif_creator.services.AnimationService.generate_animated_gif') as generate:
+            jobs.run_job(job.pk)
+        self.assertFalse(generate.called)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIsNone(job.started_at)
+        self.assertEqual(self.gif_count(), 0)
+
+
+class GifQueryBudgetTests(TestCase):
+    """
+    Número máximo de consultas por URL de gif_creator/urls.py, com caches frios (token e
+    assinatura). O histórico tem mais GIFs que uma página, para que um N+1 apareça no total.
+    """
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.user, self.subscription = create_subscriber(gif_limit=100)
+        for i in range(25):
+            gif = GeneratedGif.objects.create(
+                user=self.user, prompt=f'Gato {i}', gif_url=f'/media/gifs/{i}.gif',
+                renditions=[{'width': 240, 'url': f'/media/gifs/{i}-240.gif'}],
+            )
+        self.job = GenerationJob.objects.create(user=self.user, prompt='Gato', status='succeeded', gif=gif)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=self.user).key}")
+
+    @mock.patch('gif_creator.views.submit_generation_job')
+    def test_generate_image(self, submit):
+        # token -> usuário, assinatura + plano, UPDATE da cota e INSERT do job numa transação
+        # (aqui dentro do TestCase ela vira SAVEPOINT + RELEASE SAVEPOINT)
+        with self.assertNumQueries(6):
+            response = self.client.post('/api/gif/generate-image/', {'prompt': 'Um gato'}, format='json')
+        self.assertEqual(response.status_code, 202)
+
+    def test_job_status(self):
+        with self.assertNumQueries(2):  # token -> usuário, job + GIF
+            response = self.client.get(f'/api/gif/jobs/{self.job.id}/')
+        self.assertEqual(response.json()['renditions'][0]['width'], 240)
+
+    def test_history(self):
+        with self.assertNumQueries(2):  # token -> usuário, uma página de GIFs
+            response = self.client.get('/api/gif/history/')
+        self.assertEqual(len(response.json()['results']), 20)
+
+    def test_history_pages_through_gifs_with_the_same_timestamp(self):
+        GeneratedGif.objects.filter(user=self.user).update(created_at=timezone.now())
+        seen, url = [], '/api/gif/history/?page_size=7'
+        while url:
+            body = self.client.get(url).json()
+            seen += [gif['id'] for gif in body['results']]
+            url = body['next']
+
+        expected = list(GeneratedGif.objects.filter(user=self.user).order_by('-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    @override_settings(QUERY_COUNT_MIDDLEWARE=True)
+    def test_middleware_reports_query_count(self):
+        client = APIClient()  # o middleware é carregado na primeira requisição do cliente
+        client.credentials(HTTP_AUTHORIZATION=self.client._credentials['HTTP_AUTHORIZATION'])
+        response = client.get('/api/gif/history/')
+        self.assertEqual(response['X-DB-Query-Count'], '2')
+        self.assertIn('X-DB-Query-Time-Ms', response)
+
+
+class AsyncGenerationTests(TestCase):
+    """generate-image-async/: o job roda no event loop sob ASGI e no pool de threads sob WSGI."""
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.user, self.subscription = create_subscriber(gif_limit=5)
+        self.auth = {'Authorization': f"Token {Token.objects.create(user=self.user).key}"}
+
+    async def test_asgi_request_runs_job_on_event_loop(self):
+        with mock.patch('gif_creator.views.submit_generation_job_async') as submit_async, \
+                mock.patch('gif_creator.views.submit_generation_job') as submit_threaded:
+            response = await self.async_client.post('/api/gif/generate-image-async/', {'prompt': 'Um gato'},
+                                                    content_type='application/json', headers=self.auth)
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(submit_async.call_count, 1)
+        self.assertFalse(submit_threaded.called)
+        job = await GenerationJob.objects.aget(pk=response.json()['job_id'])
+        self.assertEqual(job.subscription_id, self.subscription.pk)
+        self.assertTrue(response.json()['events_url'].endswith(f'/api/gif/jobs/{job.pk}/events/'))
+
+    def test_wsgi_request_falls_back_to_thread_pool(self):
+        with mock.patch('gif_creator.views.submit_generation_job') as submit_threaded:
+            response = self.client.post('/api/gif/generate-image-async/', {'prompt': 'Um gato'},
+                                        content_type='application/json', headers=self.auth)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(submit_threaded.call_count, 1)
+        # Sob WSGI não há stream de andamento: o cliente consulta status_url.
+        self.assertNotIn('events_url', response.json())
+
+    def test_requires_token(self):
+        response = self.client.post('/api/gif/generate-image-async/', {'prompt': 'Um gato'},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(GenerationJob.objects.exists())
+
+    def test_run_job_async_with_fake_providers(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        fakes = {kind: f'gif_creator.fake_providers.AsyncFake{name}'
+                 for kind, name in [('prompt', 'PromptEnhancer'), ('image', 'ImageGenerator'),
+                                    ('video', 'VideoGenerator')]}
+        options = {'image': {'size': 64}, 'video': {'size': 64, 'duration': 1}}
+        self.addCleanup(reset_async_providers)
+
+        # Sem GIF_ARTIFACTS_CACHE_VIDEO o vídeo é renderizado do rascunho e não vai para o disco de mídia.
+        for prompt, cache_video in [('Um gato', False), ('Um cachorro', True)]:
+            with self.subTest(cache_video=cache_video):
+                job = GenerationJob.objects.create(user=self.user, prompt=prompt, subscription=self.subscription)
+                with override_settings(MEDIA_ROOT=media_root, GIF_ASYNC_PROVIDERS=fakes,
+                                       GIF_PROVIDER_OPTIONS=options, GIF_ARTIFACTS_CACHE_VIDEO=cache_video,
+                                       GIF_RENDITIONS=[{'name': 'gif_64', 'format': 'gif', 'width': 64}]):
+                    reset_async_providers()
+                    async_to_sync(run_job_async)(job.pk)
+
+                job.refresh_from_db()
+                self.assertEqual(job.status, 'succeeded', job.error)
+                self.assertTrue(job.gif.gif_url.endswith('.gif'))
+                artifact = job.gif.artifact
+                self.assertEqual(bool(artifact.video_path), cache_video)
+                video_file = os.path.join(media_root, artifacts.artifact_relpath(artifact.key, 'mp4'))
+                self.assertEqual(os.path.exists(video_file), cache_video)
+
+
+async def read_sse(response):
+    """Lista de (evento, dados) de uma resposta SSE (ASGI), ignorando os keep-alives."""
+    body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+    events = []
+    for message in body.split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in message.splitlines() if not line.startswith(':'))
+        if 'event' in fields:
+            events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+
+class ProgressStreamTests(TestCase):
+    """jobs/<id>/events/: etapas do job por server-sent events."""
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.user, self.subscription = create_subscriber(gif_limit=5)
+        self.auth = {'Authorization': f"Token {Token.objects.create(user=self.user).key}"}
+
+    def test_broker_replays_and_wakes_subscribers(self):
+        broker = progress.ProgressBroker(retention=60)
+        broker.publish('job', progress.STARTED)
+        woken = threading.Event()
+        broker.subscribe('job', woken.set)
+        broker.publish('job', progress.SAVED, gif_id=1)
+
+        self.assertTrue(woken.is_set())
+        events, exists = broker.events_after('job')
+        self.assertTrue(exists)
+        self.assertEqual([e[1] for e in events], [progress.STARTED, progress.SAVED])
+        self.assertEqual(broker.events_after('job', events[0][0])[0], events[1:])
+
+        broker.unsubscribe('job', woken.set)
+        self.assertEqual(broker.events_after('other'), ([], False))
+        self.assertEqual(len(broker), 1)
+
+    async def test_streams_live_events_until_final(self):
+        job = await GenerationJob.objects.acreate(user=self.user, prompt='Um gato', status='running')
+
+        def publish():
+            progress.broker.publish(job.pk, progress.PROMPT_ENHANCED, cached=False)
+            progress.broker.publish(job.pk, progress.SUCCEEDED, gif_id=None)
+
+        response = await self.async_client.get(f'/api/gif/jobs/{job.pk}/events/', headers=self.auth)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        threading.Timer(0.05, publish).start()
+        self.assertEqual(await read_sse(response), [
+            ('prompt_enhanced', {'cached': False}),
+            ('succeeded', {'gif_id': None}),
+        ])
+
+    async def test_finished_job_without_channel_sends_only_outcome(self):
+        job = await GenerationJob.objects.acreate(user=self.user, prompt='Um gato', status='failed', error='Falhou.')
+        response = await self.async_client.get(f'/api/gif/jobs/{job.pk}/events/', headers=self.auth)
+        self.assertEqual(await read_sse(response), [('failed', {'error': 'Falhou.'})])
+
+    def test_other_users_job_is_not_found(self):
+        other = get_user_model().objects.create_user(username='outro', password='senha-forte-123',
+                                                     taxId='10987654321', cellphone='11988888888')
+        job = GenerationJob.objects.create(user=other, prompt='Um gato')
+        response = self.client.get(f'/api/gif/jobs/{job.pk}/events/', headers=self.auth)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.client.get(f'/api/gif/jobs/{job.pk}/events/').status_code, 401)
+
+    def test_wsgi_points_to_polling(self):
+        job = GenerationJob.objects.create(user=self.user, prompt='Um gato', status='running')
+        response = self.client.get(f'/api/gif/jobs/{job.pk}/events/', headers=self.auth)
+        self.assertEqual(response.status_code, 406)
+        self.assertTrue(response.json()['status_url'].endswith(f'/api/gif/jobs/{job.pk}/'))
+
+    def test_pipeline_publishes_stages_in_order(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        fakes = {kind: f'gif_creator.fake_providers.AsyncFake{name}'
+                 for kind, name in [('prompt', 'PromptEnhancer'), ('image', 'ImageGenerator'),
+                                    ('video', 'VideoGenerator')]}
+        options = {'image': {'size': 64}, 'video': {'size': 64, 'duration': 1}}
+        job = GenerationJob.objects.create(user=self.user, prompt='Um gato', subscription=self.subscription)
+
+        with override_settings(MEDIA_ROOT=media_root, GIF_ASYNC_PROVIDERS=fakes, GIF_PROVIDER_OPTIONS=options,
+                               GIF_RENDITIONS=[{'name': 'gif_64', 'format': 'gif', 'width': 64}]):
+            reset_async_providers()
+            self.addCleanup(reset_async_providers)
+            async_to_sync(run_job_async)(job.pk)
+
+        # O canal fica retido depois do fim: quem conecta atrasado recebe todas as etapas.
+        response = async_to_sync(self.async_client.get)(f'/api/gif/jobs/{job.pk}/events/', headers=self.auth)
+        events = async_to_sync(read_sse)(response)
+        job.refresh_from_db()
+        self.assertEqual([name for name, _ in events], [
+            'started', 'prompt_enhanced', 'base_image_ready', 'runway_queued',
+            'downloaded', 'encoded', 'saved', 'succeeded',
+        ])
+        self.assertEqual(events[-1][1], {'gif_id': job.gif_id})
+
+
+@override_settings(MEDIA_SERVE_MODE='django')
+@override_settings(PROMPT_CACHE_TTL=60, PROMPT_CACHE_MEMORY_SIZE=2, PROMPT_CACHE_MAX_ROWS=100,
+                   PROMPT_CACHE_EVICT_EVERY=100)
+class PromptCacheTests(TestCase):
+    """prompt_cache.py: LRU em memória na frente da tabela EnhancedPrompt, com TTL e limpeza periódica."""
+
+    def setUp(self):
+        prompt_cache.clear_memory()
+        prompt_cache._stores_since_evict = 0
+        self.addCleanup(prompt_cache.clear_memory)
+
+    def stats_after(self, action):
+        before = prompt_cache.get_stats()
+        result = action()
+        after = prompt_cache.get_stats()
+        return result, {k: after[k] - before[k] for k in ('memory_hits', 'db_hits', 'misses')}
+
+    def test_normalized_prompts_share_an_entry(self):
+        prompt_cache.store('Um  Gato!', 'um gato fofo')
+        result, stats = self.stats_after(lambda: prompt_cache.lookup('um gato'))
+        self.assertEqual(result, 'um gato fofo')
+        self.assertEqual(stats, {'memory_hits': 1, 'db_hits': 0, 'misses': 0})
+
+    def test_memory_is_lru_and_falls_through_to_db(self):
+        prompt_cache.store('a', 'A')
+        prompt_cache.store('b', 'B')
+        prompt_cache.lookup('a')  # 'b' passa a ser o menos usado
+        prompt_cache.store('c', 'C')
+        self.assertEqual(prompt_cache.get_stats()['memory_size'], 2)
+
+        result, stats = self.stats_after(lambda: prompt_cache.lookup('b'))
+        self.assertEqual(result, 'B')
+        self.assertEqual(stats, {'memory_hits': 0, 'db_hits': 1, 'misses': 0})
+        # Voltou para a memória.
+        _, stats = self.stats_after(lambda: prompt_cache.lookup('b'))
+        self.assertEqual(stats['memory_hits'], 1)
+
+    def test_entries_expire_in_both_levels(self):
+        prompt_cache.store('a', 'A')
+        later = time.time() + 120
+        with mock.patch('gif_creator.prompt_cache.time.time', return_value=later):
+            # A entrada em memória expirou; a linha da tabela ainda vale (created_at é agora).
+            _, stats = self.stats_after(lambda: prompt_cache.lookup('a'))
+            self.assertEqual(stats, {'memory_hits': 0, 'db_hits': 1, 'misses': 0})
+
+        prompt_cache.clear_memory()
+        EnhancedPrompt.objects.update(created_at=timezone.now() - timedelta(seconds=120))
+        result, stats = self.stats_after(lambda: prompt_cache.lookup('a'))
+        self.assertIsNone(result)
+        self.assertEqual(stats['misses'], 1)
+
+    @override_settings(PROMPT_CACHE_MAX_ROWS=2)
+    def test_evict_db_removes_expired_then_least_used(self):
+        for prompt in ['a', 'b', 'c', 'd']:
+            prompt_cache.store(prompt, prompt.upper())
+        now = timezone.now()
+        EnhancedPrompt.objects.filter(enhanced_prompt='A').update(created_at=now - timedelta(seconds=120))
+        for prompt, age in [('B', 30), ('C', 10), ('D', 20)]:
+            EnhancedPrompt.objects.filter(enhanced_prompt=prompt).update(last_used_at=now - timedelta(seconds=age))
+
+        prompt_cache._evict_db()
+        self.assertEqual(sorted(EnhancedPrompt.objects.values_list('enhanced_prompt', flat=True)), ['C', 'D'])
+
+    @override_settings(PROMPT_CACHE_EVICT_EVERY=3)
+    def test_evict_db_runs_every_n_stores(self):
+        with mock.patch('gif_creator.prompt_cache._evict_db') as evict_db:
+            for i in range(7):
+                prompt_cache.store(f'prompt {i}', 'aprimorado')
+        self.assertEqual(evict_db.call_count, 2)
+
+
+class TextOverlayTests(TestCase):
+    """text_overlay.py: tamanho da fonte, quebra e corte do texto, e o contorno dilatado."""
+
+    def assert_fits(self, lines, size, width):
+        self.assertLessEqual(len(lines), text_overlay.MAX_LINES)
+        for line in lines:
+            self.assertLessEqual(text_overlay.text_width(line, size), width * text_overlay.MAX_WIDTH_RATIO)
+
+    def test_short_text_fits_whole(self):
+        size, lines = text_overlay.fit_text('Bom dia', 480, 480)
+        self.assertEqual(lines, ['Bom dia'])
+        self.assertEqual(size, 480 // 12)  # o maior tamanho da busca
+
+    def test_long_text_is_truncated_with_ellipsis(self):
+        text = ' '.join(['palavra'] * 200)
+        size, lines = text_overlay.fit_text(text, 480, 480)
+
+        self.assertEqual(size, 480 // 40)  # o menor tamanho da busca
+        self.assertEqual(len(lines), text_overlay.MAX_LINES)
+        self.assertTrue(lines[-1].endswith(text_overlay.ELLIPSIS))
+        self.assert_fits(lines, size, 480)
+
+    def test_long_word_is_broken(self):
+        size, lines = text_overlay.fit_text('a' * 300, 480, 480)
+        self.assert_fits(lines, size, 480)
+        self.assertGreater(len(lines), 1)
+        self.assertEqual(set(''.join(lines[:-1])), {'a'})
+
+    def test_dilate_grows_mask_by_radius(self):
+        mask = np.zeros((9, 9), dtype=np.uint8)
+        mask[4, 4] = 255
+        dilated = text_overlay._dilate(mask, 2)
+        self.assertEqual(dilated.shape, mask.shape)
+        self.assertEqual(np.argwhere(dilated == 255).tolist(), [[r, c] for r in range(2, 7) for c in range(2, 7)])
+
+    def test_overlay_draws_text_with_outline(self):
+        image = text_overlay.draw_overlay(Image.new('RGB', (240, 240), 'black'), 'Oi')
+        colors = {color for _, color in image.getcolors(240 * 240)}
+        self.assertIn((0x40, 0x40, 0x40), colors)  # contorno, onde só a máscara dilatada cobre
+        self.assertGreater(max(colors)[0], 200)  # texto (branco, suavizado nas bordas) por cima
+        # O texto fica na parte de baixo; o topo continua intacto.
+        self.assertEqual(image.crop((0, 0, 240, 100)).getcolors(), [(240 * 100, (0, 0, 0))])
+
+
+class GifEncoderTests(TestCase):
+    """gif_encoder.encode_gif decodificado de volta pelo Pillow: quadros, durações e loop."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def make_frames(self):
+        # Poucas cores fora do centro das células de 15 bits e um quadrado que anda: quadros delta de verdade.
+        rng = np.random.default_rng(7)
+        colors = rng.integers(0, 256, size=(16, 3), dtype=np.uint8)
+        background = colors[rng.integers(0, 16, size=(48, 64))]
+        frames = []
+        for step in range(6):
+            frame = background.copy()
+            frame[10:22, 4 + step * 8:16 + step * 8] = colors[step % 16]
+            frames.append(frame)
+        frames.insert(3, frames[2].copy())  # quadro repetido: vira duração maior do anterior
+        return frames
+
+    def decode(self, path):
+        with Image.open(path) as image:
+            loop = image.info.get('loop')
+            frames, durations = [], []
+            for frame in ImageSequence.Iterator(image):
+                frames.append(np.asarray(frame.convert('RGB'), dtype=np.int16))
+                durations.append(frame.info['duration'])
+        return frames, durations, loop
+
+    def test_round_trip_through_pillow(self):
+        frames = self.make_frames()
+        path = gif_encoder.encode_gif(frames, os.path.join(self.directory, 'saida.gif'), fps=12)
+        decoded, durations, loop = self.decode(path)
+
+        expected = [frame for i, frame in enumerate(frames) if i == 0 or not np.array_equal(frame, frames[i - 1])]
+        self.assertEqual(len(decoded), len(expected))
+        for original, frame in zip(expected, decoded):
+            self.assertEqual(frame.shape, original.shape)
+            # Cores quantizadas para 5 bits por canal: no máximo meia célula (4) de diferença.
+            self.assertLessEqual(np.abs(frame - original.astype(np.int16)).max(), 4)
+
+        # 12 fps em centésimos: 8, 9, 8, 8, 9, 8, 8 (arredondamento acumulado); o repetido soma ao anterior.
+        self.assertEqual(durations, [80, 90, 160, 90, 80, 80])
+        self.assertEqual(sum(durations), round(len(frames) * 100 / 12) * 10)  # sem desvio acumulado
+        self.assertEqual(loop, 0)
+
+    def test_single_frame_and_empty_input(self):
+        frame = self.make_frames()[0]
+        decoded, durations, loop = self.decode(
+            gif_encoder.encode_gif([frame], os.path.join(self.directory, 'um.gif'), fps=10))
+        self.assertEqual(len(decoded), 1)
+        self.assertLessEqual(np.abs(decoded[0] - frame.astype(np.int16)).max(), 4)
+        self.assertEqual(durations, [100])
+        with self.assertRaises(ValueError):
+            gif_encoder.encode_gif([], os.path.join(self.directory, 'vazio.gif'), fps=10)
+
+
+class FakeRunwayClient:
+    """Cliente HTTP falso para GET /tasks/{id}: devolve as respostas na ordem e anota quando foi consultado."""
+
+    def __init__(self, clock, responses):
+        self.clock = clock
+        self.responses = list(responses)
+        self.calls = []
+
+    def get(self, url, headers=None):
+        self.calls.append(self.clock.now)
+        outcome = self.responses.pop(0) if self.responses else {'status': 'RUNNING'}
+        if isinstance(outcome, Exception):
+            raise outcome
+        response = mock.Mock(status_code=200)
+        response.json.return_value = outcome
+        return response
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class RunwayPollerTests(TestCase):
+    """runway_poller.RunwayTaskPoller com cliente falso e relógio controlado, sem a thread do poller."""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        for target, fake in [('gif_creator.runway_poller.time.monotonic', self.clock.monotonic),
+                             ('gif_creator.runway_poller.random.uniform', lambda a, b: 1.0)]:
+            patcher = mock.patch(target, fake)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.poller = RunwayTaskPoller(initial_interval=1, max_interval=8, multiplier=2, task_timeout=60)
+        self.poller._run = lambda: None  # os testes fazem o papel da thread: run_until_done
+        self.statuses = []
+
+    def track(self, responses, timeout=None, on_status=None):
+        self.client = FakeRunwayClient(self.clock, responses)
+        with mock.patch('gif_creator.runway_poller.get_client', return_value=self.client):
+            future = self.poller.track('task-1', timeout=timeout, on_status=on_status or self.statuses.append)
+            self.run_until_done()
+        return future
+
+    def run_until_done(self):
+        # Mesma ordem da thread: espera até a próxima consulta marcada (sleep) e consulta.
+        while self.poller._heap:
+            when, _, task = heapq.heappop(self.poller._heap)
+            self.clock.sleep(max(0.0, when - self.clock.now))
+            self.poller._poll(task)
+
+    def test_backoff_grows_until_max_interval_then_succeeds(self):
+        running = {'status': 'RUNNING', 'progress': 0.5}
+        done = {'status': 'SUCCEEDED', 'output': ['https://runway.test/video.mp4']}
+        future = self.track([{'status': 'PENDING'}, running, ConnectionError("rede"), running, running, done])
+
+        self.assertEqual(future.result(timeout=0), done)
+        intervals = [round(b - a, 6) for a, b in zip([1000.0] + self.client.calls, self.client.calls)]
+        self.assertEqual(intervals, [1, 2, 4, 8, 8, 8])  # dobra a cada consulta, limitado a max_interval
+        # Erros de rede não interrompem nem chegam ao on_status; os status intermediários sim.
+        self.assertEqual(self.statuses, [{'status': 'PENDING'}, running, running, running])
+        self.assertEqual(self.poller.pending_count(), 0)
+
+    def test_times_out_at_deadline(self):
+        future = self.track([], timeout=20)
+
+        with self.assertRaises(RunwayTaskTimeout):
+            future.result(timeout=0)
+        # 1, 3, 7, 15 e a última consulta exatamente no prazo, não depois dele.
+        self.assertEqual(self.client.calls, [1001.0, 1003.0, 1007.0, 1015.0, 1020.0])
+
+    def test_failed_and_cancelled_tasks_stop_polling(self):
+        for final_status in ['FAILED', 'CANCELLED']:
+            with self.subTest(final_status):
+                self.statuses = []
+                future = self.track([{'status': 'RUNNING'}, {'status': final_status, 'failure': 'moderação'}])
+
+                with self.assertRaisesRegex(RunwayTaskFailed, 'moderação'):
+                    future.result(timeout=0)
+                self.assertEqual(len(self.client.calls), 2)
+                self.assertEqual(self.statuses, [{'status': 'RUNNING'}])
+
+    def test_error_in_on_status_does_not_stop_polling(self):
+        on_status = mock.Mock(side_effect=Exception("callback quebrado"))
+        future = self.track([{'status': 'RUNNING'}, {'status': 'SUCCEEDED'}], on_status=on_status)
+        self.assertEqual(future.result(timeout=0), {'status': 'SUCCEEDED'})
+        self.assertEqual(on_status.call_count, 1)
+
+    def test_async_provider_follows_the_same_schedule(self):
+        self.track([], timeout=20)
+        sync_calls = self.client.calls
+
+        self.clock.now = 1000.0
+        async_client = FakeRunwayClient(self.clock, [])
+        fake_async_client = mock.Mock(get=mock.AsyncMock(side_effect=async_client.get))
+
+        async def fake_sleep(seconds):
+            self.clock.sleep(seconds)
+
+        with mock.patch('gif_creator.async_providers.get_poller',
+                        return_value=RunwayTaskPoller(initial_interval=1, max_interval=8, multiplier=2,
+                                                      task_timeout=20)), \
+                mock.patch('gif_creator.async_providers.get_async_client', return_value=fake_async_client), \
+                mock.patch('gif_creator.async_providers.asyncio.sleep', fake_sleep):
+            with self.assertRaises(RunwayTaskTimeout):
+                async_to_sync(AsyncRunwayVideoGenerator()._wait)('task-1')
+
+        self.assertEqual(async_client.calls, sync_calls)
+
+
+@override_settings(VIDEO_DOWNLOAD_MAX_BYTES=1000, VIDEO_DOWNLOAD_TIMEOUT=10, VIDEO_DOWNLOAD_READ_TIMEOUT=7)
+class VideoDownloadTests(TestCase):
+    """download do vídeo do Runway (síncrono e assíncrono): limite de tamanho, prazo total e timeout de leitura."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'video.mp4')
+        self.clock = FakeClock()
+        patcher = mock.patch('gif_creator.providers.time.monotonic', self.clock.monotonic)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def chunks(self, count, size=300, seconds_each=0):
+        # Cada bloco "demora" seconds_each segundos no relógio falso.
+        for _ in range(count):
+            self.clock.sleep(seconds_each)
+            yield b'x' * size
+
+    def download(self, chunks, headers=None):
+        response = mock.MagicMock(headers=headers or {})
+        response.__enter__.return_value = response
+        response.iter_content.return_value = chunks
+        client = mock.Mock(timeout=(5, 30))
+        client.get.return_value = response
+        with mock.patch('gif_creator.providers.get_client', return_value=client):
+            RunwayVideoGenerator().download('https://runway.test/video.mp4', self.path)
+        return client
+
+    def adownload(self, chunks, headers=None):
+        requests_seen = []
+
+        async def body():
+            for chunk in chunks:
+                yield chunk
+
+        def handler(request):
+            requests_seen.append(request)
+            return httpx.Response(200, headers=headers, content=body())
+
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler), timeout=httpx.Timeout(30, connect=5)) as client:
+                with mock.patch('gif_creator.async_providers.get_async_client', return_value=client):
+                    await AsyncRunwayVideoGenerator().download('https://runway.test/video.mp4', self.path)
+
+        async_to_sync(run)()
+        return requests_seen
+
+    def test_streams_to_disk_with_read_timeout(self):
+        client = self.download(self.chunks(3))
+        self.assertEqual(os.path.getsize(self.path), 900)
+        client.get.assert_called_once_with('https://runway.test/video.mp4', stream=True, timeout=(5, 7))
+
+        requests_seen = self.adownload(self.chunks(3))
+        self.assertEqual(os.path.getsize(self.path), 900)
+        self.assertEqual(requests_seen[0].extensions['timeout'], {'connect': 5, 'read': 7, 'write': 7, 'pool': None})
+
+    def test_chunked_body_over_the_size_cap_is_aborted(self):
+        # Sem Content-Length (chunked): o limite é verificado enquanto os blocos chegam.
+        for download in [self.download, self.adownload]:
+            with self.subTest(download.__name__):
+                chunks = self.chunks(10)
+                with self.assertRaisesRegex(Exception, 'limite de 1000 bytes'):
+                    download(chunks)
+                self.assertLessEqual(os.path.getsize(self.path), 1000)
+                if download == self.download:  # o MockTransport do httpx lê o corpo todo antes
+                    self.assertEqual(len(list(chunks)), 6)  # parou no 4º bloco
+
+    def test_content_length_over_the_cap_is_rejected_before_reading(self):
+        for download in [self.download, self.adownload]:
+            with self.subTest(download.__name__):
+                with self.assertRaisesRegex(Exception, 'grande demais'):
+                    download(self.chunks(1), headers={'Content-Length': '5000'})
+
+    def test_overall_deadline(self):
+        # Cada bloco chega dentro do timeout de leitura, mas o download inteiro passa do prazo.
+        for download in [self.download, self.adownload]:
+            with self.subTest(download.__name__):
+                with self.assertRaisesRegex(Exception, 'Tempo esgotado'):
+                    download(self.chunks(3, size=10, seconds_each=4))
+
+
+class MediaStorageTests(TestCase):
+    """storage.py e serve_media: nomes pelo hash do conteúdo, ETag, 304, Range e X-Accel-Redirect."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        overrides = override_settings(MEDIA_ROOT=media_root)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.storage = get_storage()
+        self.content = b'GIF89a' + bytes(range(256)) * 4
+
+    def save(self, content):
+        tmp_path = os.path.join(settings.MEDIA_ROOT, 'novo.gif')
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        return self.storage.save(tmp_path, 'gif')
+
+    def test_save_shards_by_content_hash(self):
+        relpath = self.save(self.content)
+        digest = hashlib.sha256(self.content).hexdigest()
+
+        self.assertEqual(relpath, f'ai_gifs/{digest[:2]}/{digest[2:4]}/{digest}.gif')
+        self.assertTrue(self.storage.exists(relpath))
+        self.assertEqual(self.save(self.content), relpath)
+        self.assertFalse(os.path.exists(os.path.join(settings.MEDIA_ROOT, 'novo.gif')))
+        self.assertEqual(self.storage.url(relpath), f'/media/{relpath}')
+
+    def test_serves_with_strong_etag_and_immutable_cache(self):
+        relpath = self.save(self.content)
+        response = self.client.get(f'/media/{relpath}')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'image/gif')
+        self.assertEqual(response['ETag'], f'"{content_hash(relpath)}"')
+        self.assertIn('immutable', response['Cache-Control'])
+
+        response = self.client.get(f'/media/{relpath}', headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    def test_range_requests(self):
+        relpath = self.save(self.content)
+        size = len(self.content)
+
+        response = self.client.get(f'/media/{relpath}', headers={'Range': 'bytes=6-9'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 6-9/{size}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[6:10])
+
+        response = self.client.get(f'/media/{relpath}', headers={'Range': 'bytes=-4'})
+        self.assertEqual(b''.join(response.streaming_content), self.content[-4:])
+
+        response = self.client.get(f'/media/{relpath}', headers={'Range': f'bytes={size}-'})
+        self.assertEqual(response.status_code, 416)
+
+        # If-Range com outra versão: arquivo inteiro
+        response = self.client.get(f'/media/{relpath}', headers={'Range': 'bytes=6-9', 'If-Range': '"outro"'})
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(MEDIA_SERVE_MODE='x-accel-redirect', MEDIA_ACCEL_PREFIX='/protected-media/')
+    def test_x_accel_redirect_delegates_bytes_to_nginx(self):
+        relpath = self.save(self.content)
+        response = self.client.get(f'/media/{relpath}')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{relpath}')
+        self.assertEqual(response['ETag'], f'"{content_hash(relpath)}"')
+
+    def test_only_final_renditions_are_served(self):
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, 'artifacts'))
+        with open(os.path.join(settings.MEDIA_ROOT, 'artifacts', 'video.mp4'), 'wb') as f:
+            f.write(b'x')
+        self.assertEqual(self.client.get('/media/artifacts/video.mp4').status_code, 404)
+        self.assertEqual(self.client.get('/media/ai_gifs/../artifacts/video.mp4').status_code, 404)
+        self.assertEqual(self.client.get('/media/ai_gifs/00/00/nada.gif').status_code, 404)
+
+
+class SingleFlightTests(TestCase):
+    """Pedidos idênticos simultâneos esperam por uma única execução e recebem o mesmo desfecho."""
+
+    def run_concurrently(self, flight, fn, callers=5):
+        outcomes = []
+        outcomes_lock = threading.Lock()
+
+        def call():
+            try:
+                outcome = ('ok', flight.run('chave', fn))
+            except Exception as e:
+                outcome = ('erro', e)
+            with outcomes_lock:
+                outcomes.append(outcome)
+
+        threads = [threading.Thread(target=call) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=10)
+            self.assertFalse(thread.is_alive())
+        return outcomes
+
+    def test_identical_calls_share_one_execution(self):
+        flight = artifacts.SingleFlight()
+        calls = []
+
+        def fn():
+            calls.append(1)
+            time.sleep(0.2)  # os outros chegam enquanto a chave está em andamento
+            return object()
+
+        outcomes = self.run_concurrently(flight, fn)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len({id(result) for _, result in outcomes}), 1)
+        self.assertEqual(flight._in_flight, {})
+        # Depois de terminar, a mesma chave executa de novo.
+        flight.run('chave', fn)
+        self.assertEqual(len(calls), 2)
+
+    def test_error_reaches_every_waiter(self):
+        flight = artifacts.SingleFlight()
+        error = ValueError("falha simulada")
+
+        def fn():
+            time.sleep(0.2)
+            raise error
+
+        outcomes = self.run_concurrently(flight, fn)
+        self.assertEqual(outcomes, [('erro', error)] * 5)
+        self.assertEqual(flight._in_flight, {})
+
+    def test_async_identical_calls_share_one_execution(self):
+        flight = artifacts.AsyncSingleFlight()
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return object()
+
+        async def main():
+            return await asyncio.gather(*(flight.run('chave', fn) for _ in range(5)))
+
+        results = asyncio.run(main())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len({id(result) for result in results}), 1)
+        self.assertEqual(flight._in_flight, {})
+
+    def test_async_error_reaches_every_waiter_and_cancelled_waiter_does_not_cancel_leader(self):
+        flight = artifacts.AsyncSingleFlight()
+        error = ValueError("falha simulada")
+
+        async def fn():
+            await asyncio.sleep(0.05)
+            raise error
+
+        async def main():
+            leader = asyncio.ensure_future(flight.run('chave', fn))
+            await asyncio.sleep(0)
+            impatient = asyncio.ensure_future(flight.run('chave', fn))
+            waiter = asyncio.ensure_future(flight.run('chave', fn))
+            await asyncio.sleep(0)
+            impatient.cancel()
+            return await asyncio.gather(leader, impatient, waiter, return_exceptions=True)
+
+        leader, impatient, waiter = asyncio.run(main())
+        self.assertIs(leader, error)
+        self.assertIsInstance(impatient, asyncio.CancelledError)
+        self.assertIs(waiter, error)
+        self.assertEqual(flight._in_flight, {})
+
+
+class ArtifactEvictionTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def write(self, name, size, age):
+        relpath = os.path.join(artifacts.ARTIFACTS_DIR, name)
+        artifacts.write_atomic(relpath, b'x' * size)
+        used_at = time.time() - age
+        os.utime(artifacts.absolute_path(relpath), (used_at, used_at))
+        return relpath
+
+    def test_write_atomic_leaves_no_temporary_file(self):
+        relpath = self.write('a.jpg', 10, age=0)
+        self.assertEqual(os.listdir(os.path.dirname(artifacts.absolute_path(relpath))), ['a.jpg'])
+
+    def test_evicts_expired_then_least_recently_used(self):
+        expired = self.write('expirado.mp4', 100, age=3600)
+        old = self.write('antigo.mp4', 100, age=60)
+        recent = self.write('recente.jpg', 100, age=30)
+        fresh = self.write('novo.mp4', 100, age=0)
+        # Um acerto de cache conta como uso: o antigo passa a ser o mais recente.
+        self.assertTrue(artifacts.exists(old))
+
+        self.assertEqual(artifacts.evict(ttl=600, max_bytes=250), (2, 200))
+        self.assertEqual([artifacts.exists(p) for p in (expired, old, recent, fresh)], [False, True, False, True])
+
+        out = StringIO()
+        call_command('evict_artifacts', max_bytes=0, stdout=out)
+        self.assertIn('2 artefato(s)', out.getvalue())
+        self.assertEqual(artifacts.evict(), (0, 0))
+
+
+class ScratchSpaceTests(TestCase):
+    """scratch.py: remoção garantida, memfd, orçamento com espera e sweep de órfãos."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.scratch = ScratchSpace(self.directory, budget_bytes=100, memory_max_bytes=50, wait_timeout=5)
+
+    def test_file_is_removed_even_on_error(self):
+        with self.assertRaises(RuntimeError):
+            with self.scratch.file('.mp4', nbytes=80) as tmp:
+                with open(tmp.path, 'wb') as f:
+                    f.write(b'x' * 10)
+                self.assertEqual(self.scratch.usage()['used_bytes'], 10)
+                self.assertEqual(self.scratch.usage()['disk_bytes'], 10)
+                raise RuntimeError
+        self.assertEqual(os.listdir(self.directory), [])
+        self.assertEqual(self.scratch.usage()['reserved_bytes'], 0)
+
+    @skipUnless(hasattr(os, 'memfd_create'), "memfd só existe no Linux")
+    def test_small_reservation_uses_memory_file(self):
+        dest = os.path.join(self.directory, 'saida', 'video.mp4')
+        with self.scratch.file('.mp4', nbytes=20, in_memory=True) as tmp:
+            self.assertTrue(tmp.in_memory)
+            with open(tmp.path, 'wb') as f:
+                f.write(b'conteudo')
+            self.assertEqual(self.scratch.usage()['used_bytes'], 8)
+            self.assertEqual(self.scratch.usage()['disk_bytes'], 0)
+            tmp.persist(dest)
+        with open(dest, 'rb') as f:
+            self.assertEqual(f.read(), b'conteudo')
+        self.assertEqual(os.listdir(self.directory), ['saida'])
+
+    def test_waits_for_budget(self):
+        order = []
+        with self.scratch.file(nbytes=80):
+            def second_job():
+                with self.scratch.file(nbytes=80):
+                    order.append('segundo')
+
+            thread = threading.Thread(target=second_job)
+            thread.start()
+            for _ in range(100):
+                if self.scratch.usage()['waiting']:
+                    break
+                threading.Event().wait(0.01)
+            self.assertEqual(self.scratch.usage()['waiting'], 1)
+            order.append('primeiro')
+        thread.join(5)
+        self.assertEqual(order, ['primeiro', 'segundo'])
+
+    def test_wait_timeout(self):
+        self.scratch.wait_timeout = 0.05
+        with self.scratch.file(nbytes=80):
+            with self.assertRaises(ScratchSpaceTimeout):
+                with self.scratch.file(nbytes=80):
+                    pass
+
+    def test_async_wait_timeout(self):
+        self.scratch.wait_timeout = 0.05
+
+        async def reserve_twice():
+            async with self.scratch.afile(nbytes=80):
+                async with self.scratch.afile(nbytes=80):
+                    pass
+
+        with self.assertRaises(ScratchSpaceTimeout):
+            async_to_sync(reserve_twice)()
+        self.assertEqual(self.scratch.usage(), {'reserved_bytes': 0, 'used_bytes': 0, 'disk_bytes': 0,
+                                                'budget_bytes': 100, 'waiting': 0, 'files': 0})
+
+    def test_async_wait_is_woken_by_release_from_another_thread(self):
+        held = self.scratch.reserve(80)
+        held.__enter__()
+        threading.Timer(0.05, held.__exit__, (None, None, None)).start()
+
+        async def reserve():
+            started = time.monotonic()
+            async with self.scratch.areserve(80):
+                return time.monotonic() - started
+
+        self.assertLess(async_to_sync(reserve)(), 1)  # acordada pela liberação, antes do wait_timeout
+        self.assertEqual(self.scratch.usage()['reserved_bytes'], 0)
+        self.assertEqual(self.scratch._async_waiters, set())
+
+    def test_sweep_removes_files_of_dead_processes(self):
+        dead_pid = 2 ** 22 + 1  # acima do pid_max padrão
+        for name in [f'{FILE_PREFIX}{dead_pid}-abc.mp4', f'{FILE_PREFIX}{os.getpid()}-abc.mp4', 'outro.txt']:
+            open(os.path.join(self.directory, name), 'wb').close()
+
+        self.assertEqual(self.scratch.sweep(), 1)
+        self.assertEqual(sorted(os.listdir(self.directory)), sorted([f'{FILE_PREFIX}{os.getpid()}-abc.mp4', 'outro.txt']))
+
+
+class FakeProviderServer(ThreadingHTTPServer):
+    """
+    Servidor HTTP local (keep-alive) para exercitar o ProviderClient de verdade, com o
+    HTTPAdapter e o Retry do urllib3. `/erro` responde 503 nas primeiras `failures` chamadas
+    e `/lento` demora `delay` segundos; `calls` conta as requisições por (método, caminho).
+    """
+    daemon_threads = True
+
+    def __init__(self, failures=0, delay=0.5):
+        self.failures = failures
+        self.delay = delay
+        self.calls = {}
+        super().__init__(('127.0.0.1', 0), _FakeProviderHandler)
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_port}'
+
+
+class _FakeProviderHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _respond(self):
+        server = self.server
+        key = (self.command, self.path)
+        server.calls[key] = server.calls.get(key, 0) + 1
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        status = 200
+        if self.path == '/erro' and server.calls[key] <= server.failures:
+            status = 503
+        elif self.path == '/lento':
+            time.sleep(server.delay)
+        self.send_response(status)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    do_GET = do_POST = _respond
+
+
+class ProviderClientTests(TestCase):
+    """Gif_generator_project/http_clients.py: retentativas só em métodos idempotentes, timeouts, pool e contadores."""
+
+    def setUp(self):
+        self.server = FakeProviderServer(failures=1)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def make_client(self, **options):
+        options = {'connect_timeout': 1, 'read_timeout': 2, 'max_retries': 2, 'backoff_factor': 0,
+                   'pool_maxsize': 2, **options}
+        client = http_clients.ProviderClient('teste', **options)
+        self.addCleanup(client.session.close)
+        return client
+
+    def upstream_errors(self):
+        return UPSTREAM_ERRORS._values.get(('teste',), 0)
+
+    def test_get_is_retried_and_post_is_not(self):
+        client = self.make_client()
+        errors = self.upstream_errors()
+
+        self.assertEqual(client.get(f'{self.server.url}/erro').status_code, 200)
+        self.assertEqual(self.server.calls[('GET', '/erro')], 2)
+
+        # Um POST repetido poderia duplicar uma cobrança ou uma tarefa no provedor.
+        self.assertEqual(client.post(f'{self.server.url}/erro', data=b'{}').status_code, 503)
+        self.assertEqual(self.server.calls[('POST', '/erro')], 1)
+        self.assertEqual(self.upstream_errors(), errors + 1)
+
+    def test_default_read_timeout_is_applied_and_can_be_overridden(self):
+        client = self.make_client(read_timeout=0.1, max_retries=1)
+        errors = self.upstream_errors()
+
+        # Com o Retry do urllib3, o timeout de leitura chega como ConnectionError (max retries).
+        with self.assertRaisesRegex(requests.ConnectionError, 'Read timed out'):
+            client.get(f'{self.server.url}/lento')
+        self.assertEqual(self.server.calls[('GET', '/lento')], 2)  # GET idempotente: uma retentativa
+        self.assertEqual(self.upstream_errors(), errors + 1)
+        self.assertEqual(client.get(f'{self.server.url}/lento', timeout=5).status_code, 200)
+
+    def test_connections_are_reused_and_counted(self):
+        client = self.make_client()
+        for _ in range(5):
+            client.get(f'{self.server.url}/ok')
+
+        self.assertEqual(client.stats(), {'requests': 5, 'connections_opened': 1, 'connections_reused': 4})
+
+    def test_one_client_per_provider(self):
+        self.addCleanup(http_clients._clients.clear)
+        http_clients._clients.clear()
+
+        runway = http_clients.get_client('runway')
+        self.assertIs(http_clients.get_client('runway'), runway)
+        self.assertIsNot(http_clients.get_client('clipdrop'), runway)
+        self.assertEqual(set(http_clients.get_all_stats()), {'runway', 'clipdrop'})
+
+
+@override_settings(GIF_ENCODE_PROCESSES=0)
+class RenditionsTests(TestCase):
+    """renditions.render_all: uma decodificação para todas as larguras e formatos."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        overrides = override_settings(MEDIA_ROOT=media_root)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        reset_encode_pool()
+        self.addCleanup(reset_encode_pool)
+        self.video_path = benchmarks.video_fixture(media_root, 64, 1)
+
+    def render(self, specs, **overrides):
+        clips, video_file_clip = [], renditions.VideoFileClip
+
+        def open_clip(path):
+            clip = video_file_clip(path)
+            clip.iter_frames = mock.Mock(wraps=clip.iter_frames)
+            clips.append(clip)
+            return clip
+
+        with override_settings(**overrides), \
+                mock.patch('gif_creator.renditions.VideoFileClip', side_effect=open_clip):
+            outputs = renditions.render_all(self.video_path, specs=specs, fps=4)
+        return outputs, clips
+
+    def test_one_decode_pass_for_every_width_and_format(self):
+        specs = [{'name': 'gif_64', 'format': 'gif', 'width': 64}, {'name': 'gif_32', 'format': 'gif', 'width': 32},
+                 {'name': 'webp_32', 'format': 'webp', 'width': 32}, {'name': 'mp4_32', 'format': 'mp4', 'width': 32}]
+        outputs, clips = self.render(specs)
+
+        self.assertEqual(len(clips), 1)
+        self.assertEqual(clips[0].iter_frames.call_count, 1)
+        self.assertEqual([(o['name'], o['format'], o['width'], o['height']) for o in outputs],
+                         [('gif_64', 'gif', 64, 64), ('gif_32', 'gif', 32, 32),
+                          ('webp_32', 'webp', 32, 32), ('mp4_32', 'mp4', 32, 32)])
+        storage = get_storage()
+        for output in outputs:
+            self.assertTrue(storage.exists(output['path']), output['name'])
+            self.assertEqual(os.path.getsize(os.path.join(settings.MEDIA_ROOT, output['path'])), output['bytes'])
+        with Image.open(os.path.join(settings.MEDIA_ROOT, outputs[2]['path'])) as webp:
+            self.assertEqual((webp.format, webp.n_frames), ('WEBP', 4))
+
+    def test_frames_are_capped(self):
+        specs = [{'name': 'gif_32', 'format': 'gif', 'width': 32}]
+        outputs, _ = self.render(specs, GIF_RENDITION_MAX_FRAMES=2)
+        with Image.open(os.path.join(settings.MEDIA_ROOT, outputs[0]['path'])) as gif:
+            self.assertEqual(gif.n_frames, 2)
+
+
+class MetricsEndpointTests(TestCase):
+    """/metrics: negado por padrão, liberado por token ou por endereço em METRICS_ALLOWED_IPS."""
+
+    def get(self, remote_addr='127.0.0.1', **headers):
+        return self.client.get('/metrics', REMOTE_ADDR=remote_addr, headers=headers)
+
+    @override_settings(METRICS_TOKEN=None, METRICS_ALLOWED_IPS=[])
+    def test_denied_by_default(self):
+        self.assertEqual(self.get().status_code, 403)
+
+    @override_settings(METRICS_TOKEN='segredo', METRICS_ALLOWED_IPS=[])
+    def test_token(self):
+        self.assertEqual(self.get(Authorization='Bearer errado').status_code, 403)
+        response = self.get(Authorization='Bearer segredo')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'# TYPE upstream_errors_total counter', response.content)
+
+    @override_settings(METRICS_TOKEN='segredo', METRICS_ALLOWED_IPS=['10.0.0.0/8', '::1'])
+    def test_allowed_networks(self):
+        self.assertEqual(self.get('10.1.2.3').status_code, 200)
+        self.assertEqual(self.get('::1').status_code, 200)
+        self.assertEqual(self.get('203.0.113.7').status_code, 403)
+
+
+class EncodePoolTests(TestCase):
+    """encode_pool.py: trabalho em outro processo, com fila limitada e espera por vaga."""
+
+    def test_runs_in_another_process(self):
+        pool = EncodePool(processes=1)
+        self.addCleanup(pool.shutdown)
+        self.assertNotEqual(pool.run(os.getpid), os.getpid())
+        self.assertEqual(pool.in_pool(), 0)
+
+    def test_inline_when_disabled(self):
+        self.assertEqual(EncodePool(processes=0).run(os.getpid), os.getpid())
+
+    def test_renditions_from_forked_process(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        video_path = benchmarks.video_fixture(media_root, 64, 1)
+        specs = [{'name': 'gif_64', 'format': 'gif', 'width': 64}]
+
+        with override_settings(MEDIA_ROOT=media_root, GIF_ENCODE_PROCESSES=1):
+            reset_encode_pool()
+            self.addCleanup(reset_encode_pool)
+            # O pool já existe no processo pai quando o fork acontece.
+            self.assertEqual(len(renditions.render_all(video_path, specs=specs, fps=4)), 1)
+            parent_pool = get_encode_pool()
+
+            context = multiprocessing.get_context('fork')
+            queue = context.Queue()
+
+            def child():
+                outputs = renditions.render_all(video_path, specs=specs, fps=4)
+                queue.put((len(outputs), get_encode_pool() is not parent_pool))
+
+            process = context.Process(target=child)
+            process.start()
+            self.assertEqual(queue.get(timeout=60), (1, True))
+            process.join(30)
+            self.assertEqual(process.exitcode, 0)
+
+    def test_backpressure_when_queue_is_full(self):
+        pool = EncodePool(processes=0, queue_limit=0, wait_timeout=0.05)
+        started, release = threading.Event(), threading.Event()
+
+        def busy():
+            started.set()
+            release.wait(5)
+
+        thread = threading.Thread(target=pool.run, args=(busy,))
+        thread.start()
+        started.wait(5)
+        try:
+            self.assertEqual(pool.in_pool(), 1)
+            with self.assertRaises(EncodeQueueFull):
+                pool.run(time.time)
+        finally:
+            release.set()
+            thread.join(5)
+        self.assertIsInstance(pool.run(time.time), float)
+
+
+class BenchPipelineTests(TestCase):
+    """bench_pipeline: todos os casos terminam; filho que morre ou trava vira erro, sem travar o comando."""
+
+    def test_smoke_all_cases(self):
+        fixtures_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, fixtures_dir, ignore_errors=True)
+        out = StringIO()
+        call_command('bench_pipeline', '--resolutions', '64', '--fps', '4', '--durations', '1',
+                     '--cases', ','.join(benchmarks.CASES), '--fixtures-dir', fixtures_dir, '--timeout', '120',
+                     stdout=out, stderr=StringIO())
+        results = json.loads(out.getvalue())['results']
+        self.assertEqual(len(results), len(benchmarks.CASES))
+        for name, result in results.items():
+            self.assertNotIn('error', result, name)
+            self.assertGreater(result['wall_seconds'], 0, name)
+
+    def test_dead_or_hung_child_is_reported(self):
+        with mock.patch.dict(benchmarks.CASES, {'crash': lambda: os._exit(3), 'hang': lambda: time.sleep(60)}):
+            self.assertIn('exitcode 3', benchmarks.run_case('crash')['error'])
+            self.assertIn('Tempo esgotado', benchmarks.run_case('hang', timeout=1)['error'])
 
-# Create your tests here.
@@ -0,0 +1,181 @@
+# gif_creator/text_overlay.py
+"""
+Renderização do texto sobreposto à imagem base.
+
+- As fontes carregadas ficam em cache por (arquivo, tamanho) para o processo todo.
+- As larguras de palavras medidas também ficam em cache, então a busca pelo maior
+  tamanho de fonte que cabe na imagem quase não volta ao FreeType.
+- O texto quebra em várias linhas quando necessário, e é rasterizado uma única vez:
+  o contorno sai da mesma máscara dilatada com NumPy, em vez de redesenhar o texto
+  deslocado 4 vezes (ou usar o stroke do Pillow, que é ainda mais lento).
+"""
+import os
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+from PIL import Image, ImageDraw, ImageFont
+
+TEXT_COLOR = 'white'
+OUTLINE_COLOR = '#404040'
+MAX_LINES = 3
+LINE_SPACING = 0.15  # fração do tamanho da fonte
+MAX_WIDTH_RATIO = 0.9  # largura máxima do bloco de texto em relação à imagem
+MAX_HEIGHT_RATIO = 0.35  # altura máxima do bloco de texto em relação à imagem
+ELLIPSIS = '…'
+
+
+def default_font_path():
+    return os.path.join(settings.BASE_DIR, 'static', 'fonts', 'fonte.ttf')
+
+
+@lru_cache(maxsize=64)
+def get_font(size, font_path=None):
+    """Fonte TrueType no tamanho pedido, carregada uma única vez por processo."""
+    try:
+        return ImageFont.truetype(font_path or default_font_path(), size)
+    except IOError:
+        return ImageFont.load_default(size)
+
+
+@lru_cache(maxsize=4096)
+def text_width(text, size, font_path=None):
+    return get_font(size, font_path).getlength(text)
+
+
+@lru_cache(maxsize=256)
+def _line_metrics(size, font_path=None):
+    """Altura de uma linha (ascent + descent) para o tamanho de fonte."""
+    ascent, descent = get_font(size, font_path).getmetrics()
+    return ascent + descent
+
+
+def _break_word(word, size, max_width, font_path=None):
+    """Divide uma palavra mais larga que `max_width` em pedaços que cabem (ao menos um caractere cada)."""
+    pieces, current = [], ''
+    for char in word:
+        if current and text_width(current + char, size, font_path) > max_width:
+            pieces.append(current)
+            current = ''
+        current += char
+    return pieces + [current]
+
+
+def wrap_text(text, size, max_width, font_path=None, break_long_words=False):
+    """
+    Quebra `text` em linhas que cabem em `max_width`, usando larguras de palavras em cache.
+    Uma palavra sozinha mais larga que `max_width` fica inteira numa linha, a não ser
+    com `break_long_words`, que a divide entre linhas.
+    """
+    words = text.split()
+    if break_long_words:
+        words = [piece for word in words
+                 for piece in (_break_word(word, size, max_width, font_path)
+                               if text_width(word, size, font_path) > max_width else [word])]
+    space = text_width(' ', size, font_path)
+    lines, current, current_width = [], [], 0.0
+    for word in words:
+        word_width = text_width(word, size, font_path)
+        candidate_width = word_width if not current else current_width + space + word_width
+        if current and candidate_width > max_width:
+            lines.append(' '.join(current))
+            current, current_width = [word], word_width
+        else:
+            current.append(word)
+            current_width = candidate_width
+    if current:
+        lines.append(' '.join(current))
+    return lines
+
+
+def _truncate(line, size, max_width, font_path=None):
+    """`line` encurtada e terminada em reticências, cabendo em `max_width`."""
+    while line and text_width(line + ELLIPSIS, size, font_path) > max_width:
+        line = line[:-1]
+    return line.rstrip() + ELLIPSIS
+
+
+def _clamp_lines(text, size, max_width, font_path=None):
+    """
+    Linhas de `text` no tamanho `size` que certamente cabem: palavras longas demais são
+    divididas e, além de MAX_LINES linhas, o texto é cortado com reticências.
+    """
+    lines = wrap_text(text, size, max_width, font_path, break_long_words=True)
+    if len(lines) > MAX_LINES:
+        lines = lines[:MAX_LINES - 1] + [_truncate(lines[MAX_LINES - 1], size, max_width, font_path)]
+    return lines
+
+
+def fit_text(text, image_width, image_height, font_path=None):
+    """
+    Procura (busca binária) o maior tamanho de fonte em que o texto cabe na imagem. Se
+    não couber nem no menor tamanho, as palavras longas são divididas e o excesso cortado
+    com reticências (ver _clamp_lines).
+
+    Returns:
+        tuple: (tamanho da fonte, lista de linhas)
+    """
+    max_width = image_width * MAX_WIDTH_RATIO
+    max_height = image_height * MAX_HEIGHT_RATIO
+    low, high = max(8, image_width // 40), max(8, image_width // 12)
+
+    def fits(size):
+        lines = wrap_text(text, size, max_width, font_path)
+        line_height = _line_metrics(size, font_path)
+        block_height = len(lines) * line_height + (len(lines) - 1) * size * LINE_SPACING
+        widest = max(text_width(line, size, font_path) for line in lines)
+        return len(lines) <= MAX_LINES and widest <= max_width and block_height <= max_height, lines
+
+    best = (low, _clamp_lines(text, low, max_width, font_path))
+    while low <= high:
+        middle = (low + high) // 2
+        ok, lines = fits(middle)
+        if ok:
+            best = (middle, lines)
+            low = middle + 1
+        else:
+            high = middle - 1
+    return best
+
+
+def _dilate(mask, radius):
+    """Dilatação (máximo em uma janela quadrada) separável com NumPy, usada para gerar o contorno."""
+    padded = np.pad(mask, radius)
+    rows, cols = mask.shape
+    horizontal = padded[:, :cols].copy()
+    for offset in range(1, 2 * radius + 1):
+        np.maximum(horizontal, padded[:, offset:offset + cols], out=horizontal)
+    result = horizontal[:rows].copy()
+    for offset in range(1, 2 * radius + 1):
+        np.maximum(result, horizontal[offset:offset + rows], out=result)
+    return result
+
+
+def draw_overlay(image, text, font_path=None):
+    """Desenha `text` centralizado na parte de baixo de `image` (modificada no lugar)."""
+    text = text.strip()
+    if not text:
+        return image
+
+    size, lines = fit_text(text, image.width, image.height, font_path)
+    font = get_font(size, font_path)
+    outline = max(2, size // 30)
+    line_height = _line_metrics(size, font_path)
+    spacing = size * LINE_SPACING
+    block_width = int(max(text_width(line, size, font_path) for line in lines)) + 2 * outline
+    block_height = int(len(lines) * line_height + (len(lines) - 1) * spacing) + 2 * outline
+
+    # O texto é rasterizado uma única vez numa máscara; o contorno é a mesma máscara dilatada.
+    mask = Image.new('L', (block_width, block_height))
+    draw = ImageDraw.Draw(mask)
+    y = outline
+    for line in lines:
+        x = (block_width - text_width(line, size, font_path)) / 2
+        draw.text((x, y), line, font=font, fill=255)
+        y += line_height + spacing
+    outline_mask = Image.fromarray(_dilate(np.asarray(mask), outline))
+
+    position = (int((image.width - block_width) / 2), int((image.height - block_height) * 0.85))
+    image.paste(OUTLINE_COLOR, position, outline_mask)
+    image.paste(TEXT_COLOR, position, mask)
+    return image
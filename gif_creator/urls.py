@@ -1,9 +1,14 @@
 from django.urls import path
 # gif_creator/urls.py
-from .views import GenerateImageView, GifHistoryView # Importe a nova view
+from .views import GenerateImageView, GifHistoryView, GenerationJobStatusView, generate_image_async, job_events
 
 urlpatterns = [
     # ...
     path('generate-image/', GenerateImageView.as_view(), name='generate-image'),
+    # Mesmo contrato, com o job rodando no event loop quando servido por ASGI
+    path('generate-image-async/', generate_image_async, name='generate-image-async'),
+    path('jobs/<uuid:job_id>/', GenerationJobStatusView.as_view(), name='generation-job-status'),
+    # Andamento do job por server-sent events, numa única conexão
+    path('jobs/<uuid:job_id>/events/', job_events, name='generation-job-events'),
     path('history/', GifHistoryView.as_view(), name='gif-history'), #
-]
\ No newline at end of file
+]
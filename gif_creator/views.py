@@ -1,72 +1,400 @@
-import traceback
+import json
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
 
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.conf import settings
+from django.db import transaction
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse,
+)
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST, require_safe
 from rest_framework import views, status, generics
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
+from . import progress
 from .permissions import IsSubscribedUser
-from .serializers import GeneratedGifSerializer # Importe o novo serializer
-from .models import GeneratedGif # Importe o modelo
-from .services import AnimationService # Importe a nova classe
-from subscriptions.models import Subscription
+from .serializers import GenerationJobSerializer, GifHistorySerializer
+from .storage import GIFS_DIR, content_hash, get_storage
+from .models import GeneratedGif, GenerationJob
+from .async_jobs import submit_generation_job_async
+from .jobs import submit_generation_job, JobQueueFull
+from subscriptions.context import get_active_subscription, get_user_subscription
+from subscriptions.quota import QuotaExceeded, release_gif_slot, reserve_gif_slot
+from users.authentication import CachedTokenAuthentication
+
+
+OVERLAY_TEXT_MAX_LENGTH = GenerationJob._meta.get_field('overlay_text').max_length
+
+
+def _validate_request(prompt, overlay_text):
+    """Mensagem de erro (400) para um pedido inválido, ou None."""
+    if not prompt or not isinstance(prompt, str):
+        return 'A descrição da imagem é obrigatória.'
+    if not isinstance(overlay_text, str):
+        return 'O texto sobreposto deve ser uma string.'
+    if len(overlay_text) > OVERLAY_TEXT_MAX_LENGTH:
+        return f'O texto sobreposto deve ter no máximo {OVERLAY_TEXT_MAX_LENGTH} caracteres.'
+    return None
+
+
+def _create_job(user, subscription, prompt, overlay_text):
+    """
+    Reserva a vaga na cota antes de qualquer chamada paga (devolvida se o job falhar) e cria o job.
+    As duas escritas vão na mesma transação: se a criação do job falhar, a reserva é desfeita.
+
+    Raises:
+        QuotaExceeded: se o limite do plano já foi atingido.
+    """
+    with transaction.atomic():
+        cycle = reserve_gif_slot(subscription)
+        return GenerationJob.objects.create(
+            user=user, prompt=prompt, overlay_text=overlay_text,
+            subscription=subscription, subscription_cycle=cycle,
+        )
+
+
+def _reject_job(job, subscription, error):
+    """O pool não aceitou o job: devolve a vaga e o marca como falho."""
+    release_gif_slot(subscription.pk, job.user_id, job.subscription_cycle)
+    job.status = 'failed'
+    job.error = str(error)
+    job.save(update_fields=['status', 'error'])
+
+
+def _accepted_body(request, job):
+    status_url = request.build_absolute_uri(reverse('generation-job-status', kwargs={'job_id': job.id}))
+    body = {'job_id': str(job.id), 'status': job.status, 'status_url': status_url}
+    # O stream de andamento só é anunciado sob ASGI (ver job_events); sem ele o cliente consulta status_url.
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        body['events_url'] = request.build_absolute_uri(reverse('generation-job-events', kwargs={'job_id': job.id}))
+    return body
+
+
+async def _authenticate_token(request):
+    """
+    Autenticação por token para as views assíncronas (fora do DRF).
+    Retorna (usuário, None) ou (None, resposta 401).
+    """
+    try:
+        credentials = await sync_to_async(CachedTokenAuthentication().authenticate)(request)
+    except AuthenticationFailed as e:
+        return None, JsonResponse({'detail': str(e.detail)}, status=status.HTTP_401_UNAUTHORIZED)
+    if credentials is None:
+        return None, JsonResponse({'detail': 'As credenciais de autenticação não foram fornecidas.'},
+                                  status=status.HTTP_401_UNAUTHORIZED)
+    return credentials[0], None
+
 
 class GenerateImageView(views.APIView):
+    """
+    Valida o pedido e enfileira a geração do GIF.
+    Responde 202 com o id do job; o andamento é consultado em GenerationJobStatusView.
+    """
     permission_classes = [IsSubscribedUser]
 
     def post(self, request, *args, **kwargs):
-        user = request.user
+        prompt = request.data.get('prompt')
+        overlay_text = request.data.get('text') or ''
 
-        try:
-            active_subscription = Subscription.objects.get(user=user, status='active')
-            if active_subscription.gif_count >= active_subscription.plan.gif_limit:
-                return Response(
-                    {'error': 'Você atingiu o limite mensal de geração de GIFs para o seu plano.'},
-                    status=status.HTTP_403_FORBIDDEN
-                )
-        except Subscription.DoesNotExist:
+        error = _validate_request(prompt, overlay_text)
+        if error:
+            return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+
+        # A assinatura já foi resolvida (e memorizada na requisição) pela permissão IsSubscribedUser.
+        subscription = get_active_subscription(request)
+        if subscription is None:
             return Response({'error': 'Nenhuma assinatura ativa encontrada.'}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            job = _create_job(request.user, subscription, prompt, overlay_text)
+        except QuotaExceeded as e:
+            return Response({'error': str(e)}, status=status.HTTP_403_FORBIDDEN)
 
-        prompt = request.data.get('prompt')
-        overlay_text = request.data.get('text')
+        try:
+            submit_generation_job(job)
+        except JobQueueFull as e:
+            _reject_job(job, subscription, e)
+            return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
-        if not prompt:
-            return Response({'error': 'A descrição da imagem é obrigatória.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(_accepted_body(request, job), status=status.HTTP_202_ACCEPTED)
+
+
+@csrf_exempt
+@require_POST
+async def generate_image_async(request):
+    """
+    Versão assíncrona de GenerateImageView, com o mesmo contrato (202 com job_id e status_url).
+
+    Sob ASGI o job vira uma tarefa no event loop do worker (async_jobs.py) e não ocupa
+    thread enquanto espera os provedores; sob WSGI cai no pool de threads de jobs.py.
+    Autentica só por token (cabeçalho 'Authorization: Token ...').
+    """
+    user, error_response = await _authenticate_token(request)
+    if error_response is not None:
+        return error_response
+
+    subscription = await sync_to_async(get_user_subscription)(user)
+    if subscription is None:
+        return JsonResponse({'detail': IsSubscribedUser.message}, status=status.HTTP_403_FORBIDDEN)
+
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'error': 'JSON inválido.'}, status=status.HTTP_400_BAD_REQUEST)
+    prompt = data.get('prompt')
+    overlay_text = data.get('text') or ''
+    error = _validate_request(prompt, overlay_text)
+    if error:
+        return JsonResponse({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        job = await sync_to_async(_create_job)(user, subscription, prompt, overlay_text)
+    except QuotaExceeded as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_403_FORBIDDEN)
+
+    try:
+        if isinstance(request, ASGIRequest):
+            submit_generation_job_async(job)
+        else:
+            submit_generation_job(job)
+    except JobQueueFull as e:
+        await sync_to_async(_reject_job)(job, subscription, e)
+        return JsonResponse({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    return JsonResponse(_accepted_body(request, job), status=status.HTTP_202_ACCEPTED)
+
+
+def _sse(event, data, event_id=None):
+    message = f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+    return f"id: {event_id}\n{message}" if event_id is not None else message
+
+
+_SSE_PING = ": ping\n\n"
 
-        try:
-            service = AnimationService(user=user, prompt=prompt, overlay_text=overlay_text)
-            gif_url = service.generate_animated_gif()
 
-            active_subscription.gif_count += 1
-            active_subscription.save()
+def _final_from_db(job):
+    """Evento final montado a partir do job gravado (job terminou antes ou em outro processo)."""
+    if job.status == 'failed':
+        return _sse(job.status, {'error': job.error})
+    return _sse(job.status, {'gif_id': job.gif_id})
 
-            full_gif_url = request.build_absolute_uri(gif_url)
-            return Response({'gif_url': full_gif_url}, status=status.HTTP_201_CREATED)
 
-        except Exception as e:
-            print("\n" + "!" * 60)
-            print("      OCORREU UMA EXCEÇÃO DURANTE A GERAÇÃO DO GIF")
-            print("!" * 60)
+async def _aonly(message):
+    yield message
 
-            # Imprime o tipo do erro e a mensagem
-            print(f"TIPO DE ERRO: {type(e).__name__}")
-            print(f"MENSAGEM: {e}")
 
-            # Imprime o traceback completo para sabermos a linha exata
-            print("\n--- TRACEBACK COMPLETO ---")
-            traceback.print_exc()
+async def _aevent_stream(job_id, after, heartbeat):
+    async for event in progress.aiter_events(job_id, after, heartbeat):
+        if event is None:
+            job = await GenerationJob.objects.only('status', 'error', 'gif_id').aget(pk=job_id)
+            if job.status in progress.FINAL_EVENTS:
+                yield _final_from_db(job)
+                return
+            yield _SSE_PING
+            continue
+        seq, name, data = event
+        yield _sse(name, data, seq)
 
-            print("!" * 60 + "\n")
-            # FIM DO DIAGNÓSTICO
 
-            # Retorna uma resposta 500 com a mensagem de erro para o frontend
-            return Response({'error': f"Erro interno no servidor: {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+@require_GET
+async def job_events(request, job_id):
+    """
+    Stream SSE (text/event-stream) com as etapas do job, numa única conexão.
+
+    Eventos: started, prompt_enhanced, base_image_ready, runway_queued, runway_progress,
+    downloaded, encoded, saved e, por fim, succeeded ou failed (a conexão termina aí).
+    Eventos já ocorridos são reenviados ao conectar; com o cabeçalho Last-Event-ID só os
+    posteriores. Custa uma autenticação e uma consulta ao job por conexão, não por evento.
+
+    Só existe sob ASGI, onde a conexão aberta não ocupa thread. Sob WSGI cada stream prenderia
+    uma thread do servidor durante o job inteiro, então a resposta é 406 com a URL de status
+    para consulta periódica (a resposta do POST de geração só traz `events_url` sob ASGI).
+    Autentica só por token, como generate_image_async.
+    """
+    user, error_response = await _authenticate_token(request)
+    if error_response is not None:
+        return error_response
+
+    job = await GenerationJob.objects.filter(pk=job_id, user=user).only('status', 'error', 'gif_id').afirst()
+    if job is None:
+        return JsonResponse({'detail': 'Não encontrado.'}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        after = int(request.headers.get('Last-Event-ID') or 0)
+    except ValueError:
+        after = 0
+
+    if not isinstance(request, ASGIRequest):
+        status_url = request.build_absolute_uri(reverse('generation-job-status', kwargs={'job_id': job_id}))
+        return JsonResponse({'detail': 'Stream de andamento indisponível neste servidor; consulte status_url.',
+                             'status_url': status_url}, status=status.HTTP_406_NOT_ACCEPTABLE)
+
+    if job.status in progress.FINAL_EVENTS and not progress.broker.events_after(job_id)[1]:
+        # Já terminou e os eventos não estão (mais) em memória: só o desfecho.
+        stream = _aonly(_final_from_db(job))
+    else:
+        stream = _aevent_stream(job_id, after, settings.PROGRESS_HEARTBEAT)
+
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx: repassa cada evento sem acumular
+    return response
+
+
+class GenerationJobStatusView(generics.RetrieveAPIView):
+    """
+    Retorna o status de um job de geração do usuário autenticado.
+    """
+    serializer_class = GenerationJobSerializer
+    lookup_url_kwarg = 'job_id'
+
+    def get_queryset(self):
+        return GenerationJob.objects.filter(user=self.request.user).select_related('gif')
+
+
+class GifHistoryPagination(CursorPagination):
+    """
+    Paginação por cursor (keyset) em (created_at, id), apoiada no índice (user, -created_at, -id).
+    O id desempata GIFs criados no mesmo instante, para que nenhum se repita ou fique de fora entre páginas.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
 
 
 class GifHistoryView(generics.ListAPIView):
     """
-    Retorna a lista de GIFs gerados pelo usuário autenticado.
+    Retorna, paginada por cursor, a lista de GIFs gerados pelo usuário autenticado.
     """
-    serializer_class = GeneratedGifSerializer
+    serializer_class = GifHistorySerializer
+    pagination_class = GifHistoryPagination
 
     def get_queryset(self):
         # Filtra os GIFs para retornar apenas os do usuário que fez a requisição
-        return GeneratedGif.objects.filter(user=self.request.user)
+        return GeneratedGif.objects.filter(user=self.request.user).only(*GifHistorySerializer.model_fields)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        # Esquema + host calculados uma vez por resposta, e não uma vez por GIF
+        context['base_url'] = self.request.build_absolute_uri('/').rstrip('/')
+        return context
+
+
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+_RANGE_CHUNK_SIZE = 64 * 1024
+
+
+def _etag_matches(request, etag):
+    header = request.headers.get('If-None-Match')
+    return bool(header) and (header.strip() == '*' or etag in [t.strip() for t in header.split(',')])
+
+
+def _byte_range(header, size):
+    """
+    (início, fim) inclusivos pedidos no cabeçalho Range, ou None para servir o arquivo inteiro
+    (cabeçalho ausente, vários intervalos ou outra unidade). ValueError se o intervalo não cabe no arquivo.
+    """
+    match = _RANGE.match(header or '')
+    if match is None or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if start == '':
+        # bytes=-N: os últimos N bytes
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(_RANGE_CHUNK_SIZE, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Serve as versões finais dos GIFs (ai_gifs/) com ETag forte, cache longo e Range.
+
+    Os arquivos gravados pelo storage têm o hash do conteúdo no nome: a URL nunca muda de
+    conteúdo, então vai com `Cache-Control: immutable` e o ETag é o próprio hash, e uma
+    revalidação (If-None-Match) é respondida com 304 sem tocar no disco. Com
+    MEDIA_SERVE_MODE 'x-accel-redirect' (nginx) ou 'x-sendfile' (Apache/lighttpd) a view só
+    monta os cabeçalhos e quem envia os bytes (e trata Range) é o servidor web; em 'django'
+    (desenvolvimento) o próprio Django envia o arquivo, inteiro ou um intervalo (206).
+    """
+    storage = get_storage()
+    relpath = posixpath.normpath(path)
+    if not relpath.startswith(f'{GIFS_DIR}/'):
+        raise Http404
+
+    digest = content_hash(relpath)
+    file_stat = None
+    if digest:
+        etag = f'"{digest}"'
+        cache_control = f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}, immutable'
+    else:
+        # Nomes antigos (<chave>_<versão>.gif): ETag pelo tamanho e data, sem immutable.
+        try:
+            file_stat = os.stat(storage.path(relpath))
+        except (FileNotFoundError, NotADirectoryError):
+            raise Http404
+        etag = f'"{file_stat.st_size:x}-{file_stat.st_mtime_ns:x}"'
+        cache_control = 'public, max-age=3600'
+
+    if _etag_matches(request, etag):
+        response = HttpResponseNotModified()
+    elif settings.MEDIA_SERVE_MODE == 'x-accel-redirect':
+        response = HttpResponse(content_type=mimetypes.guess_type(relpath)[0])
+        response['X-Accel-Redirect'] = f"{settings.MEDIA_ACCEL_PREFIX.rstrip('/')}/{quote(relpath)}"
+    elif settings.MEDIA_SERVE_MODE == 'x-sendfile':
+        response = HttpResponse(content_type=mimetypes.guess_type(relpath)[0])
+        response['X-Sendfile'] = storage.path(relpath)
+    else:
+        response = _serve_file(request, storage.path(relpath), relpath, etag, file_stat)
+
+    response['ETag'] = etag
+    response['Cache-Control'] = cache_control
+    return response
+
+
+def _serve_file(request, file_path, relpath, etag, file_stat=None):
+    try:
+        size = (file_stat or os.stat(file_path)).st_size
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404
+
+    # If-Range: o intervalo só vale se o cliente ainda tem a mesma versão do arquivo.
+    if_range = request.headers.get('If-Range')
+    try:
+        byte_range = _byte_range(request.headers.get('Range'), size) if if_range in (None, etag) else None
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
 
+    if byte_range is None:
+        response = FileResponse(open(file_path, 'rb'), content_type=mimetypes.guess_type(relpath)[0])
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(_read_range(file_path, start, end - start + 1), status=206,
+                                         content_type=mimetypes.guess_type(relpath)[0])
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    response['Accept-Ranges'] = 'bytes'
+    return response
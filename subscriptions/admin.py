@@ -7,7 +7,7 @@ e a manutenção dos dados de planos e assinaturas de usuários.
 """
 
 from django.contrib import admin
-from .models import Plan, Subscription
+from .models import Plan, Subscription, WebhookEvent
 
 @admin.register(Plan)
 class PlanAdmin(admin.ModelAdmin):
@@ -33,6 +33,8 @@ class SubscriptionAdmin(admin.ModelAdmin):
     # Define as colunas a serem exibidas na lista de assinaturas.
     # Adiciona 'gif_count' para uma visão rápida do uso atual do usuário.
     list_display = ('user', 'plan', 'status', 'gif_count', 'cancellation_requested', 'end_date')
+    # 'user' e 'plan' aparecem em cada linha (e no __str__): carrega tudo num único SELECT.
+    list_select_related = ('user', 'plan')
 
     # Adiciona filtros na barra lateral para encontrar assinaturas por status, plano ou
     # se o cancelamento foi solicitado.
@@ -42,3 +44,16 @@ class SubscriptionAdmin(admin.ModelAdmin):
     # O uso de '__' permite pesquisar em campos de modelos relacionados (ex: user__username).
     search_fields = ('user__username', 'plan__name', 'asaas_subscription_id')
 
+
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    """
+    Eventos recebidos do Asaas, para acompanhar a fila do processador e investigar falhas.
+    """
+    list_display = ('event_type', 'event_id', 'asaas_subscription_id', 'status', 'attempts', 'received_at',
+                    'processed_at')
+    list_filter = ('status', 'event_type')
+    search_fields = ('event_id', 'asaas_subscription_id')
+    readonly_fields = ('event_id', 'event_type', 'asaas_subscription_id', 'payload', 'attempts', 'received_at',
+                       'processed_at')
@@ -0,0 +1,66 @@
+# subscriptions/context.py
+"""
+Resolve a assinatura ativa (com o plano) do usuário uma única vez por requisição.
+
+A permissão IsSubscribedUser, a view de geração e as views de assinatura pedem a
+assinatura aqui em vez de cada uma fazer sua própria consulta:
+
+1. dentro da mesma requisição o resultado fica guardado no próprio `request`;
+2. entre requisições fica no cache do Django (CACHES), por SUBSCRIPTION_CONTEXT_TTL segundos;
+3. só em caso de miss vai ao banco, com um único SELECT (subscription + plan via select_related).
+
+Quem altera a assinatura (webhook do Asaas, cancelamento, reserva de cota) chama
+`invalidate_subscription_context(user_id)`. Como o objeto vem do cache, salve-o
+sempre com `update_fields`, para não sobrescrever campos com valores antigos.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Subscription
+
+CACHE_KEY = 'subscription-context:{user_id}'
+_NO_SUBSCRIPTION = 'none'  # marcador em cache: o usuário não tem assinatura ativa
+_REQUEST_ATTR = '_subscription_context'
+
+
+def _load(user_id):
+    return (
+        Subscription.objects.select_related('plan')
+        .filter(user_id=user_id, status='active')
+        .order_by('-created_at')
+        .first()
+    )
+
+
+def get_user_subscription(user):
+    """Assinatura ativa de `user` (com `plan` carregado), ou None. Usa o cache do Django."""
+    if user is None or not user.is_authenticated:
+        return None
+    key = CACHE_KEY.format(user_id=user.pk)
+    cached = cache.get(key)
+    if cached is not None:
+        return None if cached == _NO_SUBSCRIPTION else cached
+
+    subscription = _load(user.pk)
+    cache.set(key, subscription if subscription is not None else _NO_SUBSCRIPTION, settings.SUBSCRIPTION_CONTEXT_TTL)
+    return subscription
+
+
+def get_active_subscription(request):
+    """Como `get_user_subscription(request.user)`, mas resolvido no máximo uma vez por requisição."""
+    # O DRF repassa atributos desconhecidos para o HttpRequest, então o valor
+    # guardado aqui é visto tanto pela permissão quanto pela view.
+    http_request = getattr(request, '_request', request)
+    if not hasattr(http_request, _REQUEST_ATTR):
+        setattr(http_request, _REQUEST_ATTR, get_user_subscription(request.user))
+    return getattr(http_request, _REQUEST_ATTR)
+
+
+def invalidate_subscription_context(user_id):
+    """Descarta a assinatura em cache do usuário; a próxima requisição lê do banco."""
+    cache.delete(CACHE_KEY.format(user_id=user_id))
+
+
+def invalidate_subscription_contexts(user_ids):
+    """Como `invalidate_subscription_context`, para vários usuários de uma vez."""
+    cache.delete_many([CACHE_KEY.format(user_id=user_id) for user_id in user_ids])
@@ -0,0 +1,86 @@
+# subscriptions/management/commands/expire_subscriptions.py
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Case, Value, When
+from django.utils import timezone
+
+from subscriptions.context import invalidate_subscription_contexts
+from subscriptions.models import Subscription
+from users.authentication import token_cache
+
+
+def expire_chunk(now, chunk_size):
+    """
+    Expira até `chunk_size` assinaturas ativas vencidas e atualiza o flag dos usuários.
+
+    Returns:
+        tuple: (assinaturas expiradas, usuários que perderam o acesso)
+    """
+    User = get_user_model()
+    with transaction.atomic():
+        # Usa o índice (status, end_date)
+        rows = list(
+            Subscription.objects.filter(status='active', end_date__lt=now)
+            .order_by('end_date')
+            .values_list('pk', 'user_id')[:chunk_size]
+        )
+        if not rows:
+            return 0, 0
+        subscription_ids = [pk for pk, _ in rows]
+        user_ids = {user_id for _, user_id in rows}
+
+        # Um único UPDATE por lote: quem pediu cancelamento vira 'canceled', o resto 'inactive'.
+        expired = Subscription.objects.filter(pk__in=subscription_ids, status='active').update(
+            status=Case(When(cancellation_requested=True, then=Value('canceled')), default=Value('inactive')),
+            updated_at=now,
+        )
+        # O usuário só perde o acesso se não tiver outra assinatura ainda ativa.
+        still_active = Subscription.objects.filter(user_id__in=user_ids, status='active').values('user_id')
+        deactivated = (
+            User.objects.filter(pk__in=user_ids, has_active_subscription=True)
+            .exclude(pk__in=still_active)
+            .update(has_active_subscription=False)
+        )
+    invalidate_subscription_contexts(user_ids)
+    # O UPDATE em lote não dispara post_save: descarta aqui os usuários em cache com o flag antigo.
+    # Nos outros processos a entrada expira pelo TOKEN_AUTH_CACHE_TTL (ver users/authentication.py).
+    token_cache.discard_users(user_ids)
+    return expired, deactivated
+
+
+class Command(BaseCommand):
+    help = (
+        "Expira as assinaturas ativas com end_date vencido e desliga o has_active_subscription "
+        "dos usuários, com UPDATEs em lotes. Feito para rodar periodicamente (cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000, help="Assinaturas por lote/UPDATE.")
+        parser.add_argument('--dry-run', action='store_true', help="Só conta quantas seriam expiradas.")
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        if options['dry_run']:
+            count = Subscription.objects.filter(status='active', end_date__lt=now).count()
+            self.stdout.write(f"{count} assinatura(s) vencida(s) seriam expiradas.")
+            return
+
+        start = time.perf_counter()
+        total_expired = total_users = chunks = 0
+        while True:
+            expired, deactivated = expire_chunk(now, options['chunk_size'])
+            if not expired:
+                break
+            chunks += 1
+            total_expired += expired
+            total_users += deactivated
+
+        elapsed = time.perf_counter() - start
+        rate = total_expired / elapsed if elapsed else 0
+        self.stdout.write(
+            f"{total_expired} assinatura(s) expirada(s) e {total_users} usuário(s) sem acesso, "
+            f"em {chunks} lote(s) e {elapsed:.2f}s ({rate:.0f} assinaturas/s)."
+        )
@@ -0,0 +1,28 @@
+# subscriptions/management/commands/process_webhook_events.py
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from subscriptions.webhooks import process_all_pending
+
+
+class Command(BaseCommand):
+    help = "Aplica os eventos pendentes do webhook do Asaas (em lotes, por assinatura, em ordem de chegada)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help="Eventos por lote (padrão: ASAAS_WEBHOOK_BATCH_SIZE).")
+        parser.add_argument('--loop', action='store_true', help="Continua rodando, esvaziando a fila periodicamente.")
+        parser.add_argument('--interval', type=float, default=2.0, help="Intervalo entre varreduras com --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            start = time.perf_counter()
+            processed = process_all_pending(options['batch_size'])
+            if processed or not options['loop']:
+                elapsed = time.perf_counter() - start
+                self.stdout.write(f"{processed} evento(s) processado(s) em {elapsed:.3f}s")
+            if not options['loop']:
+                return
+            close_old_connections()
+            time.sleep(options['interval'])
@@ -56,6 +56,9 @@ class Subscription(models.Model):
         default=0,
         help_text="Número de GIFs gerados no ciclo de faturamento atual."
     )
+    # Incrementado a cada renovação (gif_count zerado): vagas reservadas num ciclo não são
+    # devolvidas em outro (ver subscriptions/quota.py)
+    cycle = models.PositiveIntegerField(default=0)
     cancellation_requested = models.BooleanField(default=False)
     start_date = models.DateTimeField(null=True, blank=True)
     end_date = models.DateTimeField(null=True, blank=True)
@@ -63,5 +66,48 @@ class Subscription(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Busca das assinaturas vencidas (comando expire_subscriptions)
+            models.Index(fields=['status', 'end_date'], name='subscription_expiry_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.plan.name} ({self.status})"
+
+
+class WebhookEvent(models.Model):
+    """
+    Evento recebido do Asaas, gravado antes de qualquer processamento.
+
+    A view do webhook só insere o evento (ignorando duplicatas pelo `event_id`) e
+    responde; o processamento acontece em segundo plano (ver webhooks.py).
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pendente'),
+        ('processed', 'Processado'),
+        ('ignored', 'Ignorado'),
+        ('failed', 'Falhou'),
+    ]
+
+    # Chave de deduplicação: reenvios do mesmo evento (e os dois avisos de um mesmo pagamento) colidem aqui
+    event_id = models.CharField(max_length=150, unique=True)
+    event_type = models.CharField(max_length=50)
+    asaas_subscription_id = models.CharField(max_length=100, null=True, blank=True, db_index=True)
+    payload = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    error = models.TextField(blank=True, default='')
+    # Falhas voltam para a fila (status 'pending') até ASAAS_WEBHOOK_MAX_ATTEMPTS, não antes de next_attempt_at
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Fila do processador: eventos pendentes em ordem de chegada
+            models.Index(fields=['status', 'id'], name='webhook_event_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} ({self.event_id}) - {self.status}"
@@ -0,0 +1,63 @@
+# subscriptions/quota.py
+"""
+Reserva de vagas na cota mensal de GIFs da assinatura.
+
+A vaga é reservada antes de qualquer chamada paga (Gemini/ClipDrop/Runway) com um
+único UPDATE condicional: `gif_count = gif_count + 1 WHERE id = ... AND gif_count < limite`.
+O banco avalia a condição e incrementa na mesma instrução, então pedidos simultâneos
+não conseguem passar do limite, e nada fica travado além da própria linha durante
+o UPDATE (sem SELECT ... FOR UPDATE nem transação longa). Se a geração falhar, a
+vaga é devolvida com `release_gif_slot`.
+
+A reserva informa o ciclo da assinatura (`Subscription.cycle`) em que entrou, guardado no
+job; a devolução só acontece se a assinatura ainda estiver nesse ciclo. Depois de uma
+renovação o contador já foi zerado, e devolver lá tiraria uma vaga usada no ciclo novo.
+"""
+from django.db.models import F
+
+from .context import invalidate_subscription_context
+from .models import Subscription
+
+
+class QuotaExceeded(Exception):
+    """A assinatura já usou todas as vagas do ciclo atual."""
+
+
+def reserve_gif_slot(subscription):
+    """
+    Reserva uma vaga em `subscription` (a assinatura ativa do usuário, com `plan` carregado).
+
+    Returns:
+        int: o ciclo em que a vaga foi reservada, para passar a `release_gif_slot`.
+
+    Raises:
+        QuotaExceeded: se o limite do plano já tiver sido atingido ou a assinatura não estiver mais ativa.
+    """
+    # status='active' no próprio UPDATE: uma assinatura expirada/cancelada depois de lida
+    # (ex.: contexto em cache, expire_subscriptions) não reserva mais vagas. O ciclo também:
+    # assim o valor retornado é exatamente o ciclo em que a vaga entrou.
+    reserved = Subscription.objects.filter(
+        pk=subscription.pk, status='active', cycle=subscription.cycle, gif_count__lt=subscription.plan.gif_limit
+    ).update(gif_count=F('gif_count') + 1)
+    if not reserved:
+        # A assinatura lida (ex.: do cache) pode ser de antes de uma renovação: tenta no ciclo atual.
+        current_cycle = Subscription.objects.filter(pk=subscription.pk).values_list('cycle', flat=True).first()
+        if current_cycle is not None and current_cycle != subscription.cycle:
+            subscription.cycle = current_cycle
+            return reserve_gif_slot(subscription)
+        raise QuotaExceeded("Você atingiu o limite mensal de geração de GIFs para o seu plano.")
+    invalidate_subscription_context(subscription.user_id)
+    return subscription.cycle
+
+
+def release_gif_slot(subscription_id, user_id, cycle=None):
+    """
+    Devolve uma vaga reservada (geração falhou ou nem chegou a ser enfileirada) no ciclo `cycle`.
+    Se a assinatura já foi renovada, não há o que devolver: o contador do ciclo novo não é tocado.
+    `cycle=None` (jobs anteriores ao registro do ciclo) devolve no ciclo atual.
+    """
+    subscriptions = Subscription.objects.filter(pk=subscription_id, gif_count__gt=0)
+    if cycle is not None:
+        subscriptions = subscriptions.filter(cycle=cycle)
+    subscriptions.update(gif_count=F('gif_count') - 1)
+    invalidate_subscription_context(user_id)
@@ -1,15 +1,10 @@
 # subscriptions/services.py
 import time
-import requests
 from django.conf import settings
+from Gif_generator_project.http_clients import get_client
 from .models import Subscription
 from datetime import date
 
-# URLs da API do Hugginface
-IMAGE_MODEL_URL = "https://api-inference.huggingface.co/models/stabilityai/stable-diffusion-xl-base-1.0"
-
-# URLs da API do Runway
-RUNWAY_API_BASE_URL = "https://api.dev.runwayml.com/v1"
 
 class AsaasService:
     def __init__(self):
@@ -19,24 +14,38 @@ class AsaasService:
             'Content-Type': 'application/json',
             'access_token': self.api_key
         }
+        self.http = get_client('asaas')
 
     def create_customer(self, user):
+        """
+        Retorna o id do cliente do usuário no Asaas.
+        Usa o id já salvo em `user.gateway_customer_id`; só na primeira assinatura busca
+        (pelo CPF) ou cria o cliente no Asaas, e então salva o id para as próximas.
+        """
+        if user.gateway_customer_id:
+            return user.gateway_customer_id
+
+        customer_id = self._find_or_create_customer(user)
+        user.gateway_customer_id = customer_id
+        user.save(update_fields=['gateway_customer_id'])
+        return customer_id
+
+    def _find_or_create_customer(self, user):
         search_url = f"{self.api_url}/customers?cpfCnpj={user.taxId}"
-        response = requests.get(search_url, headers=self.headers)
+        response = self.http.get(search_url, headers=self.headers)
         response_data = response.json()
         if response.status_code == 200 and response_data.get('data'):
             return response_data['data'][0]['id']
         url = f"{self.api_url}/customers"
         payload = {"name": user.get_full_name(), "email": user.email, "mobilePhone": user.cellphone,
                    "cpfCnpj": user.taxId}
-        response = requests.post(url, json=payload, headers=self.headers)
+        response = self.http.post(url, json=payload, headers=self.headers)
         response.raise_for_status()
         return response.json()['id']
 
     def create_subscription(self, customer_id, plan):
         url = f"{self.api_url}/subscriptions"
         clean_plan_name = plan.name.encode('ascii', 'ignore').decode('utf-8')
-        success_redirect_url = f"{settings.FRONTEND_URL}/payment/status"
 
         payload = {
             "customer": customer_id,
@@ -46,27 +55,39 @@ class AsaasService:
             "cycle": plan.cycle,
             "description": f"Assinatura do plano {clean_plan_name.strip()}",
         }
-        response = requests.post(url, json=payload, headers=self.headers)
+        response = self.http.post(url, json=payload, headers=self.headers)
         response.raise_for_status()
         return response.json()
 
     def get_first_payment_url_for_subscription(self, subscription_id):
-        """Busca as cobranças de uma assinatura e retorna a URL da primeira."""
-        # A API pode levar um instante para gerar a cobrança, então esperamos um pouco
-        time.sleep(2)
+        """
+        Busca as cobranças de uma assinatura e retorna a URL da primeira.
 
+        O Asaas pode levar um instante para gerar a cobrança: a primeira consulta é
+        imediata e, se ainda não houver cobrança, tenta de novo com intervalos crescentes
+        até o prazo ASAAS_PAYMENT_URL_TIMEOUT. Retorna None se o prazo acabar.
+        """
         url = f"{self.api_url}/payments?subscription={subscription_id}"
-        response = requests.get(url, headers=self.headers)
-        response.raise_for_status()
-        payments_data = response.json()
+        deadline = time.monotonic() + settings.ASAAS_PAYMENT_URL_TIMEOUT
+        delay = settings.ASAAS_PAYMENT_URL_POLL_INITIAL
+
+        while True:
+            response = self.http.get(url, headers=self.headers)
+            response.raise_for_status()
+            payments_data = response.json()
 
-        if payments_data.get('data'):
-            # Pega a primeira cobrança da lista
-            first_payment = payments_data['data'][0]
-            return first_payment.get('invoiceUrl')
+            if payments_data.get('data'):
+                # Pega a primeira cobrança da lista
+                first_payment = payments_data['data'][0]
+                if first_payment.get('invoiceUrl'):
+                    return first_payment['invoiceUrl']
 
-        # Fallback caso algo dê errado
-        return None
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                # Fallback caso a cobrança não apareça a tempo
+                return None
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, settings.ASAAS_PAYMENT_URL_POLL_MAX)
 
     def create_subscription_and_get_url(self, user, plan):
         """Orquestra a criação do cliente, da assinatura, a busca pela URL e salva no banco."""
@@ -92,6 +113,6 @@ class AsaasService:
 
     def cancel_subscription(self, asaas_subscription_id):
         url = f"{self.api_url}/subscriptions/{asaas_subscription_id}"
-        response = requests.delete(url, headers=self.headers)
+        response = self.http.delete(url, headers=self.headers)
         response.raise_for_status()
         return response.json()
\ No newline at end of file
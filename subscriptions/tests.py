@@ -1,3 +1,347 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from users.authentication import token_cache
+
+from . import context
+from .models import Plan, Subscription, WebhookEvent
+from .services import AsaasService
+from . import webhooks
+from .webhooks import process_all_pending
+
+
+class SubscriptionContextTests(TestCase):
+    """A assinatura ativa é resolvida uma vez e servida do cache até ser invalidada."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username='cliente', password='senha-forte-123', taxId='12345678901', cellphone='11999999999',
+            has_active_subscription=True,
+        )
+        self.plan = Plan.objects.create(name='Básico', description='', price=990, gif_limit=10)
+        self.subscription = Subscription.objects.create(
+            user=self.user, plan=self.plan, status='active', asaas_subscription_id='sub_1',
+            end_date=timezone.now() + timedelta(days=30),
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_detail_served_from_cache_after_first_request(self):
+        with self.assertNumQueries(1):  # subscription + plan num único SELECT
+            first = self.client.get('/api/subscriptions/my-subscription/')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/subscriptions/my-subscription/')
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(first.json()['plan_gif_limit'], 10)
+
+    @mock.patch('subscriptions.views.AsaasService')
+    def test_cancel_invalidates_cache(self, asaas_service):
+        self.client.get('/api/subscriptions/my-subscription/')
+
+        response = self.client.post('/api/subscriptions/cancel-subscription/')
+        self.assertEqual(response.status_code, 200)
+        asaas_service.return_value.cancel_subscription.assert_called_once_with('sub_1')
+
+        detail = self.client.get('/api/subscriptions/my-subscription/')
+        self.assertTrue(detail.json()['cancellation_requested'])
+
+        again = self.client.post('/api/subscriptions/cancel-subscription/')
+        self.assertEqual(again.status_code, 400)
+
+    def test_generate_resolves_subscription_once(self):
+        from gif_creator import views
+
+        with mock.patch.object(views, 'submit_generation_job'), \
+                mock.patch.object(context, '_load', wraps=context._load) as load:
+            response = self.client.post('/api/gif/generate-image/', {'prompt': 'Um gato'}, format='json')
+
+        self.assertEqual(response.status_code, 202)
+        # Permissão e view compartilham o mesmo resultado dentro da requisição.
+        self.assertEqual(load.call_count, 1)
+
+
+@override_settings(ASAAS_WEBHOOK_SECRET='segredo', ASAAS_WEBHOOK_BACKGROUND=False)
+class AsaasWebhookTests(TestCase):
+    """O webhook só grava o evento; o processador aplica os eventos depois, uma vez cada."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username='cliente', password='senha-forte-123', taxId='12345678901', cellphone='11999999999',
+        )
+        self.plan = Plan.objects.create(name='Básico', description='', price=990, gif_limit=10)
+        self.subscription = Subscription.objects.create(
+            user=self.user, plan=self.plan, status='pending', asaas_subscription_id='sub_1', gif_count=7,
+        )
+        self.client = APIClient()
+
+    def post_event(self, event, payment_id='pay_1', subscription_id='sub_1'):
+        payload = {'event': event, 'payment': {'id': payment_id, 'subscription': subscription_id}}
+        return self.client.post('/api/subscriptions/webhook/', payload, format='json',
+                                HTTP_ASAAS_ACCESS_TOKEN='segredo')
+
+    def test_rejects_invalid_token(self):
+        response = self.client.post('/api/subscriptions/webhook/', {'event': 'PAYMENT_RECEIVED'}, format='json',
+                                    HTTP_ASAAS_ACCESS_TOKEN='errado')
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    def test_event_is_recorded_and_applied_later(self):
+        self.assertEqual(self.post_event('PAYMENT_RECEIVED').status_code, 200)
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.status, 'pending')  # ainda não processado
+
+        self.assertEqual(process_all_pending(), 1)
+        self.subscription.refresh_from_db()
+        self.user.refresh_from_db()
+        self.assertEqual(self.subscription.status, 'active')
+        self.assertEqual(self.subscription.gif_count, 0)
+        self.assertEqual(self.subscription.cycle, 1)
+        self.assertIsNotNone(self.subscription.end_date)
+        self.assertTrue(self.user.has_active_subscription)
+        self.assertEqual(WebhookEvent.objects.get().status, 'processed')
+
+    def test_retries_and_confirmation_of_same_payment_are_no_ops(self):
+        self.post_event('PAYMENT_RECEIVED')
+        process_all_pending()
+        Subscription.objects.filter(pk=self.subscription.pk).update(gif_count=3)
+
+        # Reenvio do mesmo evento e o PAYMENT_CONFIRMED do mesmo pagamento
+        # Um único INSERT que colide na chave única (mais as instruções do savepoint); nenhuma leitura
+        with self.assertNumQueries(4):
+            self.assertEqual(self.post_event('PAYMENT_RECEIVED').status_code, 200)
+        self.assertEqual(self.post_event('PAYMENT_CONFIRMED').status_code, 200)
+
+        self.assertEqual(process_all_pending(), 0)
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.gif_count, 3)
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+
+    def test_unknown_subscription_is_ignored(self):
+        self.post_event('PAYMENT_RECEIVED', subscription_id='sub_desconhecida')
+        process_all_pending()
+        self.assertEqual(WebhookEvent.objects.get().status, 'ignored')
+
+    def make_due(self, event):
+        WebhookEvent.objects.filter(pk=event.pk).update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+
+    @override_settings(ASAAS_WEBHOOK_MAX_ATTEMPTS=3, ASAAS_WEBHOOK_RETRY_INITIAL=30, ASAAS_WEBHOOK_RETRY_MAX=45)
+    def test_failed_event_is_retried_with_backoff_until_max_attempts(self):
+        self.post_event('PAYMENT_RECEIVED')
+        event = WebhookEvent.objects.get()
+        delays = []
+        with mock.patch('subscriptions.webhooks._apply', side_effect=Exception("Asaas fora do ar")):
+            for _ in range(3):
+                before = timezone.now()
+                self.assertEqual(process_all_pending(), 1)
+                event.refresh_from_db()
+                if event.status == 'pending':
+                    delays.append(round((event.next_attempt_at - before).total_seconds()))
+                    # Antes da hora marcada o evento não é pego de novo.
+                    self.assertEqual(process_all_pending(), 0)
+                    self.make_due(event)
+
+        self.assertEqual(delays, [30, 45])  # 30s, depois 60s limitado ao teto
+        self.assertEqual(event.status, 'failed')
+        self.assertEqual(event.attempts, 3)
+        self.assertEqual(event.error, 'Asaas fora do ar')
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.status, 'pending')
+
+    def test_retry_succeeds_and_later_events_of_subscription_wait_for_it(self):
+        other = Subscription.objects.create(user=self.user, plan=self.plan, status='pending',
+                                            asaas_subscription_id='sub_2', gif_count=5)
+        self.post_event('PAYMENT_RECEIVED', payment_id='pay_1')
+        with mock.patch('subscriptions.webhooks._apply', side_effect=Exception("Asaas fora do ar")):
+            process_all_pending()
+        first = WebhookEvent.objects.get()
+        self.assertEqual((first.status, first.attempts), ('pending', 1))
+
+        self.post_event('PAYMENT_OVERDUE', payment_id='pay_2')
+        self.post_event('PAYMENT_RECEIVED', payment_id='pay_3', subscription_id='sub_2')
+        # Só a outra assinatura anda; o evento novo da sub_1 espera o anterior.
+        self.assertEqual(process_all_pending(), 1)
+        other.refresh_from_db()
+        self.assertEqual(other.status, 'active')
+        later = WebhookEvent.objects.get(event_type='PAYMENT_OVERDUE')
+        self.assertEqual((later.status, later.attempts), ('pending', 0))
+
+        self.make_due(first)
+        self.assertEqual(process_all_pending(), 2)
+        first.refresh_from_db()
+        later.refresh_from_db()
+        self.assertEqual((first.status, first.error, first.next_attempt_at), ('processed', '', None))
+        self.assertEqual(later.status, 'ignored')
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.status, 'active')
+
+    def test_subscription_is_skipped_while_an_earlier_event_is_outside_the_batch(self):
+        # Como quando outro processador travou o primeiro evento (skip_locked) e este pegou o segundo.
+        self.post_event('PAYMENT_RECEIVED', payment_id='pay_1')
+        self.post_event('PAYMENT_RECEIVED', payment_id='pay_2')
+        self.post_event('PAYMENT_RECEIVED', payment_id='pay_3', subscription_id='sub_2')
+        first, second, other = WebhookEvent.objects.order_by('id')
+        blocked = webhooks._blocked_subscriptions({'sub_1': [second], 'sub_2': [other]})
+        self.assertEqual(blocked, {'sub_1'})
+
+
+def _json_response(data, status_code=200):
+    response = mock.Mock(status_code=status_code)
+    response.json.return_value = data
+    return response
+
+
+@override_settings(ASAAS_API_URL='https://asaas.test/v3', ASAAS_PAYMENT_URL_TIMEOUT=5,
+                   ASAAS_PAYMENT_URL_POLL_INITIAL=0.01, ASAAS_PAYMENT_URL_POLL_MAX=0.02)
+class AsaasCheckoutTests(TestCase):
+    """O checkout reutiliza o cliente salvo e busca a URL da cobrança sem espera fixa."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='cliente', password='senha-forte-123', taxId='12345678901', cellphone='11999999999',
+        )
+        self.plan = Plan.objects.create(name='Básico', description='', price=990, gif_limit=10)
+        self.service = AsaasService()
+        self.service.http = mock.Mock()
+
+    def test_customer_id_is_persisted_and_reused(self):
+        self.service.http.get.return_value = _json_response({'data': []})
+        self.service.http.post.return_value = _json_response({'id': 'cus_1'})
+
+        self.assertEqual(self.service.create_customer(self.user), 'cus_1')
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.gateway_customer_id, 'cus_1')
+
+        self.service.http.reset_mock()
+        self.assertEqual(self.service.create_customer(self.user), 'cus_1')
+        self.service.http.get.assert_not_called()
+        self.service.http.post.assert_not_called()
+
+    @mock.patch('subscriptions.services.time.sleep')
+    def test_payment_url_available_immediately_does_not_sleep(self, sleep):
+        self.service.http.get.return_value = _json_response({'data': [{'invoiceUrl': 'https://pagar/1'}]})
+        self.assertEqual(self.service.get_first_payment_url_for_subscription('sub_1'), 'https://pagar/1')
+        sleep.assert_not_called()
+
+    def test_payment_url_polled_with_backoff(self):
+        self.service.http.get.side_effect = [
+            _json_response({'data': []}),
+            _json_response({'data': []}),
+            _json_response({'data': [{'invoiceUrl': 'https://pagar/1'}]}),
+        ]
+        self.assertEqual(self.service.get_first_payment_url_for_subscription('sub_1'), 'https://pagar/1')
+        self.assertEqual(self.service.http.get.call_count, 3)
+
+    @override_settings(ASAAS_PAYMENT_URL_TIMEOUT=0.05)
+    def test_payment_url_gives_up_at_deadline(self):
+        self.service.http.get.return_value = _json_response({'data': []})
+        self.assertIsNone(self.service.get_first_payment_url_for_subscription('sub_1'))
+
+
+class ExpireSubscriptionsTests(TestCase):
+    def test_expires_overdue_subscriptions_and_user_flags(self):
+        plan = Plan.objects.create(name='Básico', description='', price=990)
+        now = timezone.now()
+        users = [
+            get_user_model().objects.create_user(username=f'cliente{i}', password='senha-forte-123',
+                                                 taxId=f'0000000000{i}', cellphone='1', has_active_subscription=True)
+            for i in range(3)
+        ]
+        overdue = Subscription.objects.create(user=users[0], plan=plan, status='active',
+                                              end_date=now - timedelta(days=1))
+        canceled = Subscription.objects.create(user=users[1], plan=plan, status='active',
+                                               cancellation_requested=True, end_date=now - timedelta(days=1))
+        current = Subscription.objects.create(user=users[2], plan=plan, status='active',
+                                              end_date=now + timedelta(days=1))
+
+        token_cache.clear()
+        self.addCleanup(token_cache.clear)
+        for i, user in enumerate(users):
+            token_cache.set(f'token{i}', user, None)
+
+        call_command('expire_subscriptions', chunk_size=1, stdout=StringIO())
+
+        statuses = dict(Subscription.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses, {overdue.pk: 'inactive', canceled.pk: 'canceled', current.pk: 'active'})
+        flags = [u.has_active_subscription for u in get_user_model().objects.order_by('username')]
+        self.assertEqual(flags, [False, False, True])
+        # O UPDATE em lote não passa pelos signals: o comando descarta os usuários afetados do cache de tokens.
+        self.assertEqual([token_cache.get(f'token{i}') is not None for i in range(3)], [False, False, True])
+
+
+@override_settings(ASAAS_WEBHOOK_SECRET='segredo', ASAAS_WEBHOOK_BACKGROUND=False)
+class SubscriptionsQueryBudgetTests(TestCase):
+    """
+    Número máximo de consultas por URL de subscriptions/urls.py, com caches frios (token e
+    assinatura). Há vários planos e assinaturas antigas para que um N+1 apareça no total.
+    """
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username='cliente', password='senha-forte-123', taxId='12345678901', cellphone='11999999999',
+            has_active_subscription=True,
+        )
+        self.plans = [
+            Plan.objects.create(name=f'Plano {i}', description='', price=990 * (i + 1), gif_limit=10)
+            for i in range(5)
+        ]
+        for plan in self.plans[1:]:
+            Subscription.objects.create(user=self.user, plan=plan, status='canceled')
+        self.subscription = Subscription.objects.create(
+            user=self.user, plan=self.plans[0], status='active', asaas_subscription_id='sub_1',
+            end_date=timezone.now() + timedelta(days=30),
+        )
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=self.user).key}")
+
+    def test_plans(self):
+        with self.assertNumQueries(2):  # token -> usuário, planos
+            response = self.client.get('/api/subscriptions/plans/')
+        self.assertEqual(len(response.json()), 5)
+
+    @mock.patch('subscriptions.views.AsaasService')
+    def test_create_subscription(self, asaas_service):
+        self.subscription.delete()
+        asaas_service.return_value.create_subscription_and_get_url.return_value = 'https://pagar'
+        with self.assertNumQueries(3):  # token -> usuário, assinatura ativa, plano
+            response = self.client.post('/api/subscriptions/create-subscription/', {'plan_id': self.plans[1].pk},
+                                        format='json')
+        self.assertEqual(response.json(), {'payment_url': 'https://pagar'})
+
+    def test_create_subscription_rejects_duplicate(self):
+        with self.assertNumQueries(2):  # token -> usuário, assinatura ativa
+            response = self.client.post('/api/subscriptions/create-subscription/', {'plan_id': self.plans[1].pk},
+                                        format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_webhook(self):
+        payload = {'event': 'PAYMENT_RECEIVED', 'payment': {'id': 'pay_1', 'subscription': 'sub_1'}}
+        with self.assertNumQueries(3):  # INSERT do evento dentro de um savepoint
+            response = APIClient().post('/api/subscriptions/webhook/', payload, format='json',
+                                        HTTP_ASAAS_ACCESS_TOKEN='segredo')
+        self.assertEqual(response.status_code, 200)
+
+    def test_my_subscription(self):
+        with self.assertNumQueries(2):  # token -> usuário, assinatura + plano
+            response = self.client.get('/api/subscriptions/my-subscription/')
+        self.assertEqual(response.json()['id'], self.subscription.pk)
+
+    @mock.patch('subscriptions.views.AsaasService')
+    def test_cancel_subscription(self, asaas_service):
+        with self.assertNumQueries(3):  # token -> usuário, assinatura + plano, UPDATE
+            response = self.client.post('/api/subscriptions/cancel-subscription/')
+        self.assertEqual(response.status_code, 200)
@@ -3,12 +3,12 @@ from rest_framework.permissions import AllowAny
 import json
 from rest_framework import generics, views, status, permissions
 from rest_framework.response import Response
-from django.utils import timezone
-import datetime
 from .services import AsaasService
 from django.conf import settings
-from .models import Plan, Subscription
+from .models import Plan
 from .serializers import PlanSerializer, SubscriptionSerializer
+from .context import get_active_subscription, invalidate_subscription_context
+from .webhooks import get_processor, record_event
 
 # A PlanListView não muda, continua igual.
 class PlanListView(generics.ListAPIView):
@@ -24,8 +24,8 @@ class CreateSubscriptionView(views.APIView):
         plan_id = request.data.get('plan_id')
         user = request.user
 
-        # Lógica para impedir assinatura duplicada
-        if hasattr(user, 'subscription') and user.subscription.status == 'active':
+        # Lógica para impedir assinatura duplicada (o usuário tem `subscriptions`, não `subscription`)
+        if get_active_subscription(request) is not None:
             return Response(
                 {'error': 'Você já possui uma assinatura ativa.'},
                 status=status.HTTP_400_BAD_REQUEST
@@ -45,7 +45,8 @@ class CreateSubscriptionView(views.APIView):
 
 class AsaasWebhookView(views.APIView):
     """
-    Recebe e processa webhooks do Asaas para atualizar o status e as datas das assinaturas.
+    Recebe os webhooks do Asaas e os grava na fila de eventos (WebhookEvent).
+    O status e as datas das assinaturas são atualizados em segundo plano (ver webhooks.py).
     """
     permission_classes = [AllowAny]
 
@@ -56,46 +57,13 @@ class AsaasWebhookView(views.APIView):
 
         try:
             payload = json.loads(request.body)
-            event_type = payload.get('event')
+        except ValueError:
+            return Response({'status': 'error', 'message': 'JSON inválido.'}, status=status.HTTP_400_BAD_REQUEST)
 
-            if event_type in ['PAYMENT_RECEIVED', 'PAYMENT_CONFIRMED']:
-                payment_data = payload.get('payment', {})
-                asaas_subscription_id = payment_data.get('subscription')
-
-                if asaas_subscription_id:
-                    subscription = Subscription.objects.get(asaas_subscription_id=asaas_subscription_id)
-
-                    # --- LÓGICA DE ATUALIZAÇÃO DE STATUS E DATAS ---
-                    subscription.status = 'active'
-                    subscription.gif_count = 0
-
-                    # Calcula a data de expiração baseada no ciclo do plano
-                    now = timezone.now()
-                    if subscription.plan.cycle == 'MONTHLY':
-                        # Adiciona aproximadamente 31 dias para garantir a cobertura do mês
-                        end_date = now + datetime.timedelta(days=31)
-                    elif subscription.plan.cycle == 'YEARLY':
-                        end_date = now + datetime.timedelta(days=366)
-                    else:
-                        end_date = now + datetime.timedelta(days=31)  # Fallback padrão
-
-                    subscription.end_date = end_date
-                    subscription.next_billing_date = end_date  # A próxima cobrança coincide com o fim do período
-
-                    subscription.save()
-
-                    # Atualiza o status do usuário
-                    user = subscription.user
-                    user.has_active_subscription = True
-                    user.save()
-
-            return Response({'status': 'success'}, status=status.HTTP_200_OK)
-
-        except Subscription.DoesNotExist:
-            return Response({'status': 'success', 'message': 'Assinatura não encontrada'}, status=status.HTTP_200_OK)
-        except Exception as e:
-            print(f"Erro inesperado no webhook: {e}")
-            return Response({'status': 'error'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        # Só grava o evento (reenvios são ignorados) e responde; o processamento é em segundo plano.
+        if record_event(payload) and settings.ASAAS_WEBHOOK_BACKGROUND:
+            get_processor().notify()
+        return Response({'status': 'success'}, status=status.HTTP_200_OK)
 
 
 # --- Obter Detalhes da Assinatura do Usuário ---
@@ -104,48 +72,30 @@ class UserSubscriptionDetailView(generics.RetrieveAPIView):
     serializer_class = SubscriptionSerializer
 
     def get_object(self):
-        try:
-            return Subscription.objects.get(user=self.request.user, status='active')
-        except Subscription.DoesNotExist:
+        subscription = get_active_subscription(self.request)
+        if subscription is None:
             raise Http404
+        return subscription
 
 
 # --- Cancelar Assinatura ---
 class CancelSubscriptionView(views.APIView):
     def post(self, request, *args, **kwargs):
         try:
-            # 1. Tenta encontrar uma assinatura que possa ser cancelada
-            # ativa e que ainda não teve o cancelamento solicitado).
-            subscription = Subscription.objects.get(
-                user=request.user,
-                status='active',
-                cancellation_requested=False
-            )
-
-            # Se encontrar, cancela normalmente...
-            asaas_service = AsaasService()
-            asaas_service.cancel_subscription(subscription.asaas_subscription_id)
-
-            subscription.cancellation_requested = True
-            subscription.save()
-
-            serializer = SubscriptionSerializer(subscription)
-            return Response(serializer.data, status=status.HTTP_200_OK)
-
-        except Subscription.DoesNotExist:
-            # 2. Se a primeira busca falhou, vamos descobrir o porquê.
-            try:
-                # Tentamos encontrar uma assinatura que está ativa, mas JÁ FOI CANCELADA.
-                already_canceled_sub = Subscription.objects.get(
-                    user=request.user,
-                    status='active',
-                    cancellation_requested=True
+            # 1. Busca a assinatura ativa (já com o plano) pelo resolver compartilhado
+            subscription = get_active_subscription(request)
+            if subscription is None:
+                # O usuário realmente não tem nenhuma assinatura ativa para cancelar.
+                return Response(
+                    {'error': 'Nenhuma assinatura ativa encontrada para cancelar.'},
+                    status=status.HTTP_404_NOT_FOUND
                 )
 
-                # 3. Se encontrar, montamos a mensagem de erro personalizada.
+            if subscription.cancellation_requested:
+                # 2. A assinatura está ativa, mas o cancelamento JÁ FOI solicitado.
                 end_date_formatted = "data indefinida"
-                if already_canceled_sub.end_date:
-                    end_date_formatted = already_canceled_sub.end_date.strftime('%d/%m/%Y')
+                if subscription.end_date:
+                    end_date_formatted = subscription.end_date.strftime('%d/%m/%Y')
 
                 message = f"Sua assinatura já foi cancelada e expira em {end_date_formatted}."
 
@@ -153,12 +103,17 @@ class CancelSubscriptionView(views.APIView):
                 # porque a ação não pode ser executada novamente.
                 return Response({'error': message}, status=status.HTTP_400_BAD_REQUEST)
 
-            except Subscription.DoesNotExist:
-                # 4. Se mesmo assim não encontrar nada, então o usuário realmente não tem
-                #    nenhuma assinatura ativa para cancelar.
-                return Response(
-                    {'error': 'Nenhuma assinatura ativa encontrada para cancelar.'},
-                    status=status.HTTP_404_NOT_FOUND
-                )
+            # 3. Cancela normalmente...
+            asaas_service = AsaasService()
+            asaas_service.cancel_subscription(subscription.asaas_subscription_id)
+
+            # O objeto pode ter vindo do cache: grava só o campo alterado.
+            subscription.cancellation_requested = True
+            subscription.save(update_fields=['cancellation_requested', 'updated_at'])
+            invalidate_subscription_context(request.user.pk)
+
+            serializer = SubscriptionSerializer(subscription)
+            return Response(serializer.data, status=status.HTTP_200_OK)
+
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -0,0 +1,264 @@
+# subscriptions/webhooks.py
+"""
+Fila durável dos webhooks do Asaas.
+
+`record_event` grava o evento na tabela WebhookEvent com um único INSERT; reenvios
+colidem na chave única e viram no-ops baratos. A view responde 200 na hora.
+
+`process_pending_events` aplica os eventos pendentes em lotes: agrupa por assinatura,
+mantendo a ordem de chegada, carrega cada assinatura uma vez, aplica todos os
+eventos dela em memória e grava uma única vez. Roda numa thread em segundo plano
+(acordada a cada evento novo, ver `get_processor`) ou pelo comando
+`process_webhook_events`.
+
+Os eventos de uma assinatura são aplicados estritamente em ordem de chegada: enquanto
+um evento anterior dela estiver pendente (esperando nova tentativa ou sendo tratado por
+outro processador), os seguintes esperam. Um lote que falha volta para a fila com espera
+exponencial e só fica 'failed' depois de ASAAS_WEBHOOK_MAX_ATTEMPTS tentativas.
+"""
+import datetime
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import Exists, Min, OuterRef, Q
+from django.utils import timezone
+
+from Gif_generator_project.metrics import Counter
+from .context import invalidate_subscription_context
+from .models import Subscription, WebhookEvent
+
+PAYMENT_PAID_EVENTS = ('PAYMENT_RECEIVED', 'PAYMENT_CONFIRMED')
+
+WEBHOOK_EVENTS = Counter(
+    'asaas_webhook_events_total', "Eventos do Asaas recebidos pelo webhook (novos ou duplicados).", ['result'],
+)
+
+
+def event_key(payload):
+    """
+    Chave de deduplicação do evento.
+
+    PAYMENT_RECEIVED e PAYMENT_CONFIRMED do mesmo pagamento renovam o mesmo ciclo, então
+    compartilham a chave: o segundo aviso não zera de novo o contador de GIFs.
+    """
+    event_type = payload.get('event', '')
+    payment_id = (payload.get('payment') or {}).get('id')
+    if event_type in PAYMENT_PAID_EVENTS and payment_id:
+        return f"payment:{payment_id}:paid"
+    if payload.get('id'):
+        return str(payload['id'])
+    return f"{event_type}:{payment_id}"
+
+
+def record_event(payload):
+    """Grava o evento, se ainda não existir (um único INSERT). Retorna True se for novo."""
+    payment = payload.get('payment') or {}
+    try:
+        with transaction.atomic():
+            WebhookEvent.objects.create(
+                event_id=event_key(payload),
+                event_type=payload.get('event', ''),
+                asaas_subscription_id=payment.get('subscription'),
+                payload=payload,
+            )
+    except IntegrityError:
+        # Reenvio de um evento já gravado: nada a fazer.
+        WEBHOOK_EVENTS.inc(result='duplicate')
+        return False
+    WEBHOOK_EVENTS.inc(result='new')
+    return True
+
+
+def _period_end(plan, now):
+    # Calcula a data de expiração baseada no ciclo do plano
+    if plan.cycle == 'YEARLY':
+        return now + datetime.timedelta(days=366)
+    # Mensal (e fallback padrão): aproximadamente 31 dias para garantir a cobertura do mês
+    return now + datetime.timedelta(days=31)
+
+
+def _apply(subscription, event):
+    """Aplica um evento à assinatura em memória. Retorna True se algo mudou."""
+    if event.event_type not in PAYMENT_PAID_EVENTS:
+        return False
+    now = timezone.now()
+    subscription.status = 'active'
+    subscription.gif_count = 0
+    subscription.cycle += 1  # vagas do ciclo anterior não são mais devolvidas (ver quota.py)
+    subscription.end_date = _period_end(subscription.plan, now)
+    subscription.next_billing_date = subscription.end_date  # A próxima cobrança coincide com o fim do período
+    return True
+
+
+def _retry_delay(attempts):
+    """Espera antes da tentativa seguinte à `attempts`-ésima falha: dobra a cada falha, até o teto."""
+    return min(settings.ASAAS_WEBHOOK_RETRY_INITIAL * 2 ** (attempts - 1), settings.ASAAS_WEBHOOK_RETRY_MAX)
+
+
+def _claim_batch(batch_size, now):
+    # Eventos cuja vez chegou e que não estão atrás de um evento da mesma assinatura esperando nova tentativa.
+    waiting_retry = WebhookEvent.objects.filter(
+        status='pending', asaas_subscription_id=OuterRef('asaas_subscription_id'), id__lt=OuterRef('id'),
+        next_attempt_at__gt=now,
+    )
+    queryset = (
+        WebhookEvent.objects.filter(status='pending')
+        .filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now))
+        .exclude(Exists(waiting_retry))
+        .order_by('id')
+    )
+    if connection.features.has_select_for_update_skip_locked:
+        # Vários processadores (threads/processos) podem rodar juntos sem pegar os mesmos eventos.
+        queryset = queryset.select_for_update(skip_locked=True)
+    return list(queryset[:batch_size])
+
+
+def _blocked_subscriptions(by_subscription):
+    """
+    Assinaturas do lote com um evento anterior pendente fora dele: travado por outro processador
+    (pulado pelo skip_locked) ou que entrou na espera de nova tentativa depois da seleção.
+    """
+    claimed_ids = [event.pk for events in by_subscription.values() for event in events]
+    earliest_outside = dict(
+        WebhookEvent.objects.filter(status='pending', asaas_subscription_id__in=[key for key in by_subscription if key])
+        .exclude(pk__in=claimed_ids)
+        .values('asaas_subscription_id')
+        .annotate(first_id=Min('id'))
+        .values_list('asaas_subscription_id', 'first_id')
+    )
+    return {key for key, first_id in earliest_outside.items() if first_id < by_subscription[key][0].pk}
+
+
+def process_pending_events(batch_size=None):
+    """
+    Processa um lote de eventos pendentes.
+
+    Returns:
+        int: quantos eventos foram tratados (0 quando a fila está vazia).
+    """
+    batch_size = batch_size or settings.ASAAS_WEBHOOK_BATCH_SIZE
+    with transaction.atomic():
+        now = timezone.now()
+        events = _claim_batch(batch_size, now)
+        if not events:
+            return 0
+
+        by_subscription = OrderedDict()
+        for event in events:
+            by_subscription.setdefault(event.asaas_subscription_id, []).append(event)
+        # Ficam para depois, intocados: o evento anterior da assinatura precisa ser aplicado antes.
+        for asaas_subscription_id in _blocked_subscriptions(by_subscription):
+            del by_subscription[asaas_subscription_id]
+        events = [event for subscription_events in by_subscription.values() for event in subscription_events]
+        if not events:
+            return 0
+
+        subscriptions = {
+            s.asaas_subscription_id: s
+            for s in Subscription.objects.select_related('plan', 'user').filter(
+                asaas_subscription_id__in=[key for key in by_subscription if key]
+            )
+        }
+
+        for asaas_subscription_id, subscription_events in by_subscription.items():
+            subscription = subscriptions.get(asaas_subscription_id)
+            if subscription is None:
+                for event in subscription_events:
+                    event.status = 'ignored'
+                    event.error = 'Assinatura não encontrada' if asaas_subscription_id else ''
+                    event.processed_at = now
+                continue
+
+            try:
+                # Savepoint por assinatura: uma falha não desfaz o restante do lote.
+                with transaction.atomic():
+                    changed = False
+                    for event in subscription_events:
+                        changed = _apply(subscription, event) or changed
+                    if changed:
+                        subscription.save(update_fields=['status', 'gif_count', 'cycle', 'end_date', 'next_billing_date',
+                                                         'updated_at'])
+                        # Atualiza o status do usuário
+                        user = subscription.user
+                        if not user.has_active_subscription:
+                            user.has_active_subscription = True
+                            user.save(update_fields=['has_active_subscription'])
+                        invalidate_subscription_context(user.pk)
+                for event in subscription_events:
+                    event.status = 'processed' if event.event_type in PAYMENT_PAID_EVENTS else 'ignored'
+                    event.error = ''
+                    event.next_attempt_at = None
+                    event.processed_at = now
+            except Exception as e:
+                print(f"Erro ao processar eventos do Asaas da assinatura {asaas_subscription_id}: {e}")
+                for event in subscription_events:
+                    event.attempts += 1
+                    event.error = str(e)
+                    if event.attempts >= settings.ASAAS_WEBHOOK_MAX_ATTEMPTS:
+                        event.status = 'failed'
+                        event.next_attempt_at = None
+                        event.processed_at = now
+                    else:
+                        # Continua pendente: volta na próxima varredura depois da espera.
+                        event.next_attempt_at = now + datetime.timedelta(seconds=_retry_delay(event.attempts))
+
+        WebhookEvent.objects.bulk_update(events, ['status', 'error', 'attempts', 'next_attempt_at', 'processed_at'])
+    return len(events)
+
+
+def process_all_pending(batch_size=None):
+    """Processa lotes até esvaziar a fila. Retorna o total de eventos tratados."""
+    total = 0
+    while True:
+        processed = process_pending_events(batch_size)
+        if not processed:
+            return total
+        total += processed
+
+
+class WebhookProcessor:
+    """
+    Thread em segundo plano que esvazia a fila de eventos.
+    Acorda quando a view grava um evento novo ou, no máximo, a cada `sweep_interval` segundos.
+    """
+
+    def __init__(self, sweep_interval=30.0):
+        self.sweep_interval = sweep_interval
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def notify(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='asaas-webhooks', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.sweep_interval)
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                process_all_pending()
+            except Exception as e:
+                print(f"!!! Erro no processador de webhooks do Asaas: {e} !!!")
+            finally:
+                close_old_connections()
+
+
+_processor = None
+_processor_lock = threading.Lock()
+
+
+def get_processor():
+    """Processador compartilhado pelo processo."""
+    global _processor
+    if _processor is None:
+        with _processor_lock:
+            if _processor is None:
+                _processor = WebhookProcessor()
+    return _processor
@@ -0,0 +1,100 @@
+# users/authentication.py
+"""
+TokenAuthentication com cache em memória do mapeamento token -> usuário.
+
+O TokenAuthentication do DRF faz um SELECT (Token JOIN User) em toda requisição,
+inclusive no polling do frontend. Aqui o par (usuário, token) fica num cache LRU
+limitado (TOKEN_AUTH_CACHE_SIZE entradas) com validade de TOKEN_AUTH_CACHE_TTL
+segundos, então requisições repetidas do mesmo token não vão ao banco.
+
+As entradas são descartadas (ver signals.py) quando o token é apagado (logout),
+quando o usuário é salvo (troca de senha, desativação, mudança de assinatura...) ou
+removido. O cache é por processo: em outros workers a entrada expira pelo TTL, que
+por isso deve ser curto.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.authentication import TokenAuthentication
+
+
+class TokenCache:
+    """Cache LRU com TTL de chave do token -> (usuário, token), seguro para threads."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # chave -> (expira_em, usuário, token)
+        self._keys_by_user = {}  # user_id -> chaves em cache, para discard_user sem varrer tudo
+        self._lock = threading.Lock()
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._keys_by_user.get(entry[1].pk)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_user[entry[1].pk]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1], entry[2]
+
+    def set(self, key, user, token):
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, user, token)
+            self._keys_by_user.setdefault(user.pk, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def discard(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def discard_user(self, user_id):
+        self.discard_users([user_id])
+
+    def discard_users(self, user_ids):
+        """Descarta as entradas dos usuários, pelo índice user_id -> chaves (sem varrer o cache)."""
+        with self._lock:
+            for user_id in user_ids:
+                for key in list(self._keys_by_user.get(user_id, ())):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+token_cache = TokenCache(settings.TOKEN_AUTH_CACHE_SIZE, settings.TOKEN_AUTH_CACHE_TTL)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Mesma interface e mesmas respostas do TokenAuthentication, com cache do token -> usuário."""
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is not None:
+            user, token = cached
+            # Cópia rasa: cada requisição pode alterar o próprio request.user sem afetar as outras.
+            return copy.copy(user), token
+
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user, token)
+        return user, token
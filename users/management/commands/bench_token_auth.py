@@ -0,0 +1,66 @@
+# users/management/commands/bench_token_auth.py
+import json
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+
+from users.authentication import CachedTokenAuthentication, token_cache
+
+
+def make_view(authentication_class):
+    class BenchView(APIView):
+        authentication_classes = [authentication_class]
+
+        def get(self, request):
+            return Response({'user': request.user.pk})
+
+    return BenchView.as_view()
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara TokenAuthentication e CachedTokenAuthentication: consultas ao banco e "
+        "tempo por requisição autenticada. Usa um usuário temporário (desfeito no fim)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = options['requests']
+        factory = APIRequestFactory()
+
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(
+                username='bench-token-auth', password='bench-senha-123', taxId='99999999999', cellphone='0',
+            )
+            token = Token.objects.create(user=user)
+            token_cache.clear()
+
+            results = {}
+            for name, authentication_class in (('TokenAuthentication', TokenAuthentication),
+                                               ('CachedTokenAuthentication', CachedTokenAuthentication)):
+                view = make_view(authentication_class)
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    for _ in range(total):
+                        response = view(factory.get('/', HTTP_AUTHORIZATION=f"Token {token.key}"))
+                        assert response.status_code == 200, response.status_code
+                    elapsed = time.perf_counter() - start
+                results[name] = {
+                    'queries_per_request': round(len(queries) / total, 3),
+                    'microseconds_per_request': round(elapsed / total * 1e6, 1),
+                }
+
+            token_cache.clear()
+            transaction.set_rollback(True)
+
+        self.stdout.write(json.dumps(results, indent=2))
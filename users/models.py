@@ -10,9 +10,10 @@ class User(AbstractUser):
 
     @property
     def get_active_subscription(self):
-        try:
-            return self.subscriptions.get(status='active', end_date__gte=timezone.now())
-        except self.subscriptions.model.DoesNotExist:
+        # Import local: subscriptions.models depende deste modelo.
+        from subscriptions.context import get_user_subscription
+
+        subscription = get_user_subscription(self)
+        if subscription is None or subscription.end_date is None or subscription.end_date < timezone.now():
             return None
-        except self.subscriptions.model.MultipleObjectsReturned:
-            return self.subscriptions.filter(status='active', end_date__gte=timezone.now()).first()
\ No newline at end of file
+        return subscription
@@ -0,0 +1,21 @@
+# users/signals.py
+"""Invalida o cache de autenticação por token (authentication.py) quando token ou usuário mudam."""
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import token_cache
+
+
+@receiver(post_delete, sender=Token)
+def discard_deleted_token(sender, instance, **kwargs):
+    # Logout (ou token revogado no admin)
+    token_cache.discard(instance.key)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def discard_user_tokens(sender, instance, **kwargs):
+    # Troca de senha, desativação ou qualquer outra alteração: o usuário em cache ficou desatualizado.
+    token_cache.discard_user(instance.pk)
@@ -1,3 +1,115 @@
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from .authentication import TokenCache, token_cache
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Depois da primeira requisição, o token é resolvido sem ir ao banco, até ser invalidado."""
+    # Com SessionAuthentication em primeiro lugar, o DRF responde 403 (e não 401) a credenciais inválidas.
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username='cliente', password='senha-forte-123', taxId='12345678901', cellphone='11999999999',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def test_cache_hit_makes_no_queries(self):
+        with self.assertNumQueries(1):  # Token JOIN User
+            self.assertEqual(self.client.get('/api/users/profile/').status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/users/profile/').status_code, 200)
+
+    def test_logout_invalidates_token(self):
+        self.client.get('/api/users/profile/')
+        self.assertEqual(self.client.post('/api/users/logout/').status_code, 200)
+        self.assertEqual(self.client.get('/api/users/profile/').status_code, 403)
+
+    def test_password_change_invalidates_cached_user(self):
+        self.client.get('/api/users/profile/')
+        self.user.set_password('outra-senha-456')
+        self.user.save()
+        with self.assertNumQueries(1):
+            self.client.get('/api/users/profile/')
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.get('/api/users/profile/')
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/users/profile/').status_code, 403)
+
+
+class TokenCacheTests(TestCase):
+    """TokenCache: LRU com TTL e índice user_id -> chaves para descartar os tokens de um usuário."""
+
+    def user(self, pk):
+        return get_user_model()(pk=pk)
+
+    def test_discard_users_uses_the_index(self):
+        cache = TokenCache(max_size=10, ttl=60)
+        for key, pk in [('a', 1), ('b', 1), ('c', 2), ('d', 3)]:
+            cache.set(key, self.user(pk), None)
+
+        cache.discard_users([1, 3])
+        self.assertEqual([k for k in 'abcd' if cache.get(k)], ['c'])
+        self.assertEqual(cache._keys_by_user, {2: {'c'}})
+
+    def test_index_follows_eviction_and_reassignment(self):
+        cache = TokenCache(max_size=2, ttl=60)
+        cache.set('a', self.user(1), None)
+        cache.set('b', self.user(2), None)
+        cache.set('a', self.user(3), None)  # mesma chave, outro usuário
+        cache.set('c', self.user(1), None)  # passa do limite: sai 'b', o menos usado
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache._keys_by_user, {1: {'c'}, 3: {'a'}})
+        cache.clear()
+        self.assertEqual(cache._keys_by_user, {})
+
+
+class UsersQueryBudgetTests(TestCase):
+    """Número máximo de consultas ao banco por URL de users/urls.py (token fora do cache, o pior caso)."""
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username='cliente', password='senha-forte-123', taxId='12345678901', cellphone='11999999999',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def test_register(self):
+        client = APIClient()
+        payload = {'username': 'novo', 'password': 'Senha-Forte-123!', 'email': 'novo@example.com',
+                   'first_name': 'Novo', 'taxId': '98765432100', 'cellphone': '11988887777'}
+        with self.assertNumQueries(4):  # 3 checagens de unicidade (username, email, taxId) + INSERT
+            response = client.post('/api/users/register/', payload, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def test_login(self):
+        client = APIClient()
+        with self.assertNumQueries(2):  # usuário + get_or_create do token
+            response = client.post('/api/users/login/', {'username': 'cliente', 'password': 'senha-forte-123'},
+                                   format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_logout(self):
+        with self.assertNumQueries(3):  # token -> usuário, tokens do usuário, DELETE
+            response = self.client.post('/api/users/logout/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_profile_get(self):
+        with self.assertNumQueries(1):  # token -> usuário
+            response = self.client.get('/api/users/profile/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_profile_update(self):
+        with self.assertNumQueries(2):  # token -> usuário, UPDATE
+            response = self.client.patch('/api/users/profile/', {'first_name': 'Maria'}, format='json')
+        self.assertEqual(response.status_code, 200)
@@ -1,9 +1,10 @@
 from django.urls import path
-from .views import UserRegistrationView, LoginView, ProfileView
+from .views import UserRegistrationView, LoginView, LogoutView, ProfileView
 from rest_framework.authtoken.views import obtain_auth_token
 
 urlpatterns = [
     path('register/', UserRegistrationView.as_view(), name='register'),
     path('login/', obtain_auth_token, name='login'), # DRF's built-in login
+    path('logout/', LogoutView.as_view(), name='logout'),
     path('profile/', ProfileView.as_view(), name='profile'),
 ]
\ No newline at end of file
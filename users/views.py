@@ -34,4 +34,14 @@ class ProfileView(generics.RetrieveUpdateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
-        return self.request.user
\ No newline at end of file
+        return self.request.user
+
+class LogoutView(APIView):
+    """
+    Encerra a sessão do token: apaga o token do usuário (o próximo login gera outro).
+    Apagar o token também o remove do cache de autenticação (ver signals.py).
+    """
+
+    def post(self, request, *args, **kwargs):
+        Token.objects.filter(user=request.user).delete()
+        return Response({"status": "success"})